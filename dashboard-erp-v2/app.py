@@ -6,16 +6,29 @@ Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
 Versão: 2.0.0
 """
 
+from config import Config, ServicesConfig
+
+# No modo gevent, threads, sockets e subprocessos viram greenlets (antes dos demais imports)
+if Config.SERVER_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 from flask import Flask, render_template, request, jsonify, g, send_file, Response
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-import io
-import csv
+import os
+import time
 
-from config import Config, ServicesConfig
-from auth import requer_autenticacao, requer_permissao, Auth
+from auth import requer_autenticacao, requer_permissao, Auth, validar_token_sessao, COOKIE_SESSAO
 from services import ServiceManager, StatisticsCalculator
-from models import HistoricoAcoes, MetricasServicos, Alertas, Database
+from models import HistoricoAcoes, MetricasServicos, Alertas, Database, ErrosLogs
+from collector import StatusCollector
+from orchestrator import OrquestradorAcoes
+from watcher import SystemdWatcher
+from journal import DistribuidorLogs
+from eventos import canal_eventos
+from logsearch import BuscaLogs, IndexadorErros, compilar_padrao
+from exportacao import FORMATOS, exportar_arrow, exportar_csv, formatos_disponiveis
 
 # Inicializa aplicação
 app = Flask(__name__)
@@ -31,22 +44,36 @@ metricas = MetricasServicos()
 alertas_manager = Alertas()
 stats_calculator = StatisticsCalculator()
 
+# Coleta de status em background: as rotas leem o último snapshot
+status_collector = StatusCollector(service_manager)
+orquestrador = OrquestradorAcoes(service_manager)
+systemd_watcher = SystemdWatcher(status_collector)
+
+# Stream de logs: um journalctl -f por unidade, compartilhado por todos os clientes
+distribuidor_logs = DistribuidorLogs(
+    service_manager.journal,
+    backlog=Config.LOG_STREAM_BACKLOG,
+    capacidade=Config.LOG_STREAM_BUFFER
+)
+
+# Busca paralela nos logs e índice incremental de assinaturas de erro
+busca_logs = BuscaLogs(service_manager.journal)
+indexador_erros = IndexadorErros(service_manager.journal)
+erros_logs = ErrosLogs()
+
 
 # ==================== FUNÇÕES AUXILIARES ====================
 
-def obter_permissoes_usuario(username):
-    """Obtém permissões do usuário baseado no username"""
-    from auth import UsersConfig
+def obter_permissoes_usuario():
+    """Obtém permissões do usuário autenticado (contexto ou cookie de sessão)"""
+    if hasattr(g, 'permissoes'):
+        return g.permissoes
     
-    if not username:
+    usuario = validar_token_sessao(request.cookies.get(COOKIE_SESSAO))
+    if not usuario:
         return None
     
-    usuarios = UsersConfig.USUARIOS
-    for usuario_config in usuarios.values():
-        if usuario_config['username'] == username:
-            return usuario_config['permissoes']
-    
-    return None
+    return Auth.obter_permissoes(Auth.obter_dados_usuario(usuario)['permissoes'])
 
 
 # ==================== ROTAS PRINCIPAIS ====================
@@ -56,15 +83,10 @@ def obter_permissoes_usuario(username):
 def index():
     """Página principal do dashboard"""
     try:
-        # Obtém status por grupo
-        grupos = service_manager.obter_status_por_grupo()
-        
-        # Calcula estatísticas gerais
-        todos_servicos = []
-        for grupo_data in grupos.values():
-            todos_servicos.extend(grupo_data['servicos'])
-        
-        stats_gerais = stats_calculator.calcular_estatisticas_gerais(todos_servicos)
+        # Último snapshot do coletor (status por grupo e estatísticas gerais)
+        snapshot = status_collector.snapshot()
+        grupos = snapshot['grupos']
+        stats_gerais = snapshot['stats']
         
         # Obtém alertas ativos
         alertas_ativos = alertas_manager.obter_ativos()
@@ -80,6 +102,7 @@ def index():
             alertas=alertas_ativos,
             alertas_count=alertas_por_severidade,
             historico=historico_recente,
+            versao=snapshot['etag'],
             usuario=g.usuario,
             nome_completo=g.nome_completo,
             permissoes=g.permissoes,
@@ -94,23 +117,45 @@ def index():
 @app.route('/api/status')
 @requer_autenticacao
 def api_status_todos():
-    """API: Retorna status de todos os serviços"""
+    """
+    API: Retorna status de todos os serviços
+    
+    A resposta traz a versão do snapshot (também no ETag): com If-None-Match
+    igual à versão atual retorna 304, e com ?since=<versao> retorna apenas
+    os serviços alterados depois dela.
+    """
     try:
-        grupos = service_manager.obter_status_por_grupo()
-        
-        # Calcula stats
-        todos_servicos = []
-        for grupo_data in grupos.values():
-            todos_servicos.extend(grupo_data['servicos'])
-        
-        stats = stats_calculator.calcular_estatisticas_gerais(todos_servicos)
+        snapshot = status_collector.snapshot()
+        etag = snapshot['etag']
         
-        return jsonify({
-            'success': True,
-            'grupos': grupos,
-            'stats': stats,
-            'timestamp': datetime.now().isoformat()
-        })
+        if request.if_none_match.contains(etag):
+            resposta = Response(status=304)
+        else:
+            since = request.args.get('since')
+            alterados = status_collector.alteracoes_desde(since) if since else None
+            
+            if alterados is not None:
+                resposta = jsonify({
+                    'success': True,
+                    'completo': False,
+                    'versao': etag,
+                    'servicos': alterados,
+                    'stats': snapshot['stats'],
+                    'timestamp': snapshot['timestamp']
+                })
+            else:
+                resposta = jsonify({
+                    'success': True,
+                    'completo': True,
+                    'versao': etag,
+                    'grupos': snapshot['grupos'],
+                    'stats': snapshot['stats'],
+                    'timestamp': snapshot['timestamp']
+                })
+        
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta
         
     except Exception as e:
         app.logger.error(f"Erro na API status: {e}")
@@ -125,7 +170,7 @@ def api_status_servico(servico):
         if servico not in ServicesConfig.get_all_services():
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
-        status = service_manager.obter_status(servico)
+        status = status_collector.obter_servico(servico) or service_manager.obter_status(servico)
         
         return jsonify({
             'success': True,
@@ -138,6 +183,62 @@ def api_status_servico(servico):
         return jsonify({'success': False, 'erro': str(e)}), 500
 
 
+@app.route('/api/eventos')
+@requer_autenticacao
+def api_eventos():
+    """
+    API: Atualizações em tempo real via Server-Sent Events
+    
+    Eventos "status" (serviços com estado alterado, estatísticas e grupos),
+    "metricas" (CPU/memória/threads/uptime que mudaram), "alerta" e
+    "historico", publicados uma única vez no canal compartilhado. Com
+    ?versao=<versao do snapshot exibido> o stream começa pelos serviços
+    alterados desde ela; sem o parâmetro, não envia status nem métricas.
+    """
+    versao = request.args.get('versao')
+    incluir_status = versao is not None
+    ultimo = request.headers.get('Last-Event-ID', type=int)
+    
+    def evento_sse(seq, tipo, dados):
+        return f"id: {seq}\nevent: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+    
+    def status_desde(seq, desde_versao):
+        snapshot = status_collector.snapshot()
+        alterados = status_collector.alteracoes_desde(desde_versao)
+        return evento_sse(seq, 'status', status_collector.evento_status(snapshot, alterados))
+    
+    def generate():
+        if ultimo is not None and canal_eventos.disponivel(ultimo):
+            # Reconexão: continua exatamente após o último evento recebido
+            posicao = ultimo
+        else:
+            posicao = canal_eventos.seq
+            if incluir_status:
+                yield status_desde(posicao, versao)
+        
+        for evento in canal_eventos.acompanhar(posicao):
+            if evento is None:
+                yield ": keep-alive\n\n"
+                continue
+            
+            seq, tipo, dados = evento
+            if tipo == 'perdidos':
+                # Ficou para trás da retenção do canal: reenvia o status completo
+                if incluir_status:
+                    yield status_desde(seq, None)
+            elif tipo not in ('status', 'metricas') or incluir_status:
+                yield evento_sse(seq, tipo, dados)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @app.route('/api/acao', methods=['POST'])
 @requer_autenticacao
 @requer_permissao('can_manage_all')
@@ -153,47 +254,48 @@ def api_executar_acao():
         if not acao:
             return jsonify({'success': False, 'erro': 'Ação não especificada'}), 400
         
-        # Ações globais
-        if acao == 'iniciar_todos':
-            resultados = service_manager.iniciar_todos()
+        # Ações globais: executadas em background, progresso em /api/acao/lote/<job_id>/stream
+        if acao in ('iniciar_todos', 'parar_todos'):
+            usuario, nome_completo = g.usuario, g.nome_completo
+            ip_address, user_agent = request.remote_addr, request.headers.get('User-Agent')
+            verbo = 'iniciados' if acao == 'iniciar_todos' else 'parados'
             
-            # Registra no histórico
-            historico.registrar(
-                usuario=g.usuario,
-                nome_completo=g.nome_completo,
-                servico=None,
-                acao='iniciar_todos',
-                status='sucesso',
-                mensagem=f"{len(resultados['sucessos'])} serviços iniciados",
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
-            )
+            def ao_concluir(execucao):
+                status_collector.solicitar_coleta()
+                resultados = execucao.resultados or {'sucessos': [], 'falhas': []}
+                historico.registrar(
+                    usuario=usuario,
+                    nome_completo=nome_completo,
+                    servico=None,
+                    acao=acao,
+                    status='sucesso' if execucao.resultados and not resultados['falhas'] else 'falha',
+                    mensagem=execucao.erro or (
+                        f"{len(resultados['sucessos'])} serviços {verbo}, "
+                        f"{len(resultados['falhas'])} falhas"
+                    ),
+                    ip_address=ip_address,
+                    user_agent=user_agent
+                )
             
-            return jsonify({
-                'success': True,
-                'mensagem': 'Ação global executada',
-                'resultados': resultados
-            })
-        
-        elif acao == 'parar_todos':
-            resultados = service_manager.parar_todos()
+            def ao_progredir(evento):
+                if evento['estado'] != 'executando':
+                    status_collector.solicitar_coleta()
             
-            historico.registrar(
-                usuario=g.usuario,
-                nome_completo=g.nome_completo,
-                servico=None,
-                acao='parar_todos',
-                status='sucesso',
-                mensagem=f"{len(resultados['sucessos'])} serviços parados",
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
-            )
+            try:
+                execucao = orquestrador.iniciar(
+                    'start' if acao == 'iniciar_todos' else 'stop',
+                    ao_progredir=ao_progredir,
+                    ao_concluir=ao_concluir
+                )
+            except RuntimeError as e:
+                return jsonify({'success': False, 'erro': str(e)}), 409
             
             return jsonify({
                 'success': True,
-                'mensagem': 'Ação global executada',
-                'resultados': resultados
-            })
+                'mensagem': 'Ação global iniciada',
+                'job_id': execucao.id,
+                'stream': f'/api/acao/lote/{execucao.id}/stream'
+            }), 202
         
         # Ações individuais
         if not servico:
@@ -204,6 +306,7 @@ def api_executar_acao():
         
         # Executa ação
         sucesso, mensagem = service_manager.executar_acao(servico, acao, pid)
+        status_collector.solicitar_coleta()
         
         # Registra no histórico
         historico.registrar(
@@ -229,23 +332,180 @@ def api_executar_acao():
         return jsonify({'success': False, 'erro': str(e)}), 500
 
 
+@app.route('/api/acao/lote/<job_id>')
+@requer_autenticacao
+def api_acao_lote(job_id):
+    """API: Situação de uma ação global (iniciar/parar todos)"""
+    execucao = orquestrador.obter(job_id)
+    if not execucao:
+        return jsonify({'success': False, 'erro': 'Execução não encontrada'}), 404
+    
+    return jsonify({'success': True, **execucao.resumo(), 'progresso': execucao.eventos})
+
+
+@app.route('/api/acao/lote/<job_id>/stream')
+@requer_autenticacao
+def api_acao_lote_stream(job_id):
+    """API: Progresso de uma ação global por serviço, via Server-Sent Events"""
+    execucao = orquestrador.obter(job_id)
+    if not execucao:
+        return jsonify({'success': False, 'erro': 'Execução não encontrada'}), 404
+    
+    # Reconexão automática do EventSource envia o último id recebido
+    ultimo_id = request.headers.get('Last-Event-ID', '')
+    desde = int(ultimo_id) + 1 if ultimo_id.isdigit() else request.args.get('desde', 0, type=int)
+    
+    def generate():
+        for evento in execucao.acompanhar(desde):
+            if evento is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {evento['seq']}\ndata: {json.dumps(evento)}\n\n"
+        yield f"event: fim\ndata: {json.dumps(execucao.resumo())}\n\n"
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@app.route('/api/logs/busca')
+@requer_autenticacao
+def api_logs_busca():
+    """
+    API: Busca uma expressão regular nos logs de vários serviços
+    
+    Os serviços são lidos em paralelo e cada ocorrência é enviada assim que
+    encontrada (uma linha JSON por ocorrência; a última traz o total).
+    Parâmetros: padrao, servicos (separados por vírgula; padrão: todos),
+    inicio (padrão: -24h), fim, prioridade, limite e ignorar_caixa (1/0).
+    """
+    try:
+        todos = ServicesConfig.get_all_services()
+        servicos = [s for s in request.args.get('servicos', '').split(',') if s] or todos
+        desconhecidos = [s for s in servicos if s not in todos]
+        if desconhecidos:
+            return jsonify({'success': False, 'erro': f"Serviço não encontrado: {', '.join(desconhecidos)}"}), 404
+        
+        limite = request.args.get('limite', Config.LOG_SEARCH_MAX_RESULTS, type=int)
+        if limite < 1:
+            return jsonify({'success': False, 'erro': 'limite deve ser maior que zero'}), 400
+        limite = min(limite, Config.LOG_SEARCH_MAX_RESULTS)
+        filtros = {
+            'inicio': request.args.get('inicio', '-24h'),
+            'fim': request.args.get('fim'),
+            'prioridade': request.args.get('prioridade')
+        }
+        
+        try:
+            regex = compilar_padrao(request.args.get('padrao', ''),
+                                    request.args.get('ignorar_caixa', '1') != '0')
+            service_manager.journal.comando(servicos[0], **filtros)
+        except ValueError as e:
+            return jsonify({'success': False, 'erro': str(e)}), 400
+        
+        def generate():
+            inicio = time.time()
+            total = 0
+            for item in busca_logs.buscar(servicos, regex, limite, **filtros):
+                if 'erro' in item:
+                    yield json.dumps(item, ensure_ascii=False) + '\n'
+                    continue
+                total += 1
+                yield json.dumps({
+                    'servico': item['servico'],
+                    'cursor': item['cursor'],
+                    'timestamp': item['timestamp'],
+                    'prioridade': item['prioridade'],
+                    'linha': service_manager.journal.formatar(item)
+                }, ensure_ascii=False) + '\n'
+            
+            yield json.dumps({
+                'fim': True,
+                'total': total,
+                'truncado': total >= limite,
+                'duracao_ms': round((time.time() - inicio) * 1000)
+            }) + '\n'
+        
+        return Response(
+            generate(),
+            mimetype='application/x-ndjson',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except Exception as e:
+        app.logger.error(f"Erro na busca de logs: {e}")
+        return jsonify({'success': False, 'erro': str(e)}), 500
+
+
+@app.route('/api/logs/erros')
+@requer_autenticacao
+def api_logs_erros():
+    """API: Assinaturas de erro nos logs (ocorrências, primeira e última vez) do índice incremental"""
+    try:
+        horas = request.args.get('horas', 24, type=float)
+        servico = request.args.get('servico')
+        if servico and servico not in ServicesConfig.get_all_services():
+            return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
+        
+        inicio = time.time() - horas * 3600
+        resposta = {
+            'success': True,
+            'horas': horas,
+            'erros': erros_logs.obter_resumo(inicio, servico)
+        }
+        if servico:
+            resposta['serie'] = erros_logs.obter_serie(servico, inicio)
+        
+        return jsonify(resposta)
+        
+    except Exception as e:
+        app.logger.error(f"Erro ao obter índice de erros dos logs: {e}")
+        return jsonify({'success': False, 'erro': str(e)}), 500
+
+
 @app.route('/api/logs/<servico>')
 @requer_autenticacao
 def api_logs_servico(servico):
-    """API: Retorna logs de um serviço"""
+    """
+    API: Retorna logs de um serviço
+    
+    Filtros (aplicados pelo journalctl): inicio, fim, prioridade e cursor
+    (continua após a última entrada já recebida).
+    """
     try:
         if servico not in ServicesConfig.get_all_services():
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
         linhas = request.args.get('linhas', Config.MAX_LOG_LINES, type=int)
         
-        logs = service_manager.obter_logs(servico, linhas)
+        try:
+            entradas = list(service_manager.journal.ler(
+                servico,
+                linhas=linhas,
+                inicio=request.args.get('inicio'),
+                fim=request.args.get('fim'),
+                prioridade=request.args.get('prioridade'),
+                cursor=request.args.get('cursor')
+            ))
+        except ValueError as e:
+            return jsonify({'success': False, 'erro': str(e)}), 400
+        
+        logs = [service_manager.journal.formatar(entrada) for entrada in entradas]
         
         return jsonify({
             'success': True,
             'servico': servico,
             'logs': logs,
-            'total_linhas': len(logs)
+            'total_linhas': len(logs),
+            'cursor': entradas[-1]['cursor'] if entradas else request.args.get('cursor')
         })
         
     except Exception as e:
@@ -262,16 +522,35 @@ def api_metricas_servico(servico):
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
         limite = request.args.get('limite', 100, type=int)
-        
-        metricas_hist = metricas.obter_ultimas(servico, limite)
+        horas = request.args.get('horas', type=float)
+        
+        # Últimas amostras do buffer em memória; SQLite só se o buffer não tiver todas
+        metricas_hist = status_collector.buffer.ultimas(servico, limite)
+        fonte = 'memoria'
+        if metricas_hist is None:
+            metricas_hist = metricas.obter_ultimas(servico, limite)
+            fonte = 'banco'
         media_24h = metricas.obter_media_periodo(servico, 24)
         
-        return jsonify({
+        resposta = {
             'success': True,
             'servico': servico,
             'metricas': metricas_hist,
-            'media_24h': media_24h
-        })
+            'fonte': fonte,
+            'resumo': status_collector.buffer.resumo(servico, limite),
+            'media_24h': media_24h,
+            'tendencias': status_collector.tendencias.obter(servico)
+        }
+        
+        # Série agregada de um período (?horas=N&passo=segundos)
+        if horas:
+            resolucao, serie = metricas.obter_serie(
+                servico, time.time() - horas * 3600, passo=request.args.get('passo', type=int)
+            )
+            resposta['resolucao'] = resolucao
+            resposta['serie'] = serie
+        
+        return jsonify(resposta)
         
     except Exception as e:
         app.logger.error(f"Erro ao obter métricas de {servico}: {e}")
@@ -284,49 +563,31 @@ def api_metricas_servico(servico):
 @app.route('/api/logs/<servico>/stream')
 @requer_autenticacao
 def api_logs_stream(servico):
-    """API: Stream de logs em tempo real usando Server-Sent Events"""
-    import subprocess
-    import time
+    """
+    API: Stream de logs em tempo real usando Server-Sent Events
     
+    Todos os clientes de um serviço compartilham o mesmo journalctl -f. Cada
+    evento leva o cursor do journal como id; ao reconectar, o navegador envia
+    Last-Event-ID e recebe do backlog apenas as linhas posteriores.
+    """
     try:
         if servico not in ServicesConfig.get_all_services():
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
+        cursor = request.headers.get('Last-Event-ID')
+        
         def generate():
             """Gerador para Server-Sent Events"""
-            # Comando journalctl em modo follow
-            cmd = [
-                'sudo', 'journalctl',
-                '-u', f'{servico}.service',
-                '-f',  # Follow mode (tail -f)
-                '-n', '100',  # Começa com últimas 100 linhas
-                '--no-pager'
-            ]
-            
-            process = None
             try:
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1
-                )
-                
-                # Envia linhas conforme chegam
-                for line in process.stdout:
-                    # Remove quebras de linha extras
-                    line = line.rstrip('\n')
-                    if line:
-                        # Formato SSE: data: conteúdo\n\n
-                        yield f"data: {line}\n\n"
+                # Começa com o backlog (últimas LOG_STREAM_BACKLOG linhas) e segue o journal
+                for entrada in distribuidor_logs.acompanhar(servico, cursor):
+                    if entrada is None:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"id: {entrada['cursor']}\ndata: {service_manager.journal.formatar(entrada)}\n\n"
                         
             except Exception as e:
                 yield f"data: ERRO: {str(e)}\n\n"
-            finally:
-                if process:
-                    process.kill()
-                    process.wait()
         
         return Response(
             generate(),
@@ -345,47 +606,47 @@ def api_logs_stream(servico):
 @app.route('/api/logs/<servico>/download')
 @requer_autenticacao
 def api_logs_download(servico):
-    """API: Download do log completo do serviço"""
-    import subprocess
+    """
+    API: Download do log completo do serviço
     
+    O log é gerado em streaming (compactado com gzip quando o cliente aceita),
+    sem carregar o journal inteiro em memória. Aceita inicio, fim e prioridade.
+    """
     try:
         if servico not in ServicesConfig.get_all_services():
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
-        # Pega TODAS as linhas do log (sem limite)
-        cmd = [
-            'sudo', 'journalctl',
-            '-u', f'{servico}.service',
-            '--no-pager'
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode != 0:
-            return jsonify({'success': False, 'erro': 'Erro ao obter logs'}), 500
+        filtros = {
+            'inicio': request.args.get('inicio'),
+            'fim': request.args.get('fim'),
+            'prioridade': request.args.get('prioridade')
+        }
+        try:
+            # Valida os filtros antes de começar a resposta
+            service_manager.journal.comando(servico, **filtros)
+        except ValueError as e:
+            return jsonify({'success': False, 'erro': str(e)}), 400
         
-        log_content = result.stdout
+        compactar = 'gzip' in request.headers.get('Accept-Encoding', '')
         
         # Nome do arquivo com timestamp
         filename = f'log_{servico}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'
         
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+        if compactar:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        
         return Response(
-            log_content,
+            service_manager.journal.exportar(servico, compactar=compactar, **filtros),
             mimetype='text/plain',
-            headers={
-                'Content-Disposition': f'attachment; filename={filename}',
-                'Content-Type': 'text/plain; charset=utf-8'
-            }
+            content_type='text/plain; charset=utf-8',
+            headers=headers
         )
         
-    except subprocess.TimeoutExpired:
-        app.logger.error(f"Timeout ao obter logs de {servico}")
-        return jsonify({'success': False, 'erro': 'Timeout ao obter logs'}), 500
     except Exception as e:
         app.logger.error(f"Erro ao fazer download de logs de {servico}: {e}")
         return jsonify({'success': False, 'erro': str(e)}), 500
@@ -436,11 +697,12 @@ def api_alertas():
     try:
         ativos_apenas = request.args.get('ativos', 'true').lower() == 'true'
         servico = request.args.get('servico')
+        limite = request.args.get('limite', 100, type=int)
         
         if ativos_apenas:
-            alerts = alertas_manager.obter_ativos(servico)
+            alerts = alertas_manager.obter_ativos(servico, limite)
         else:
-            alerts = alertas_manager.obter_recentes(50)
+            alerts = alertas_manager.obter_recentes(min(limite, 50))
         
         return jsonify({
             'success': True,
@@ -453,6 +715,24 @@ def api_alertas():
         return jsonify({'success': False, 'erro': str(e)}), 500
 
 
+@app.route('/api/alertas/<int:alerta_id>/reconhecer', methods=['POST'])
+@requer_autenticacao
+@requer_permissao('can_manage_all')
+def api_reconhecer_alerta(alerta_id):
+    """API: Marca alerta como reconhecido (continua ativo, sem novas notificações)"""
+    try:
+        alertas_manager.reconhecer(alerta_id, g.usuario)
+        
+        return jsonify({
+            'success': True,
+            'mensagem': 'Alerta reconhecido'
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Erro ao reconhecer alerta: {e}")
+        return jsonify({'success': False, 'erro': str(e)}), 500
+
+
 @app.route('/api/alertas/<int:alerta_id>/resolver', methods=['POST'])
 @requer_autenticacao
 @requer_permissao('can_manage_all')
@@ -473,46 +753,81 @@ def api_resolver_alerta(alerta_id):
 
 # ==================== EXPORTAÇÃO ====================
 
+def periodo_exportacao(dias_padrao):
+    """
+    Período de uma exportação em epoch: ?inicio=&fim= (data/hora ISO ou epoch) ou os últimos ?dias=
+    
+    Levanta ValueError se os parâmetros forem inválidos.
+    """
+    def instante(valor):
+        try:
+            return float(valor)
+        except ValueError:
+            return datetime.fromisoformat(valor).timestamp()
+    
+    fim = instante(request.args['fim']) if request.args.get('fim') else time.time()
+    if request.args.get('inicio'):
+        inicio = instante(request.args['inicio'])
+    else:
+        inicio = fim - request.args.get('dias', dias_padrao, type=float) * 86400
+    
+    if inicio >= fim:
+        raise ValueError('Período inválido: inicio deve ser anterior a fim')
+    return inicio, fim
+
+
+def resposta_exportacao(nome, colunas, lotes):
+    """
+    Resposta em streaming no formato pedido (?formato=csv|parquet|arrow)
+    
+    O CSV é compactado com gzip quando o cliente aceita; Parquet e Arrow
+    exigem o pyarrow instalado.
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in formatos_disponiveis():
+        return jsonify({
+            'success': False,
+            'erro': f'Formato indisponível: {formato}',
+            'formatos': formatos_disponiveis()
+        }), 400
+    
+    mimetype, extensao = FORMATOS[formato]
+    headers = {
+        'Content-Disposition': f'attachment; filename={nome}.{extensao}',
+        'X-Accel-Buffering': 'no'
+    }
+    
+    if formato == 'csv':
+        compactar = 'gzip' in request.headers.get('Accept-Encoding', '')
+        if compactar:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        conteudo = exportar_csv(colunas, lotes, compactar=compactar)
+    else:
+        conteudo = exportar_arrow(colunas, lotes, formato)
+    
+    return Response(conteudo, mimetype=mimetype, headers=headers)
+
+
 @app.route('/export/historico')
 @requer_autenticacao
 @requer_permissao('can_export')
 def export_historico_csv():
-    """Exporta histórico em CSV"""
+    """Exporta histórico (CSV, Parquet ou Arrow) de um período, em streaming"""
     try:
-        periodo = request.args.get('dias', 30, type=int)
-        data_fim = datetime.now()
-        data_inicio = data_fim - timedelta(days=periodo)
-        
-        hist = historico.obter_por_periodo(data_inicio, data_fim)
-        
-        # Cria CSV em memória
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=[
-            'timestamp', 'usuario', 'nome_completo', 'servico', 
-            'acao', 'status', 'mensagem', 'ip_address'
-        ])
-        
-        writer.writeheader()
-        for item in hist:
-            writer.writerow({
-                'timestamp': item['timestamp'],
-                'usuario': item['usuario'],
-                'nome_completo': item.get('nome_completo', ''),
-                'servico': item.get('servico', ''),
-                'acao': item['acao'],
-                'status': item['status'],
-                'mensagem': item.get('mensagem', ''),
-                'ip_address': item.get('ip_address', '')
-            })
-        
-        output.seek(0)
+        try:
+            inicio, fim = periodo_exportacao(30)
+        except ValueError as e:
+            return jsonify({'success': False, 'erro': str(e)}), 400
         
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=historico_erp_{data_inicio.strftime("%Y%m%d")}_{data_fim.strftime("%Y%m%d")}.csv'
-            }
+        servico = request.args.get('servico')
+        nome = (f'historico_erp_{datetime.fromtimestamp(inicio).strftime("%Y%m%d")}'
+                f'_{datetime.fromtimestamp(fim).strftime("%Y%m%d")}')
+        
+        return resposta_exportacao(
+            nome,
+            HistoricoAcoes.COLUNAS_EXPORTACAO,
+            historico.iterar_periodo(inicio, fim, servico=servico)
         )
         
     except Exception as e:
@@ -524,40 +839,23 @@ def export_historico_csv():
 @requer_autenticacao
 @requer_permissao('can_export')
 def export_metricas_csv(servico):
-    """Exporta métricas de um serviço em CSV"""
+    """Exporta as métricas brutas de um serviço (CSV, Parquet ou Arrow) de um período, em streaming"""
     try:
         if servico not in ServicesConfig.get_all_services():
             return jsonify({'success': False, 'erro': 'Serviço não encontrado'}), 404
         
-        metricas_data = metricas.obter_ultimas(servico, 1000)
-        
-        # Cria CSV
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=[
-            'timestamp', 'servico', 'cpu_percent', 'memory_mb', 
-            'memory_percent', 'threads', 'status'
-        ])
-        
-        writer.writeheader()
-        for item in metricas_data:
-            writer.writerow({
-                'timestamp': item['timestamp'],
-                'servico': item['servico'],
-                'cpu_percent': item.get('cpu_percent', 0),
-                'memory_mb': item.get('memory_mb', 0),
-                'memory_percent': item.get('memory_percent', 0),
-                'threads': item.get('threads', 0),
-                'status': item.get('status', '')
-            })
-        
-        output.seek(0)
+        try:
+            inicio, fim = periodo_exportacao(1)
+        except ValueError as e:
+            return jsonify({'success': False, 'erro': str(e)}), 400
         
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=metricas_{servico}_{datetime.now().strftime("%Y%m%d")}.csv'
-            }
+        nome = (f'metricas_{servico}_{datetime.fromtimestamp(inicio).strftime("%Y%m%d%H%M")}'
+                f'_{datetime.fromtimestamp(fim).strftime("%Y%m%d%H%M")}')
+        
+        return resposta_exportacao(
+            nome,
+            MetricasServicos.COLUNAS_EXPORTACAO,
+            metricas.iterar_periodo(servico, inicio, fim)
         )
         
     except Exception as e:
@@ -613,8 +911,7 @@ def pagina_logs():
 def not_found(error):
     """Handler para página não encontrada"""
     # Obtém permissões do usuário se autenticado
-    auth = request.authorization
-    permissoes = obter_permissoes_usuario(auth.username) if auth else None
+    permissoes = obter_permissoes_usuario()
     
     return render_template('error.html', 
                          erro='Página não encontrada',
@@ -627,8 +924,7 @@ def internal_error(error):
     app.logger.error(f"Erro interno: {error}")
     
     # Obtém permissões do usuário se autenticado
-    auth = request.authorization
-    permissoes = obter_permissoes_usuario(auth.username) if auth else None
+    permissoes = obter_permissoes_usuario()
     
     return render_template('error.html', 
                          erro='Erro interno do servidor',
@@ -639,8 +935,7 @@ def internal_error(error):
 def forbidden(error):
     """Handler para acesso negado"""
     # Obtém permissões do usuário se autenticado
-    auth = request.authorization
-    permissoes = obter_permissoes_usuario(auth.username) if auth else None
+    permissoes = obter_permissoes_usuario()
     
     return render_template('error.html', 
                          erro='Acesso negado',
@@ -674,13 +969,25 @@ if __name__ == '__main__':
     print("=" * 70)
     print("\n✅ Dashboard inicializado com sucesso!\n")
     
+    # Com o reloader do modo debug, inicia as threads de background apenas no processo filho
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # O monitor primeiro: ao iniciar, ele assume os alertas de queda do coletor
+        systemd_watcher.iniciar()
+        status_collector.iniciar()
+        indexador_erros.iniciar()
+    
     try:
-        app.run(
-            debug=Config.DEBUG,
-            host=Config.HOST,
-            port=Config.PORT,
-            threaded=True
-        )
+        if Config.SERVER_MODE == 'gevent':
+            from gevent.pywsgi import WSGIServer
+            print("⚡ Servidor gevent: streams SSE não ocupam threads\n")
+            WSGIServer((Config.HOST, Config.PORT), app).serve_forever()
+        else:
+            app.run(
+                debug=Config.DEBUG,
+                host=Config.HOST,
+                port=Config.PORT,
+                threaded=True
+            )
     except KeyboardInterrupt:
         print("\n\n🛑 Dashboard finalizado pelo usuário")
     except Exception as e:
@@ -5,42 +5,158 @@ Dashboard ERP Protheus 2.0 - Autenticação
 Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
 """
 
-from flask import g, request, Response
+from flask import g, request, Response, make_response
 from functools import wraps
-from config import UsersConfig
+from types import MappingProxyType
+from config import Config, UsersConfig
+import base64
 import hashlib
+import hmac
 import secrets
+import threading
+import time
+
+# scrypt: ~16 MB e algumas dezenas de ms por verificação
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PREFIXO_HASH = 'scrypt$'
+
+COOKIE_SESSAO = 'dashboard_sessao'
+
+
+def _b64(dados):
+    return base64.urlsafe_b64encode(dados).decode().rstrip('=')
+
+
+def _b64_decode(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def hash_senha(senha, sal=None):
+    """Gera hash scrypt salgado de uma senha (scrypt$n$r$p$sal$hash)"""
+    sal = sal or secrets.token_bytes(16)
+    chave = hashlib.scrypt(senha.encode(), salt=sal, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(chave)}"
+
+
+def verificar_senha(senha, hash_armazenado):
+    """Compara a senha com um hash gerado por hash_senha (tempo constante)"""
+    try:
+        _, n, r, p, sal, esperado = hash_armazenado.split('$')
+        esperado = _b64_decode(esperado)
+        calculado = hashlib.scrypt(senha.encode(), salt=_b64_decode(sal), n=int(n), r=int(r), p=int(p),
+                                   dklen=len(esperado), maxmem=64 * 1024 * 1024)
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(calculado, esperado)
+
+
+def _sal_usuario(usuario):
+    """Sal determinístico (SECRET_KEY + usuário) para as senhas configuradas em texto puro"""
+    return hmac.new(Config.SECRET_KEY.encode(), f"sal\0{usuario}".encode(), hashlib.sha256).digest()[:16]
+
+
+def _carregar_usuarios():
+    """
+    Lê usuários e permissões uma única vez, em estruturas imutáveis
+
+    A senha do ambiente pode ser o próprio hash (scrypt$...); em texto puro,
+    é convertida em hash na carga e não fica guardada. O sal desse hash é
+    derivado de SECRET_KEY + usuário: o hash (e a chave dos cookies de
+    sessão) é o mesmo em todo reinício e em todo worker.
+    """
+    usuarios = {}
+    for usuario, dados in UsersConfig.get_users().items():
+        senha = dados['senha']
+        usuarios[usuario] = MappingProxyType({
+            'senha_hash': senha if senha.startswith(PREFIXO_HASH) else hash_senha(senha, _sal_usuario(usuario)),
+            'permissoes': dados.get('permissoes', 'visualizacao'),
+            'nome_completo': dados.get('nome_completo', usuario),
+            'email': dados.get('email', '')
+        })
+
+    permissoes = {tipo: MappingProxyType(dict(valores))
+                  for tipo, valores in UsersConfig.get_permissions().items()}
+    return MappingProxyType(usuarios), MappingProxyType(permissoes)
+
+
+USUARIOS, PERMISSOES = _carregar_usuarios()
+
+
+class CacheCredenciais:
+    """
+    Credenciais já verificadas, por AUTH_CACHE_TTL segundos
+
+    Evita o custo do scrypt a cada requisição com Basic auth. Guarda apenas
+    um HMAC (chave aleatória do processo) de usuário + senha, nunca a senha;
+    falhas não entram no cache.
+    """
+
+    def __init__(self, ttl, capacidade=256):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self._chave = secrets.token_bytes(32)
+        self._validas = {}
+        self._lock = threading.Lock()
+
+    def _impressao(self, usuario, senha):
+        return hmac.new(self._chave, f"{usuario}\0{senha}".encode(), hashlib.sha256).digest()
+
+    def valida(self, usuario, senha):
+        impressao = self._impressao(usuario, senha)
+        with self._lock:
+            expira = self._validas.get(impressao)
+            if expira is None:
+                return False
+            if expira < time.monotonic():
+                del self._validas[impressao]
+                return False
+            return True
+
+    def guardar(self, usuario, senha):
+        if self.ttl <= 0:
+            return
+        agora = time.monotonic()
+        with self._lock:
+            if len(self._validas) >= self.capacidade:
+                self._validas = {k: v for k, v in self._validas.items() if v >= agora}
+                if len(self._validas) >= self.capacidade:
+                    self._validas.clear()
+            self._validas[self._impressao(usuario, senha)] = agora + self.ttl
+
+
+_cache_credenciais = CacheCredenciais(Config.AUTH_CACHE_TTL)
 
 
 class Auth:
     """Classe para gerenciamento de autenticação"""
-    
+
     @staticmethod
     def verificar_credenciais(usuario, senha):
         """Verifica se as credenciais são válidas"""
-        usuarios = UsersConfig.get_users()
-        
-        if usuario not in usuarios:
+        dados = USUARIOS.get(usuario)
+        if dados is None or senha is None:
             return False
-        
-        # Verifica senha
-        senha_esperada = usuarios[usuario]["senha"]
-        return senha == senha_esperada
-    
+
+        if _cache_credenciais.valida(usuario, senha):
+            return True
+
+        if not verificar_senha(senha, dados['senha_hash']):
+            return False
+        _cache_credenciais.guardar(usuario, senha)
+        return True
+
     @staticmethod
     def obter_dados_usuario(usuario):
         """Retorna dados completos do usuário"""
-        usuarios = UsersConfig.get_users()
-        if usuario in usuarios:
-            return usuarios[usuario]
-        return None
-    
+        return USUARIOS.get(usuario)
+
     @staticmethod
     def obter_permissoes(tipo_permissao):
         """Retorna permissões de um tipo de usuário"""
-        permissoes = UsersConfig.get_permissions()
-        return permissoes.get(tipo_permissao, {})
-    
+        return PERMISSOES.get(tipo_permissao, MappingProxyType({}))
+
     @staticmethod
     def usuario_pode(permissao):
         """Verifica se o usuário atual tem uma permissão específica"""
@@ -60,27 +176,50 @@ def autenticar():
 
 
 def requer_autenticacao(f):
-    """Decorator para exigir autenticação"""
+    """
+    Decorator para exigir autenticação
+
+    Aceita o cookie de sessão assinado (emitido após o primeiro Basic auth
+    bem-sucedido) ou as credenciais Basic. Com o cookie, as requisições
+    seguintes não passam pela verificação da senha.
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
         auth = request.authorization
-        
-        if not auth:
-            return autenticar()
-        
-        if not Auth.verificar_credenciais(auth.username, auth.password):
-            return autenticar()
-        
+        usuario = validar_token_sessao(request.cookies.get(COOKIE_SESSAO))
+        novo_token = None
+
+        # Credenciais Basic de outro usuário têm precedência sobre o cookie
+        if not usuario or (auth and auth.username and auth.username != usuario):
+            if not auth:
+                return autenticar()
+
+            if not Auth.verificar_credenciais(auth.username, auth.password):
+                return autenticar()
+
+            usuario = auth.username
+            novo_token = gerar_token_sessao(usuario)
+
         # Armazena dados do usuário no contexto
-        dados_usuario = Auth.obter_dados_usuario(auth.username)
-        g.usuario = auth.username
-        g.nome_completo = dados_usuario.get('nome_completo', auth.username)
-        g.email = dados_usuario.get('email', '')
-        g.tipo_permissao = dados_usuario.get('permissoes', 'visualizacao')
+        dados_usuario = USUARIOS[usuario]
+        g.usuario = usuario
+        g.nome_completo = dados_usuario['nome_completo']
+        g.email = dados_usuario['email']
+        g.tipo_permissao = dados_usuario['permissoes']
         g.permissoes = Auth.obter_permissoes(g.tipo_permissao)
-        
-        return f(*args, **kwargs)
-    
+
+        resposta = f(*args, **kwargs)
+        if novo_token:
+            resposta = make_response(resposta)
+            resposta.set_cookie(
+                COOKIE_SESSAO, novo_token,
+                max_age=Config.SESSION_TTL,
+                httponly=True,
+                samesite='Strict',
+                secure=request.is_secure
+            )
+        return resposta
+
     return decorated
 
 
@@ -99,11 +238,35 @@ def requer_permissao(permissao):
     return decorator
 
 
-def gerar_token_sessao():
-    """Gera um token único para sessão"""
-    return secrets.token_urlsafe(32)
+def _assinar(corpo, usuario):
+    # O hash da senha entra na chave: trocar a senha invalida os tokens do usuário
+    chave = f"{Config.SECRET_KEY}\0{USUARIOS[usuario]['senha_hash']}".encode()
+    return _b64(hmac.new(chave, corpo.encode(), hashlib.sha256).digest())
+
+
+def gerar_token_sessao(usuario):
+    """Gera um token de sessão assinado (usuário, expiração e nonce) válido por SESSION_TTL"""
+    if Config.SESSION_TTL <= 0:
+        return None
+    expira = int(time.time()) + Config.SESSION_TTL
+    corpo = f"{_b64(usuario.encode())}.{expira}.{secrets.token_urlsafe(16)}"
+    return f"{corpo}.{_assinar(corpo, usuario)}"
+
 
+def validar_token_sessao(token):
+    """Retorna o usuário do token se a assinatura confere e ele não expirou"""
+    if not token or Config.SESSION_TTL <= 0:
+        return None
+    try:
+        corpo, assinatura = token.rsplit('.', 1)
+        usuario_b64, expira, _ = corpo.split('.')
+        usuario = _b64_decode(usuario_b64).decode()
+        expira = int(expira)
+    except ValueError:
+        return None
 
-def hash_senha(senha):
-    """Gera hash SHA256 de uma senha"""
-    return hashlib.sha256(senha.encode()).hexdigest()
+    if usuario not in USUARIOS or expira < time.time():
+        return None
+    if not hmac.compare_digest(assinatura, _assinar(corpo, usuario)):
+        return None
+    return usuario
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Coletor de Status em Background
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import Config, ServicesConfig
+from eventos import canal_eventos
+from models import Alertas, MetricasServicos
+from ringbuffer import BufferMetricas
+from tendencias import DetectorTendencias
+from rollup import AgregadorMetricas
+from services import ServiceManager, StatisticsCalculator
+
+# Campos que definem o estado de um serviço: só eles avançam a versão/ETag
+CAMPOS_ESTADO = ('ativo', 'estado', 'sub_estado', 'pid', 'stale')
+
+# Métricas enviadas à parte (evento "metricas"), com a precisão exibida no dashboard
+CAMPOS_METRICAS = {'cpu_percent': 0, 'memoria_mb': 0, 'memoria_percent': 0, 'threads': None, 'uptime': None}
+
+
+def estado_servico(status: Dict) -> tuple:
+    return tuple(status.get(campo) for campo in CAMPOS_ESTADO)
+
+
+def metricas_servico(status: Dict) -> tuple:
+    return tuple(
+        round(status.get(campo) or 0, casas) if casas is not None else status.get(campo)
+        for campo, casas in CAMPOS_METRICAS.items()
+    )
+
+
+class StatusCollector:
+    """
+    Coleta o status de todos os serviços a cada METRICS_COLLECTION_INTERVAL
+
+    As requisições leem o último snapshot em memória (sem chamar systemd
+    nem o banco) e as métricas de cada ciclo são gravadas em lote.
+
+    Cada snapshot tem uma versão, que só avança quando o estado de algum
+    serviço muda (CAMPOS_ESTADO); a versão em que cada serviço mudou pela
+    última vez permite responder apenas as diferenças (`?since=`) e usar a
+    versão como ETag. CPU, memória, threads e uptime variam a cada ciclo:
+    vão no snapshot, mas chegam aos navegadores pelo evento "metricas",
+    apenas quando mudam na precisão exibida, sem avançar a versão.
+    """
+
+    def __init__(self, service_manager: ServiceManager, intervalo: Optional[int] = None):
+        self.service_manager = service_manager
+        self.intervalo = intervalo or Config.METRICS_COLLECTION_INTERVAL
+        self.metricas = MetricasServicos() if Config.ENABLE_PERFORMANCE_METRICS else None
+        self.agregador = AgregadorMetricas() if self.metricas else None
+        self.buffer = BufferMetricas(Config.METRICS_BUFFER_SIZE)
+        self.alertas = Alertas()
+        self.tendencias = DetectorTendencias()
+        self.verificar_parado = True  # o SystemdWatcher desliga ao assumir a detecção de quedas
+        self._ultima_limpeza = 0.0
+        self._snapshot = None
+        self._geracao = format(int(time.time()), 'x')  # distingue versões de execuções diferentes
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """Inicia a thread de coleta"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='status-collector', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        """Encerra a thread de coleta"""
+        self._parar.set()
+        self._acordar.set()
+
+    def solicitar_coleta(self):
+        """Antecipa a próxima coleta (ex: após start/stop de um serviço)"""
+        self._acordar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.coletar()
+            except Exception as e:
+                print(f"[ERRO] Falha na coleta de status: {e}")
+            self._aplicar_retencao()
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def coletar(self) -> Dict:
+        """Executa um ciclo de coleta e publica o novo snapshot"""
+        servicos = self.service_manager.obter_status_servicos(ServicesConfig.get_all_services())
+        snapshot = self._publicar(servicos)
+        self._registrar_metricas(list(servicos.values()))
+        return snapshot
+
+    def atualizar_servicos(self, servicos: List[str]) -> Dict:
+        """Recoleta apenas alguns serviços (ex: transição detectada pelo systemd) e publica"""
+        return self._publicar(self.service_manager.obter_status_servicos(servicos))
+
+    def _publicar(self, atualizados: Dict[str, Dict]) -> Dict:
+        """Aplica o status coletado sobre o snapshot atual e publica a nova versão"""
+        with self._lock:
+            anterior = self._snapshot
+            servicos = dict(anterior['servicos']) if anterior else {}
+            servicos.update(atualizados)
+
+            # Versão: avança só se o estado de algum serviço mudou desde o snapshot anterior
+            versao = anterior['versao'] if anterior else 0
+            versoes = dict(anterior['versoes']) if anterior else {}
+            alterados = []
+            metricas_alteradas = []
+            for nome, status in atualizados.items():
+                antes = anterior['servicos'].get(nome) if anterior else None
+                if antes is None or estado_servico(antes) != estado_servico(status):
+                    alterados.append(nome)
+                elif metricas_servico(antes) != metricas_servico(status):
+                    metricas_alteradas.append(nome)
+            if alterados:
+                versao += 1
+                for nome in alterados:
+                    versoes[nome] = versao
+
+            snapshot = {
+                'grupos': ServiceManager.agrupar_status(servicos),
+                'servicos': servicos,
+                'stats': StatisticsCalculator.calcular_estatisticas_gerais(list(servicos.values())),
+                'timestamp': datetime.now().isoformat(),
+                'coletado_em': time.monotonic(),
+                'versao': versao,
+                'versoes': versoes,
+                'etag': f'{self._geracao}-{versao}'
+            }
+
+            # Publica o snapshot trocando a referência (leitores nunca veem um estado parcial)
+            self._snapshot = snapshot
+
+        # Navegadores conectados recebem só os serviços alterados
+        if alterados:
+            canal_eventos.publicar('status', self.evento_status(snapshot, [servicos[nome] for nome in alterados]))
+        if metricas_alteradas:
+            canal_eventos.publicar('metricas', {
+                'servicos': [
+                    dict({campo: servicos[nome].get(campo) for campo in CAMPOS_METRICAS}, servico=nome)
+                    for nome in metricas_alteradas
+                ],
+                'stats': snapshot['stats']
+            })
+
+        self._avaliar_alertas(atualizados.values())
+        return snapshot
+
+    def _avaliar_alertas(self, servicos):
+        """
+        Alertas de memória/CPU dos serviços coletados
+
+        O alerta de serviço parado só é aberto/resolvido aqui sem o
+        SystemdWatcher: com ele ativo, um status do ciclo completo mais antigo
+        que a transição poderia resolver uma queda que o monitor acabou de abrir.
+        """
+        for status in servicos:
+            if status.get('stale'):
+                continue
+            try:
+                self.service_manager.avaliar_alertas(status, verificar_parado=self.verificar_parado)
+            except Exception as e:
+                print(f"[ERRO] Falha ao avaliar alertas de {status['servico']}: {e}")
+
+    def _registrar_metricas(self, servicos: List[Dict]):
+        """Guarda as métricas do ciclo no buffer em memória e grava em uma única transação"""
+        registros = [
+            {
+                'servico': s['servico'],
+                'cpu_percent': s['cpu_percent'],
+                'memory_mb': s['memoria_mb'],
+                'memory_percent': s['memoria_percent'],
+                'threads': s['threads'],
+                'status': 'active' if s['ativo'] else 'inactive',
+                'uptime_seconds': s.get('uptime_seconds', 0),
+                'pid': s['pid']
+            }
+            for s in servicos
+            if s['ativo'] and not s.get('stale') and s.get('pid', '0') != '0'
+        ]
+        if not registros:
+            return
+
+        instante = time.time()
+        self.buffer.adicionar(registros, instante)
+        self._avaliar_tendencias(registros, instante)
+        if self.metricas:
+            try:
+                self.metricas.registrar_lote(registros)
+                self.agregador.adicionar(registros)
+            except Exception as e:
+                print(f"[ERRO] Falha ao gravar métricas: {e}")
+
+    def _avaliar_tendencias(self, registros: List[Dict], instante: float):
+        """Alertas de anomalia de CPU, vazamento de memória e crescimento de threads"""
+        try:
+            for servico, tipo, severidade, mensagem in self.tendencias.avaliar(registros, instante):
+                if severidade:
+                    self.alertas.criar(servico=servico, tipo_alerta=tipo,
+                                       mensagem=mensagem, severidade=severidade)
+                else:
+                    self.alertas.normalizar(servico, tipo)
+        except Exception as e:
+            print(f"[ERRO] Falha ao avaliar tendências das métricas: {e}")
+
+    def _aplicar_retencao(self):
+        """Aplica a retenção das métricas brutas/agregadas e dos alertas resolvidos (uma vez por hora)"""
+        if time.monotonic() - self._ultima_limpeza < 3600:
+            return
+        self._ultima_limpeza = time.monotonic()
+        try:
+            if self.metricas:
+                self.metricas.limpar_antigas()
+                self.metricas.limpar_agregadas()
+            self.alertas.limpar_resolvidos()
+        except Exception as e:
+            print(f"[ERRO] Falha ao aplicar retenção de métricas/alertas: {e}")
+
+    def snapshot(self) -> Dict:
+        """Retorna o último snapshot (coleta na hora se ainda não houver nenhum)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.coletar()
+        return snapshot
+
+    def alteracoes_desde(self, etag: str) -> Optional[List[Dict]]:
+        """
+        Serviços que mudaram depois da versão informada
+
+        Returns:
+            Lista de status alterados, ou None se a versão não for desta
+            execução (o cliente deve receber o snapshot completo)
+        """
+        snapshot = self.snapshot()
+        geracao, _, versao = (etag or '').partition('-')
+        if geracao != self._geracao or not versao.isdigit() or int(versao) > snapshot['versao']:
+            return None
+
+        versao = int(versao)
+        return [
+            snapshot['servicos'][nome]
+            for nome, alterado_em in snapshot['versoes'].items()
+            if alterado_em > versao
+        ]
+
+    @staticmethod
+    def evento_status(snapshot: Dict, servicos: Optional[List[Dict]] = None) -> Dict:
+        """
+        Evento de status para o navegador: serviços (todos, se `servicos` for
+        None), estatísticas gerais e contagem por grupo
+        """
+        return {
+            'versao': snapshot['etag'],
+            'completo': servicos is None,
+            'servicos': list(snapshot['servicos'].values()) if servicos is None else servicos,
+            'stats': snapshot['stats'],
+            'grupos': {
+                nome: {'ativos': grupo['ativos'], 'total': grupo['total'],
+                       'percentual_ativo': grupo['percentual_ativo']}
+                for nome, grupo in snapshot['grupos'].items()
+            }
+        }
+
+    def obter_servico(self, servico: str) -> Optional[Dict]:
+        """Status de um serviço no último snapshot"""
+        return self.snapshot()['servicos'].get(servico)
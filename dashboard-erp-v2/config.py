@@ -20,36 +20,89 @@ class Config:
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 8050))
     
+    # Autenticação: cache de credenciais verificadas e validade do cookie de sessão (0 desativa)
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 3600))
+    
     # Banco de dados SQLite para histórico e logs
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'dashboard.db')
+    DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', 200))
+    DB_WRITE_FLUSH_MS = int(os.getenv('DB_WRITE_FLUSH_MS', 500))
+    DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 8))
     
     # Limites e timeouts
     MAX_LOG_LINES = int(os.getenv('MAX_LOG_LINES', 100))
     ACTION_TIMEOUT = int(os.getenv('ACTION_TIMEOUT', 30))
     HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 90))
     
+    # Coleta de status (consulta em lote com prazo global)
+    STATUS_DEADLINE = float(os.getenv('STATUS_DEADLINE', 4))
+    
+    # Iniciar/parar todos: serviços de um mesmo nível executados em paralelo
+    BULK_ACTION_CONCURRENCY = int(os.getenv('BULK_ACTION_CONCURRENCY', 6))
+    
+    # Monitor de transições do systemd: auto (D-Bus se disponível), dbus, poll ou off
+    SYSTEMD_WATCH_MODE = os.getenv('SYSTEMD_WATCH_MODE', 'auto').lower()
+    SYSTEMD_WATCH_INTERVAL = float(os.getenv('SYSTEMD_WATCH_INTERVAL', 1))
+    
+    # Stream de logs: um journalctl por unidade, compartilhado pelos clientes
+    LOG_STREAM_BACKLOG = int(os.getenv('LOG_STREAM_BACKLOG', 100))
+    LOG_STREAM_BUFFER = int(os.getenv('LOG_STREAM_BUFFER', 1000))
+    
+    # Busca nos logs e índice de assinaturas de erro
+    LOG_SEARCH_WORKERS = int(os.getenv('LOG_SEARCH_WORKERS', 6))
+    LOG_SEARCH_MAX_RESULTS = int(os.getenv('LOG_SEARCH_MAX_RESULTS', 1000))
+    LOG_INDEX_INTERVAL = int(os.getenv('LOG_INDEX_INTERVAL', 60))
+    LOG_INDEX_BACKFILL_HOURS = int(os.getenv('LOG_INDEX_BACKFILL_HOURS', 24))
+    
+    # Servidor: threaded (werkzeug) ou gevent (streams SSE não prendem threads)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'threaded').lower()
+    
     # Auto-refresh
     DEFAULT_REFRESH_INTERVAL = int(os.getenv('DEFAULT_REFRESH_INTERVAL', 10000))
     MIN_REFRESH_INTERVAL = int(os.getenv('MIN_REFRESH_INTERVAL', 5000))
     
-    # Alertas
+    # Alertas (abre acima do limite, resolve abaixo do limite de normalização)
+    ALERT_MEMORY_PERCENT = float(os.getenv('ALERT_MEMORY_PERCENT', 80))
+    ALERT_MEMORY_CLEAR_PERCENT = float(os.getenv('ALERT_MEMORY_CLEAR_PERCENT', 70))
+    ALERT_CPU_PERCENT = float(os.getenv('ALERT_CPU_PERCENT', 90))
+    ALERT_CPU_CLEAR_PERCENT = float(os.getenv('ALERT_CPU_CLEAR_PERCENT', 75))
+    ALERT_FLAP_WINDOW = int(os.getenv('ALERT_FLAP_WINDOW', 600))
+    ALERT_FLAP_THRESHOLD = int(os.getenv('ALERT_FLAP_THRESHOLD', 4))
+    
+    # Alertas por tendência (janela = METRICS_BUFFER_SIZE amostras)
+    ANOMALY_CPU_ALPHA = float(os.getenv('ANOMALY_CPU_ALPHA', 0.1))
+    ANOMALY_CPU_ZSCORE = float(os.getenv('ANOMALY_CPU_ZSCORE', 3))
+    ANOMALY_CPU_MIN_PERCENT = float(os.getenv('ANOMALY_CPU_MIN_PERCENT', 20))
+    ANOMALY_MIN_SAMPLES = int(os.getenv('ANOMALY_MIN_SAMPLES', 30))
+    LEAK_MIN_WINDOW_MINUTES = int(os.getenv('LEAK_MIN_WINDOW_MINUTES', 15))
+    LEAK_MIN_R2 = float(os.getenv('LEAK_MIN_R2', 0.8))
+    LEAK_HORIZON_HOURS = float(os.getenv('LEAK_HORIZON_HOURS', 6))
+    THREAD_GROWTH_PER_HOUR = float(os.getenv('THREAD_GROWTH_PER_HOUR', 100))
     ENABLE_SOUND_ALERTS = os.getenv('ENABLE_SOUND_ALERTS', 'True').lower() == 'true'
     ENABLE_EMAIL_ALERTS = os.getenv('ENABLE_EMAIL_ALERTS', 'False').lower() == 'true'
     ALERT_EMAIL = os.getenv('ALERT_EMAIL', '')
     
     # Métricas avançadas
     ENABLE_PERFORMANCE_METRICS = os.getenv('ENABLE_PERFORMANCE_METRICS', 'True').lower() == 'true'
-    METRICS_COLLECTION_INTERVAL = int(os.getenv('METRICS_COLLECTION_INTERVAL', 30))
+    METRICS_COLLECTION_INTERVAL = int(os.getenv('METRICS_COLLECTION_INTERVAL', 10))
+    METRICS_BUFFER_SIZE = int(os.getenv('METRICS_BUFFER_SIZE', 360))
+    METRICS_RAW_RETENTION_DAYS = int(os.getenv('METRICS_RAW_RETENTION_DAYS', 2))
+    METRICS_ROLLUP_1M_DAYS = int(os.getenv('METRICS_ROLLUP_1M_DAYS', 14))
+    METRICS_ROLLUP_1H_DAYS = int(os.getenv('METRICS_ROLLUP_1H_DAYS', 180))
+    METRICS_ROLLUP_1D_DAYS = int(os.getenv('METRICS_ROLLUP_1D_DAYS', 1825))
 
 
 class ServicesConfig:
     """Configuração dos serviços Protheus"""
     
     # Grupos de serviços organizados por função
+    # "depende_de": grupos que precisam estar no ar antes deste (iniciar/parar todos)
     GRUPOS = {
         "WebApp & REST": {
             "icon": "bi-globe",
             "color": "#4f46e5",
+            "depende_de": ["Slaves (Processamento)"],
             "servicos": [
                 "appserver_broker_rest",
                 "appserver_broker_webapp",
@@ -86,6 +139,7 @@ class ServicesConfig:
         "Workflows": {
             "icon": "bi-diagram-3",
             "color": "#f59e0b",
+            "depende_de": ["TSS & Integração"],
             "servicos": [
                 "appserver_wf_01_faturamento",
                 "appserver_wf_02_compras",
@@ -115,6 +169,7 @@ class ServicesConfig:
         "Monitoramento & Middleware": {
             "icon": "bi-eye",
             "color": "#14b8a6",
+            "depende_de": ["WebApp & REST"],
             "servicos": [
                 "smart-view-agent",
                 "monitorar_webapp",
@@ -131,6 +186,34 @@ class ServicesConfig:
             servicos.extend(grupo['servicos'])
         return servicos
     
+    @classmethod
+    def get_niveis_dependencia(cls):
+        """
+        Agrupa os grupos em níveis de inicialização conforme "depende_de"
+        
+        Os grupos de um nível dependem apenas de grupos de níveis anteriores.
+        
+        Returns:
+            Lista de níveis, cada um com a lista de nomes de grupos
+        """
+        pendentes = {
+            nome: set(dados.get('depende_de', [])) & set(cls.GRUPOS)
+            for nome, dados in cls.GRUPOS.items()
+        }
+        niveis = []
+        
+        while pendentes:
+            nivel = [nome for nome, deps in pendentes.items() if not deps]
+            if not nivel:
+                raise ValueError(f"Dependência circular entre os grupos: {', '.join(pendentes)}")
+            niveis.append(nivel)
+            for nome in nivel:
+                del pendentes[nome]
+            for deps in pendentes.values():
+                deps.difference_update(nivel)
+        
+        return niveis
+    
     @classmethod
     def get_service_group(cls, service_name):
         """Retorna o grupo de um serviço específico"""
@@ -148,6 +231,19 @@ class ServicesConfig:
         return "#6b7280"
 
 
+class LogsConfig:
+    """Assinaturas de erro contadas pelo índice de logs"""
+    
+    # Nome da assinatura: expressão regular (sem diferenciar maiúsculas)
+    ASSINATURAS_ERRO = {
+        "THREAD ERROR": r"THREAD ERROR",
+        "Out of memory": r"out of memory|OutOfMemory",
+        "Segmentation fault": r"segmentation fault|core dumped",
+        "Falha de conexão": r"connection (?:refused|reset|lost)|falha (?:na|de) conex",
+        "Timeout": r"timed out|timeout"
+    }
+
+
 class UsersConfig:
     """Configuração de usuários e permissões"""
     
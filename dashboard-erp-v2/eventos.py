@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Canal de eventos em tempo real
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+Evento = Tuple[int, str, Any]
+
+
+class CanalEventos:
+    """
+    Pub/sub em processo das atualizações do dashboard
+
+    Coletor, alertas e histórico publicam uma vez; cada navegador conectado
+    apenas acompanha sua posição na sequência (sem fila própria). Os últimos
+    `retencao` eventos ficam disponíveis para a reconexão (Last-Event-ID);
+    quem ficar para trás recebe um evento "perdidos" e deve se ressincronizar.
+    """
+
+    def __init__(self, retencao: int = 500):
+        self._eventos = deque(maxlen=retencao)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self) -> int:
+        """Número do último evento publicado"""
+        return self._seq
+
+    def publicar(self, tipo: str, dados: Dict):
+        with self._cond:
+            self._seq += 1
+            self._eventos.append((self._seq, tipo, dados))
+            self._cond.notify_all()
+
+    def disponivel(self, seq: int) -> bool:
+        """Se os eventos posteriores a `seq` ainda estão retidos"""
+        with self._cond:
+            primeiro = self._eventos[0][0] if self._eventos else self._seq + 1
+            return primeiro - 1 <= seq <= self._seq
+
+    def acompanhar(self, desde: int, timeout: float = 15) -> Iterator[Optional[Evento]]:
+        """
+        Gera os eventos posteriores a `desde` indefinidamente
+
+        Gera None a cada `timeout` segundos sem eventos (para keep-alive).
+        """
+        posicao = desde
+        while True:
+            with self._cond:
+                if self._seq <= posicao:
+                    self._cond.wait(timeout)
+
+                novos = []
+                if self._seq > posicao and self._eventos:
+                    primeiro = self._eventos[0][0]
+                    if posicao + 1 < primeiro:
+                        # O cliente ficou para trás da retenção
+                        novos.append((primeiro - 1, 'perdidos', None))
+                        posicao = primeiro - 1
+                    novos.extend(list(self._eventos)[posicao + 1 - primeiro:])
+
+            if not novos:
+                yield None
+            for evento in novos:
+                yield evento
+                posicao = evento[0]
+
+
+# Canal único do processo
+canal_eventos = CanalEventos()
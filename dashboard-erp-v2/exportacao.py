@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Exportação em streaming (CSV, Parquet, Arrow)
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Sequence, Tuple
+
+# Parquet/Arrow são opcionais: sem o pyarrow instalado só o CSV fica disponível
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows')
+}
+
+
+# (nome, tipo): texto, inteiro, real ou epoch (segundos; data/hora local no CSV)
+Coluna = Tuple[str, str]
+
+
+def formatos_disponiveis() -> List[str]:
+    return list(FORMATOS) if PYARROW_DISPONIVEL else ['csv']
+
+
+def exportar_csv(colunas: Sequence[Coluna], lotes: Iterator[List[Sequence]],
+                 compactar: bool = False) -> Iterator[bytes]:
+    """
+    Gera o CSV lote a lote (cabeçalho + um bloco por lote de linhas)
+
+    Apenas um lote fica em memória por vez; com `compactar` a saída é gzip.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compactar else None
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    escritor.writerow([nome for nome, _ in colunas])
+    epochs = [i for i, (_, tipo) in enumerate(colunas) if tipo == 'epoch']
+
+    for linhas in lotes:
+        if epochs:
+            linhas = [list(linha) for linha in linhas]
+            for linha in linhas:
+                for i in epochs:
+                    if linha[i] is not None:
+                        linha[i] = datetime.fromtimestamp(linha[i]).strftime('%Y-%m-%d %H:%M:%S')
+        escritor.writerows(linhas)
+        dados = texto.getvalue().encode('utf-8')
+        texto.seek(0)
+        texto.truncate()
+        dados = compressor.compress(dados) if compressor else dados
+        if dados:
+            yield dados
+
+    dados = texto.getvalue().encode('utf-8')
+    if compressor:
+        dados = compressor.compress(dados) + compressor.flush()
+    if dados:
+        yield dados
+
+
+class _Saida(io.RawIOBase):
+    """Arquivo somente de escrita cujo conteúdo é esvaziado a cada bloco enviado"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def esvaziar(self) -> bytes:
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def exportar_arrow(colunas: Sequence[Coluna], lotes: Iterator[List[Sequence]],
+                   formato: str = 'parquet') -> Iterator[bytes]:
+    """Gera Parquet (um row group por lote, zstd) ou Arrow IPC stream (um record batch por lote)"""
+    tipos = {'texto': pa.string(), 'inteiro': pa.int64(), 'real': pa.float64(), 'epoch': pa.timestamp('s')}
+    esquema = pa.schema([(nome, tipos[tipo]) for nome, tipo in colunas])
+
+    saida = _Saida()
+    if formato == 'parquet':
+        escritor = pq.ParquetWriter(saida, esquema, compression='zstd')
+    else:
+        escritor = pa.ipc.new_stream(saida, esquema)
+
+    for linhas in lotes:
+        if not linhas:
+            continue
+        escritor.write_table(pa.Table.from_arrays(
+            [pa.array([linha[i] for linha in linhas], campo.type) for i, campo in enumerate(esquema)],
+            schema=esquema
+        ))
+        dados = saida.esvaziar()
+        if dados:
+            yield dados
+
+    escritor.close()
+    dados = saida.esvaziar()
+    if dados:
+        yield dados
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Leitura do journal do systemd
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import json
+import re
+import subprocess
+import threading
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+# Valores aceitos em --since/--until (datas, "today", "-1h"...) e em -p (0-7, "err", "err..warning")
+_TEMPO_VALIDO = re.compile(r'^[0-9A-Za-z :+\-.]{1,40}$')
+_PRIORIDADE_VALIDA = re.compile(r'^[a-z0-9]{1,7}(\.\.[a-z0-9]{1,7})?$')
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def validar_tempo(valor: Optional[str]) -> Optional[str]:
+    """Valida um limite de tempo do journalctl (levanta ValueError se inválido)"""
+    if valor and not _TEMPO_VALIDO.match(valor):
+        raise ValueError(f"Data/hora inválida: {valor}")
+    return valor or None
+
+
+def validar_prioridade(valor: Optional[str]) -> Optional[str]:
+    """Valida uma prioridade/faixa de prioridades do journalctl"""
+    if valor and not _PRIORIDADE_VALIDA.match(valor.lower()):
+        raise ValueError(f"Prioridade inválida: {valor}")
+    return valor.lower() if valor else None
+
+
+def encerrar_processo(processo: subprocess.Popen, timeout: float = 2):
+    """Encerra o journalctl (e o sudo que o executa), com SIGKILL só se ele não sair no prazo"""
+    # SIGTERM é repassado pelo sudo ao journalctl; SIGKILL deixaria o journalctl órfão
+    processo.terminate()
+    try:
+        processo.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+
+
+class LeitorJournal:
+    """
+    Lê o journal com `journalctl -o json`, uma entrada por vez
+
+    Cada entrada traz o cursor do journal, que permite retomar a leitura
+    (--after-cursor) de onde parou. Os filtros de período e prioridade são
+    aplicados pelo próprio journalctl, e a saída é consumida em streaming
+    (memória constante, sem limite de tempo para períodos longos).
+    """
+
+    def comando(self, servico: str, inicio: Optional[str] = None, fim: Optional[str] = None,
+                prioridade: Optional[str] = None, cursor: Optional[str] = None,
+                linhas: Optional[int] = None, seguir: bool = False) -> List[str]:
+        """Monta a linha de comando do journalctl"""
+        cmd = ['sudo', 'journalctl', '-u', f'{servico}.service', '-o', 'json', '--no-pager']
+
+        if cursor:
+            cmd.append(f'--after-cursor={cursor}')
+        if validar_tempo(inicio):
+            cmd.append(f'--since={inicio}')
+        if validar_tempo(fim):
+            cmd.append(f'--until={fim}')
+        if validar_prioridade(prioridade):
+            cmd.append(f'--priority={prioridade.lower()}')
+        if linhas:
+            cmd.append(f'--lines={int(linhas)}')
+        if seguir:
+            cmd.append('--follow')
+
+        return cmd
+
+    def abrir(self, servico: str, **filtros) -> subprocess.Popen:
+        """Inicia o journalctl com a saída JSON em um pipe"""
+        return subprocess.Popen(
+            self.comando(servico, **filtros),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            bufsize=1
+        )
+
+    def ler(self, servico: str, **filtros) -> Iterator[Dict]:
+        """
+        Gera as entradas do journal do serviço
+
+        Args:
+            servico: Nome do serviço
+            inicio/fim: Período (formatos aceitos pelo journalctl --since/--until)
+            prioridade: Prioridade máxima ou faixa (ex: err, 0..3)
+            cursor: Continua após este cursor
+            linhas: Apenas as últimas N entradas
+            seguir: Continua aguardando novas entradas (journalctl -f)
+        """
+        processo = self.abrir(servico, **filtros)
+        try:
+            for linha in processo.stdout:
+                entrada = self.converter(linha)
+                if entrada:
+                    yield entrada
+        finally:
+            encerrar_processo(processo)
+            processo.stdout.close()
+
+    @staticmethod
+    def converter(linha: str) -> Optional[Dict]:
+        """Converte uma linha do `journalctl -o json` na entrada usada pelo dashboard"""
+        try:
+            bruto = json.loads(linha)
+        except ValueError:
+            return None
+
+        mensagem = bruto.get('MESSAGE', '')
+        if isinstance(mensagem, list):
+            # Mensagens com bytes não imprimíveis vêm como lista de inteiros
+            mensagem = bytes(mensagem).decode('utf-8', errors='replace')
+
+        try:
+            timestamp = int(bruto.get('__REALTIME_TIMESTAMP', 0)) / 1_000_000
+        except (TypeError, ValueError):
+            timestamp = 0.0
+
+        try:
+            prioridade = int(bruto.get('PRIORITY', 6))
+        except (TypeError, ValueError):
+            prioridade = 6
+
+        return {
+            'cursor': bruto.get('__CURSOR'),
+            'timestamp': timestamp,
+            'prioridade': prioridade,
+            'host': bruto.get('_HOSTNAME', ''),
+            'identificador': bruto.get('SYSLOG_IDENTIFIER') or bruto.get('_COMM', ''),
+            'pid': bruto.get('_PID', ''),
+            'mensagem': mensagem or ''
+        }
+
+    @staticmethod
+    def formatar(entrada: Dict) -> str:
+        """Formata a entrada como o `journalctl` padrão (short)"""
+        quando = datetime.fromtimestamp(entrada['timestamp']).strftime('%b %d %H:%M:%S')
+        origem = entrada['identificador']
+        if entrada['pid']:
+            origem += f"[{entrada['pid']}]"
+        return f"{quando} {entrada['host']} {origem}: {entrada['mensagem']}"
+
+    def exportar(self, servico: str, compactar: bool = True, **filtros) -> Iterator[bytes]:
+        """
+        Gera o log formatado em blocos de ~64 KB, opcionalmente compactados (gzip)
+
+        Apenas um bloco fica em memória por vez, qualquer que seja o período.
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compactar else None
+        bloco = []
+        tamanho = 0
+
+        for entrada in self.ler(servico, **filtros):
+            linha = (self.formatar(entrada) + '\n').encode('utf-8')
+            bloco.append(linha)
+            tamanho += len(linha)
+            if tamanho >= TAMANHO_BLOCO:
+                dados = b''.join(bloco)
+                bloco, tamanho = [], 0
+                dados = compressor.compress(dados) if compressor else dados
+                if dados:
+                    yield dados
+
+        dados = b''.join(bloco)
+        if compressor:
+            dados = compressor.compress(dados) + compressor.flush()
+        if dados:
+            yield dados
+
+
+class AssinaturaLogs:
+    """
+    Fila de um cliente do stream de logs
+
+    A fila é limitada: se o cliente não acompanhar, as entradas mais antigas
+    são descartadas (e contadas) em vez de travar o seguidor da unidade.
+    """
+
+    def __init__(self, capacidade: int):
+        self._fila = deque(maxlen=capacidade)
+        self._cond = threading.Condition()
+        self.descartadas = 0
+        self.encerrada = False
+
+    def entregar(self, entrada: Dict):
+        with self._cond:
+            if len(self._fila) == self._fila.maxlen:
+                self.descartadas += 1
+            self._fila.append(entrada)
+            self._cond.notify()
+
+    def encerrar(self):
+        with self._cond:
+            self.encerrada = True
+            self._cond.notify()
+
+    def receber(self, timeout: float = 15) -> List[Dict]:
+        """Retorna as entradas pendentes, aguardando até `timeout` (lista vazia = keep-alive)"""
+        with self._cond:
+            if not self._fila and not self.encerrada:
+                self._cond.wait(timeout)
+            entradas = list(self._fila)
+            self._fila.clear()
+        return entradas
+
+
+class SeguidorUnidade:
+    """Um único `journalctl --follow` por unidade, repassado a todos os assinantes"""
+
+    def __init__(self, leitor: LeitorJournal, servico: str, backlog: int):
+        self.servico = servico
+        self.backlog = deque(maxlen=backlog)
+        self.assinantes = set()
+        self._lock = threading.Lock()
+        self._processo = leitor.abrir(servico, linhas=backlog, seguir=True)
+        self._thread = threading.Thread(target=self._executar, name=f'journal-{servico}', daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        try:
+            for linha in self._processo.stdout:
+                entrada = LeitorJournal.converter(linha)
+                if not entrada:
+                    continue
+                with self._lock:
+                    self.backlog.append(entrada)
+                    assinantes = list(self.assinantes)
+                for assinatura in assinantes:
+                    assinatura.entregar(entrada)
+        except Exception as e:
+            print(f"[ERRO] Falha ao seguir o journal de {self.servico}: {e}")
+        finally:
+            with self._lock:
+                assinantes = list(self.assinantes)
+            for assinatura in assinantes:
+                assinatura.encerrar()
+
+    def assinar(self, assinatura: AssinaturaLogs, cursor: Optional[str] = None):
+        """Registra o assinante e entrega o backlog (apenas o que veio após `cursor`, se ele estiver no backlog)"""
+        with self._lock:
+            backlog = list(self.backlog)
+            cursores = [entrada['cursor'] for entrada in backlog]
+            if cursor in cursores:
+                backlog = backlog[cursores.index(cursor) + 1:]
+            for entrada in backlog:
+                assinatura.entregar(entrada)
+            self.assinantes.add(assinatura)
+
+    def cancelar(self, assinatura: AssinaturaLogs) -> bool:
+        """Remove o assinante; retorna True se não restou nenhum"""
+        with self._lock:
+            self.assinantes.discard(assinatura)
+            return not self.assinantes
+
+    @property
+    def ativo(self) -> bool:
+        return self._processo.poll() is None
+
+    def encerrar(self):
+        encerrar_processo(self._processo)
+
+
+class DistribuidorLogs:
+    """
+    Compartilha o stream de logs entre os clientes (pub/sub em processo)
+
+    O primeiro cliente de uma unidade inicia o seguidor; os demais recebem as
+    mesmas entradas, cada um com sua fila limitada e as últimas N linhas
+    como backlog. O seguidor é encerrado quando sai o último cliente.
+    """
+
+    def __init__(self, leitor: LeitorJournal, backlog: int = 100, capacidade: int = 1000):
+        self.leitor = leitor
+        self.backlog = backlog
+        self.capacidade = capacidade
+        self._seguidores = {}
+        self._lock = threading.Lock()
+
+    def assinar(self, servico: str, cursor: Optional[str] = None) -> AssinaturaLogs:
+        assinatura = AssinaturaLogs(self.capacidade)
+        with self._lock:
+            seguidor = self._seguidores.get(servico)
+            if seguidor is None or not seguidor.ativo:
+                seguidor = SeguidorUnidade(self.leitor, servico, self.backlog)
+                self._seguidores[servico] = seguidor
+            seguidor.assinar(assinatura, cursor)
+        return assinatura
+
+    def cancelar(self, servico: str, assinatura: AssinaturaLogs):
+        with self._lock:
+            seguidor = self._seguidores.get(servico)
+            if seguidor and seguidor.cancelar(assinatura):
+                del self._seguidores[servico]
+                seguidor.encerrar()
+
+    def acompanhar(self, servico: str, cursor: Optional[str] = None,
+                   timeout: float = 15) -> Iterator[Optional[Dict]]:
+        """
+        Gera as entradas da unidade para um cliente até ele desconectar
+
+        Gera None a cada `timeout` segundos sem entradas (para keep-alive).
+        """
+        assinatura = self.assinar(servico, cursor)
+        try:
+            while True:
+                entradas = assinatura.receber(timeout)
+                if not entradas:
+                    if assinatura.encerrada:
+                        return
+                    yield None
+                for entrada in entradas:
+                    yield entrada
+        finally:
+            self.cancelar(servico, assinatura)
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return {servico: len(seguidor.assinantes) for servico, seguidor in self._seguidores.items()}
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Busca nos logs e índice de assinaturas de erro
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Pattern
+
+from config import Config, LogsConfig, ServicesConfig
+from journal import LeitorJournal
+from models import ErrosLogs
+
+_FIM = object()
+
+
+def compilar_padrao(padrao: str, ignorar_caixa: bool = True) -> Pattern:
+    """Compila a expressão da busca (levanta ValueError se inválida)"""
+    if not padrao:
+        raise ValueError("Informe o padrão da busca")
+    try:
+        return re.compile(padrao, re.IGNORECASE if ignorar_caixa else 0)
+    except re.error as e:
+        raise ValueError(f"Expressão regular inválida: {e}")
+
+
+class BuscaLogs:
+    """
+    Busca uma expressão nos logs de vários serviços em paralelo
+
+    Cada serviço é lido por um journalctl próprio (com os filtros de período
+    e prioridade aplicados por ele) e as ocorrências são entregues conforme
+    aparecem, sem esperar os demais serviços.
+    """
+
+    def __init__(self, leitor: LeitorJournal, workers: Optional[int] = None):
+        self.leitor = leitor
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.LOG_SEARCH_WORKERS,
+            thread_name_prefix='busca-logs'
+        )
+
+    def buscar(self, servicos: List[str], regex: Pattern, limite: Optional[int] = None,
+               **filtros) -> Iterator[Dict]:
+        """
+        Gera as entradas cuja mensagem casa com `regex`
+
+        Ao atingir `limite` (ou se o cliente desconectar), as leituras em
+        andamento são interrompidas.
+        """
+        fila = queue.Queue(maxsize=1000)
+        cancelar = threading.Event()
+
+        def enviar(item):
+            while not cancelar.is_set():
+                try:
+                    fila.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+
+        def varrer(servico):
+            entradas = self.leitor.ler(servico, **filtros)
+            try:
+                for entrada in entradas:
+                    if cancelar.is_set():
+                        break
+                    if regex.search(entrada['mensagem']):
+                        enviar(dict(entrada, servico=servico))
+            except Exception as e:
+                enviar({'servico': servico, 'erro': str(e)})
+            finally:
+                entradas.close()
+                enviar(_FIM)
+
+        for servico in servicos:
+            self._executor.submit(varrer, servico)
+
+        pendentes = len(servicos)
+        encontradas = 0
+        try:
+            while pendentes:
+                item = fila.get()
+                if item is _FIM:
+                    pendentes -= 1
+                    continue
+                yield item
+                if 'erro' not in item:
+                    encontradas += 1
+                    if limite and encontradas >= limite:
+                        return
+        finally:
+            cancelar.set()
+
+
+class IndexadorErros:
+    """
+    Mantém a contagem por hora das assinaturas de erro de cada serviço
+
+    A cada LOG_INDEX_INTERVAL lê apenas as entradas novas do journal (após
+    o cursor salvo de cada serviço) e soma as ocorrências no banco; na
+    primeira execução lê as últimas LOG_INDEX_BACKFILL_HOURS horas. As
+    assinaturas viram uma única regex com um grupo nomeado por assinatura.
+    """
+
+    def __init__(self, leitor: LeitorJournal, intervalo: Optional[int] = None):
+        self.leitor = leitor
+        self.intervalo = intervalo or Config.LOG_INDEX_INTERVAL
+        self.erros = ErrosLogs()
+        self.nomes = {f'a{i}': nome for i, nome in enumerate(LogsConfig.ASSINATURAS_ERRO)}
+        self.regex = re.compile(
+            '|'.join(f'(?P<a{i}>{padrao})' for i, padrao in enumerate(LogsConfig.ASSINATURAS_ERRO.values())),
+            re.IGNORECASE
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.LOG_SEARCH_WORKERS,
+            thread_name_prefix='indice-erros'
+        )
+        self._ultima_limpeza = 0.0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """Inicia a thread do indexador"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='indice-erros', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.indexar()
+            except Exception as e:
+                print(f"[ERRO] Falha ao indexar erros dos logs: {e}")
+            self._limpar()
+            self._parar.wait(self.intervalo)
+
+    def indexar(self, servicos: Optional[List[str]] = None) -> int:
+        """Processa as entradas novas dos serviços e retorna quantas ocorrências foram contadas"""
+        servicos = servicos or ServicesConfig.get_all_services()
+        cursores = self.erros.obter_cursores()
+
+        contagens = {}
+        novos_cursores = {}
+        for servico, (parcial, cursor) in zip(servicos, self._executor.map(
+                lambda s: self._varrer(s, cursores.get(s)), servicos)):
+            contagens.update(parcial)
+            if cursor:
+                novos_cursores[servico] = cursor
+
+        self.erros.registrar(contagens, novos_cursores)
+        return sum(valores[0] for valores in contagens.values())
+
+    def _varrer(self, servico: str, cursor: Optional[str]):
+        if cursor:
+            filtros = {'cursor': cursor}
+        else:
+            filtros = {'inicio': f'-{Config.LOG_INDEX_BACKFILL_HOURS}h'}
+
+        contagens = {}
+        for entrada in self.leitor.ler(servico, **filtros):
+            cursor = entrada['cursor'] or cursor
+            encontrado = self.regex.search(entrada['mensagem'])
+            if not encontrado:
+                continue
+
+            instante = int(entrada['timestamp'])
+            chave = (servico, self.nomes[encontrado.lastgroup], instante // 3600 * 3600)
+            valores = contagens.get(chave)
+            if valores:
+                valores[0] += 1
+                valores[2] = max(valores[2], instante)
+            else:
+                contagens[chave] = [1, instante, instante]
+
+        return contagens, cursor
+
+    def _limpar(self):
+        if time.time() - self._ultima_limpeza < 3600:
+            return
+        self._ultima_limpeza = time.time()
+        try:
+            self.erros.limpar_antigos()
+        except Exception as e:
+            print(f"[ERRO] Falha ao limpar índice de erros: {e}")
@@ -6,31 +6,149 @@ Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
 """
 
 import sqlite3
+import atexit
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from config import Config
+from eventos import canal_eventos
 import json
 
 
-class Database:
-    """Classe para gerenciamento do banco de dados SQLite"""
+ResultadoEscrita = namedtuple('ResultadoEscrita', ['lastrowid', 'rowcount'])
+
+
+class DatabaseWriter:
+    """
+    Escritor único do SQLite
     
-    def __init__(self, db_path=None):
-        self.db_path = db_path or Config.DATABASE_PATH
-        self.init_database()
+    Uma thread dona da conexão (WAL, synchronous=NORMAL) recebe as escritas
+    por uma fila e grava em lotes: um commit a cada DB_WRITE_BATCH_SIZE
+    operações ou DB_WRITE_FLUSH_MS. As threads do Flask nunca disputam o
+    lock de escrita do SQLite.
+    """
     
-    def get_connection(self):
-        """Cria conexão com o banco"""
+    _instancias = {}
+    _instancias_lock = threading.Lock()
+    
+    @classmethod
+    def instancia(cls, db_path):
+        """Retorna o escritor do banco (um por arquivo)"""
+        with cls._instancias_lock:
+            writer = cls._instancias.get(db_path)
+            if writer is None:
+                writer = cls(db_path)
+                cls._instancias[db_path] = writer
+            return writer
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.encerrar)
+    
+    def executar(self, sql, params=(), aguardar=False):
+        """Enfileira uma escrita. Com aguardar=True grava imediatamente e retorna o resultado"""
+        return self._enfileirar(sql, [params], aguardar)
+    
+    def executar_lote(self, sql, lista_params, aguardar=False):
+        """Enfileira uma escrita com vários registros (executemany)"""
+        return self._enfileirar(sql, list(lista_params), aguardar)
+    
+    def _enfileirar(self, sql, lista_params, aguardar):
+        future = Future()
+        self._fila.put((sql, lista_params, future, aguardar))
+        if aguardar:
+            return future.result(timeout=30)
+        return future
+    
+    def encerrar(self):
+        """Grava o que estiver pendente e encerra a thread"""
+        if self._thread.is_alive():
+            self._fila.put(None)
+            self._thread.join(timeout=10)
+    
+    def _loop(self):
         conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        
+        encerrar = False
+        while not encerrar:
+            item = self._fila.get()
+            if item is None:
+                break
+            
+            lote = [item]
+            urgente = item[3]
+            limite = time.monotonic() + Config.DB_WRITE_FLUSH_MS / 1000
+            
+            # Junta mais operações até o tamanho do lote ou o tempo limite
+            while len(lote) < Config.DB_WRITE_BATCH_SIZE:
+                restante = 0 if urgente else limite - time.monotonic()
+                try:
+                    proximo = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if proximo is None:
+                    encerrar = True
+                    break
+                lote.append(proximo)
+                urgente = urgente or proximo[3]
+            
+            self._gravar(conn, lote)
+        
+        conn.close()
     
-    def init_database(self):
-        """Inicializa o banco de dados e cria tabelas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _gravar(self, conn, lote):
+        """Grava o lote em uma única transação"""
+        resultados = []
+        try:
+            cursor = conn.cursor()
+            i = 0
+            while i < len(lote):
+                sql, lista_params, future, aguardar = lote[i]
+                
+                # Operações consecutivas com o mesmo SQL viram um único executemany
+                grupo = [lote[i]]
+                if not aguardar:
+                    while (i + len(grupo) < len(lote) and lote[i + len(grupo)][0] == sql
+                           and not lote[i + len(grupo)][3]):
+                        grupo.append(lote[i + len(grupo)])
+                
+                if len(grupo) == 1 and len(lista_params) == 1:
+                    cursor.execute(sql, lista_params[0])
+                    resultados.append((future, ResultadoEscrita(cursor.lastrowid, cursor.rowcount)))
+                else:
+                    params = [p for op in grupo for p in op[1]]
+                    cursor.executemany(sql, params)
+                    for op in grupo:
+                        resultados.append((op[2], ResultadoEscrita(None, len(op[1]))))
+                i += len(grupo)
+            
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[ERRO] Falha ao gravar lote no banco: {e}")
+            for _, _, future, _ in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
         
-        # Tabela de histórico de ações
-        cursor.execute('''
+        for future, resultado in resultados:
+            future.set_result(resultado)
+
+
+# Migrações do schema: (versão, descrição, comandos). A versão aplicada fica
+# na tabela schema_version; novas alterações entram no fim da lista.
+MIGRACOES = [
+    (1, 'Schema inicial', [
+        '''
             CREATE TABLE IF NOT EXISTS historico_acoes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -43,10 +161,8 @@ class Database:
                 ip_address TEXT,
                 user_agent TEXT
             )
-        ''')
-        
-        # Tabela de métricas de performance
-        cursor.execute('''
+        ''',
+        '''
             CREATE TABLE IF NOT EXISTS metricas_servicos (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -58,10 +174,8 @@ class Database:
                 status TEXT,
                 uptime_seconds INTEGER
             )
-        ''')
-        
-        # Tabela de alertas
-        cursor.execute('''
+        ''',
+        '''
             CREATE TABLE IF NOT EXISTS alertas (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -73,347 +187,966 @@ class Database:
                 resolvido_em DATETIME,
                 resolvido_por TEXT
             )
-        ''')
-        
-        # Índices para melhor performance
-        cursor.execute('''
+        ''',
+        '''
             CREATE INDEX IF NOT EXISTS idx_historico_timestamp 
             ON historico_acoes(timestamp DESC)
-        ''')
-        
-        cursor.execute('''
+        ''',
+        '''
             CREATE INDEX IF NOT EXISTS idx_historico_servico 
             ON historico_acoes(servico, timestamp DESC)
-        ''')
-        
-        cursor.execute('''
+        ''',
+        '''
             CREATE INDEX IF NOT EXISTS idx_metricas_timestamp 
             ON metricas_servicos(timestamp DESC)
-        ''')
-        
-        cursor.execute('''
+        ''',
+        '''
             CREATE INDEX IF NOT EXISTS idx_alertas_resolvido 
             ON alertas(resolvido, timestamp DESC)
+        '''
+    ]),
+    (2, 'Agregações de métricas (1m, 1h, 1d)', [
+        '''
+            CREATE TABLE IF NOT EXISTS metricas_agregadas (
+                resolucao TEXT NOT NULL,
+                servico TEXT NOT NULL,
+                inicio INTEGER NOT NULL,
+                amostras INTEGER,
+                cpu_avg REAL,
+                cpu_min REAL,
+                cpu_max REAL,
+                cpu_p95 REAL,
+                memory_avg REAL,
+                memory_min REAL,
+                memory_max REAL,
+                memory_p95 REAL,
+                memory_percent_avg REAL,
+                PRIMARY KEY (resolucao, servico, inicio)
+            ) WITHOUT ROWID
+        '''
+    ]),
+    (3, 'Métricas com timestamp epoch e índices por serviço', [
+        '''
+            CREATE TABLE metricas_servicos_epoch (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                servico TEXT NOT NULL,
+                cpu_percent REAL,
+                memory_mb REAL,
+                memory_percent REAL,
+                threads INTEGER,
+                status TEXT,
+                uptime_seconds INTEGER
+            )
+        ''',
+        '''
+            INSERT INTO metricas_servicos_epoch
+            (id, timestamp, servico, cpu_percent, memory_mb, memory_percent, threads, status, uptime_seconds)
+            SELECT id, CAST(strftime('%s', timestamp) AS INTEGER), servico, cpu_percent, memory_mb,
+                   memory_percent, threads, status, uptime_seconds
+            FROM metricas_servicos
+        ''',
+        'DROP TABLE metricas_servicos',
+        'ALTER TABLE metricas_servicos_epoch RENAME TO metricas_servicos',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_metricas_timestamp 
+            ON metricas_servicos(timestamp DESC)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_metricas_servico 
+            ON metricas_servicos(servico, timestamp DESC)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_historico_usuario 
+            ON historico_acoes(usuario, timestamp DESC)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_alertas_servico 
+            ON alertas(servico, resolvido, timestamp DESC)
+        '''
+    ]),
+    (4, 'Índice de assinaturas de erro nos logs', [
+        '''
+            CREATE TABLE IF NOT EXISTS erros_logs (
+                servico TEXT NOT NULL,
+                assinatura TEXT NOT NULL,
+                hora INTEGER NOT NULL,
+                ocorrencias INTEGER NOT NULL,
+                primeira INTEGER NOT NULL,
+                ultima INTEGER NOT NULL,
+                PRIMARY KEY (servico, assinatura, hora)
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_erros_logs_hora 
+            ON erros_logs(hora)
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS cursores_journal (
+                servico TEXT PRIMARY KEY,
+                cursor TEXT NOT NULL,
+                atualizado_em INTEGER NOT NULL
+            )
+        '''
+    ]),
+    (5, 'Alertas deduplicados por fingerprint (servico:tipo_alerta)', [
+        'ALTER TABLE alertas ADD COLUMN fingerprint TEXT',
+        "ALTER TABLE alertas ADD COLUMN estado TEXT NOT NULL DEFAULT 'aberto'",
+        'ALTER TABLE alertas ADD COLUMN ocorrencias INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE alertas ADD COLUMN ultima_ocorrencia DATETIME',
+        'ALTER TABLE alertas ADD COLUMN reconhecido_em DATETIME',
+        'ALTER TABLE alertas ADD COLUMN reconhecido_por TEXT',
+        'ALTER TABLE alertas ADD COLUMN flapping INTEGER NOT NULL DEFAULT 0',
+        '''
+            UPDATE alertas SET
+                fingerprint = servico || ':' || tipo_alerta,
+                ultima_ocorrencia = timestamp,
+                estado = CASE WHEN resolvido THEN 'resolvido' ELSE 'aberto' END
+        ''',
+        # Alertas repetidos ainda abertos viram um só (o mais recente), com a contagem
+        '''
+            UPDATE alertas SET
+                ocorrencias = (SELECT COUNT(*) FROM alertas a
+                               WHERE a.fingerprint = alertas.fingerprint AND a.resolvido = 0),
+                timestamp = (SELECT MIN(a.timestamp) FROM alertas a
+                             WHERE a.fingerprint = alertas.fingerprint AND a.resolvido = 0)
+            WHERE resolvido = 0
+              AND id IN (SELECT MAX(id) FROM alertas WHERE resolvido = 0 GROUP BY fingerprint)
+        ''',
+        '''
+            DELETE FROM alertas
+            WHERE resolvido = 0
+              AND id NOT IN (SELECT MAX(id) FROM alertas WHERE resolvido = 0 GROUP BY fingerprint)
+        ''',
+        '''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_alertas_fingerprint_ativo 
+            ON alertas(fingerprint) WHERE resolvido = 0
+        '''
+    ]),
+]
+
+# Consultas frequentes que devem usar índice (conferidas por Database.verificar_indices)
+CONSULTAS_INDEXADAS = {
+    'metricas_ultimas': (
+        'SELECT * FROM metricas_servicos WHERE servico = ? ORDER BY timestamp DESC LIMIT ?',
+        ('servico', 100)
+    ),
+    'metricas_periodo': (
+        'SELECT AVG(cpu_percent) FROM metricas_servicos WHERE servico = ? AND timestamp >= ?',
+        ('servico', 0)
+    ),
+    'metricas_limpeza': (
+        'SELECT COUNT(*) FROM metricas_servicos WHERE timestamp < ?',
+        (0,)
+    ),
+    'agregadas_serie': (
+        'SELECT * FROM metricas_agregadas WHERE resolucao = ? AND servico = ? AND inicio >= ? AND inicio < ?',
+        ('1h', 'servico', 0, 0)
+    ),
+    'metricas_exportacao': (
+        'SELECT * FROM metricas_servicos WHERE servico = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp',
+        ('servico', 0, 0)
+    ),
+    'historico_exportacao': (
+        'SELECT * FROM historico_acoes WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp',
+        ('', '')
+    ),
+    'historico_servico': (
+        'SELECT * FROM historico_acoes WHERE 1=1 AND servico = ? ORDER BY timestamp DESC LIMIT ?',
+        ('servico', 100)
+    ),
+    'historico_usuario': (
+        'SELECT * FROM historico_acoes WHERE 1=1 AND usuario = ? ORDER BY timestamp DESC LIMIT ?',
+        ('usuario', 100)
+    ),
+    'erros_logs_servico': (
+        'SELECT * FROM erros_logs WHERE servico = ? AND hora >= ?',
+        ('servico', 0)
+    ),
+    'erros_logs_limpeza': (
+        'SELECT COUNT(*) FROM erros_logs WHERE hora < ?',
+        (0,)
+    ),
+    'alertas_ativos_servico': (
+        'SELECT * FROM alertas WHERE resolvido = 0 AND servico = ? ORDER BY timestamp DESC',
+        ('servico',)
+    ),
+}
+
+
+class Database:
+    """Classe para gerenciamento do banco de dados SQLite"""
+    
+    _inicializados = set()
+    _init_lock = threading.Lock()
+    _pools = {}
+    
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.init_database()
+        self.writer = DatabaseWriter.instancia(self.db_path)
+    
+    def get_connection(self):
+        """Cria conexão com o banco"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    @contextmanager
+    def leitura(self):
+        """
+        Empresta uma conexão de leitura reutilizável
+        
+        As conexões ficam abertas em um pool por arquivo (o servidor do Flask
+        cria uma thread por requisição, então conexões por thread não seriam
+        reaproveitadas) e mantêm o cache de statements preparados do sqlite3.
+        Escritas passam pelo DatabaseWriter.
+        """
+        with self._init_lock:
+            pool = self._pools.setdefault(self.db_path, queue.LifoQueue())
+        
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA query_only = 1')
+        
+        try:
+            yield conn
+        finally:
+            if pool.qsize() < Config.DB_READ_POOL_SIZE:
+                pool.put(conn)
+            else:
+                conn.close()
+    
+    def init_database(self):
+        """Cria/atualiza o schema (uma vez por processo)"""
+        if self.db_path in self._inicializados:
+            return
+        
+        with self._init_lock:
+            if self.db_path in self._inicializados:
+                return
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                self._aplicar_migracoes(conn)
+            finally:
+                conn.close()
+            self._inicializados.add(self.db_path)
+    
+    def _aplicar_migracoes(self, conn):
+        """Aplica as migrações ainda não registradas em schema_version"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versao INTEGER PRIMARY KEY,
+                descricao TEXT,
+                aplicada_em DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
         ''')
+        versao_atual = conn.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
         
-        conn.commit()
-        conn.close()
+        # Transação explícita: DDL e cópia de dados de uma migração são atômicos
+        conn.isolation_level = None
+        for versao, descricao, comandos in MIGRACOES:
+            if versao <= versao_atual:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for comando in comandos:
+                    conn.execute(comando)
+                conn.execute(
+                    'INSERT INTO schema_version (versao, descricao) VALUES (?, ?)',
+                    (versao, descricao)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    
+    def versao_schema(self):
+        """Versão atual do schema"""
+        with self.leitura() as conn:
+            return conn.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
+    
+    def verificar_indices(self):
+        """
+        Confere com EXPLAIN QUERY PLAN se as consultas frequentes usam índice
+        
+        Returns:
+            dict nome -> {'ok': bool, 'plano': [linhas do plano]}
+        """
+        resultado = {}
+        with self.leitura() as conn:
+            for nome, (sql, params) in CONSULTAS_INDEXADAS.items():
+                plano = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+                # Varredura completa aparece como "SCAN <tabela>" sem "USING ... INDEX"
+                varredura = any(
+                    linha.startswith('SCAN') and 'INDEX' not in linha
+                    for linha in plano
+                )
+                ordenacao = any('USE TEMP B-TREE' in linha for linha in plano)
+                resultado[nome] = {'ok': not varredura and not ordenacao, 'plano': plano}
+        return resultado
 
 
 class HistoricoAcoes:
     """Modelo para histórico de ações"""
     
+    COLUNAS_EXPORTACAO = [
+        ('timestamp', 'texto'), ('usuario', 'texto'), ('nome_completo', 'texto'), ('servico', 'texto'),
+        ('acao', 'texto'), ('status', 'texto'), ('mensagem', 'texto'), ('ip_address', 'texto')
+    ]
+    
     def __init__(self):
         self.db = Database()
     
     def registrar(self, usuario, servico, acao, status='sucesso', mensagem=None, 
                   nome_completo=None, ip_address=None, user_agent=None):
         """Registra uma ação no histórico"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.db.writer.executar('''
             INSERT INTO historico_acoes 
             (usuario, nome_completo, servico, acao, status, mensagem, ip_address, user_agent)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (usuario, nome_completo, servico, acao, status, mensagem, ip_address, user_agent))
         
-        conn.commit()
-        conn.close()
+        canal_eventos.publicar('historico', {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+            'usuario': usuario,
+            'nome_completo': nome_completo,
+            'servico': servico,
+            'acao': acao,
+            'status': status,
+            'mensagem': mensagem
+        })
     
     def obter_recentes(self, limite=100, servico=None, usuario=None):
         """Obtém ações recentes"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        query = 'SELECT * FROM historico_acoes WHERE 1=1'
-        params = []
-        
-        if servico:
-            query += ' AND servico = ?'
-            params.append(servico)
-        
-        if usuario:
-            query += ' AND usuario = ?'
-            params.append(usuario)
-        
-        query += ' ORDER BY timestamp DESC LIMIT ?'
-        params.append(limite)
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            query = 'SELECT * FROM historico_acoes WHERE 1=1'
+            params = []
+            
+            if servico:
+                query += ' AND servico = ?'
+                params.append(servico)
+            
+            if usuario:
+                query += ' AND usuario = ?'
+                params.append(usuario)
+            
+            query += ' ORDER BY timestamp DESC LIMIT ?'
+            params.append(limite)
+            
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
     
     def obter_por_periodo(self, data_inicio, data_fim, servico=None):
         """Obtém ações em um período específico"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            query = '''
+                SELECT * FROM historico_acoes 
+                WHERE timestamp BETWEEN ? AND ?
+            '''
+            params = [data_inicio, data_fim]
+            
+            if servico:
+                query += ' AND servico = ?'
+                params.append(servico)
+            
+            query += ' ORDER BY timestamp DESC'
+            
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def iterar_periodo(self, inicio, fim, servico=None, tamanho_lote=1000):
+        """
+        Gera as ações de [inicio, fim) em lotes de tuplas (COLUNAS_EXPORTACAO), da mais antiga à mais recente
         
-        query = '''
-            SELECT * FROM historico_acoes 
-            WHERE timestamp BETWEEN ? AND ?
-        '''
-        params = [data_inicio, data_fim]
+        Lê o cursor do SQLite com fetchmany: o período pode ser de qualquer
+        tamanho sem carregar tudo em memória.
+        
+        Args:
+            inicio/fim: Período em epoch (segundos); o banco guarda UTC
+        """
+        def utc(instante):
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(instante))
         
+        colunas = ', '.join(nome for nome, _ in self.COLUNAS_EXPORTACAO)
+        query = f'SELECT {colunas} FROM historico_acoes WHERE timestamp >= ? AND timestamp < ?'
+        params = [utc(inicio), utc(fim)]
         if servico:
             query += ' AND servico = ?'
             params.append(servico)
+        query += ' ORDER BY timestamp'
         
-        query += ' ORDER BY timestamp DESC'
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        with self.db.leitura() as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                yield [tuple(linha) for linha in linhas]
     
     def limpar_antigos(self, dias=None):
         """Remove registros antigos"""
         dias = dias or Config.HISTORY_RETENTION_DAYS
         data_limite = datetime.now() - timedelta(days=dias)
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        resultado = self.db.writer.executar('''
             DELETE FROM historico_acoes 
             WHERE timestamp < ?
-        ''', (data_limite,))
-        
-        removidos = cursor.rowcount
-        conn.commit()
-        conn.close()
+        ''', (data_limite,), aguardar=True)
         
-        return removidos
+        return resultado.rowcount
     
     def estatisticas(self, periodo_dias=7):
         """Retorna estatísticas do histórico"""
         data_inicio = datetime.now() - timedelta(days=periodo_dias)
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        # Total de ações
-        cursor.execute('''
-            SELECT COUNT(*) as total 
-            FROM historico_acoes 
-            WHERE timestamp >= ?
-        ''', (data_inicio,))
-        total_acoes = cursor.fetchone()['total']
-        
-        # Ações por tipo
-        cursor.execute('''
-            SELECT acao, COUNT(*) as count 
-            FROM historico_acoes 
-            WHERE timestamp >= ?
-            GROUP BY acao
-            ORDER BY count DESC
-        ''', (data_inicio,))
-        acoes_por_tipo = [dict(row) for row in cursor.fetchall()]
-        
-        # Usuários mais ativos
-        cursor.execute('''
-            SELECT usuario, nome_completo, COUNT(*) as count 
-            FROM historico_acoes 
-            WHERE timestamp >= ?
-            GROUP BY usuario
-            ORDER BY count DESC
-            LIMIT 5
-        ''', (data_inicio,))
-        usuarios_ativos = [dict(row) for row in cursor.fetchall()]
-        
-        # Serviços mais manipulados
-        cursor.execute('''
-            SELECT servico, COUNT(*) as count 
-            FROM historico_acoes 
-            WHERE timestamp >= ? AND servico IS NOT NULL
-            GROUP BY servico
-            ORDER BY count DESC
-            LIMIT 10
-        ''', (data_inicio,))
-        servicos_manipulados = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return {
-            'total_acoes': total_acoes,
-            'acoes_por_tipo': acoes_por_tipo,
-            'usuarios_ativos': usuarios_ativos,
-            'servicos_manipulados': servicos_manipulados,
-            'periodo_dias': periodo_dias
-        }
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            # Total de ações
+            cursor.execute('''
+                SELECT COUNT(*) as total 
+                FROM historico_acoes 
+                WHERE timestamp >= ?
+            ''', (data_inicio,))
+            total_acoes = cursor.fetchone()['total']
+            
+            # Ações por tipo
+            cursor.execute('''
+                SELECT acao, COUNT(*) as count 
+                FROM historico_acoes 
+                WHERE timestamp >= ?
+                GROUP BY acao
+                ORDER BY count DESC
+            ''', (data_inicio,))
+            acoes_por_tipo = [dict(row) for row in cursor.fetchall()]
+            
+            # Usuários mais ativos
+            cursor.execute('''
+                SELECT usuario, nome_completo, COUNT(*) as count 
+                FROM historico_acoes 
+                WHERE timestamp >= ?
+                GROUP BY usuario
+                ORDER BY count DESC
+                LIMIT 5
+            ''', (data_inicio,))
+            usuarios_ativos = [dict(row) for row in cursor.fetchall()]
+            
+            # Serviços mais manipulados
+            cursor.execute('''
+                SELECT servico, COUNT(*) as count 
+                FROM historico_acoes 
+                WHERE timestamp >= ? AND servico IS NOT NULL
+                GROUP BY servico
+                ORDER BY count DESC
+                LIMIT 10
+            ''', (data_inicio,))
+            servicos_manipulados = [dict(row) for row in cursor.fetchall()]
+            
+            return {
+                'total_acoes': total_acoes,
+                'acoes_por_tipo': acoes_por_tipo,
+                'usuarios_ativos': usuarios_ativos,
+                'servicos_manipulados': servicos_manipulados,
+                'periodo_dias': periodo_dias
+            }
 
 
 class MetricasServicos:
     """Modelo para métricas de performance dos serviços"""
     
+    COLUNAS_EXPORTACAO = [
+        ('timestamp', 'epoch'), ('servico', 'texto'), ('cpu_percent', 'real'), ('memory_mb', 'real'),
+        ('memory_percent', 'real'), ('threads', 'inteiro'), ('status', 'texto')
+    ]
+    
     def __init__(self):
         self.db = Database()
     
     def registrar(self, servico, cpu_percent=None, memory_mb=None, 
                   memory_percent=None, threads=None, status=None, uptime_seconds=None):
         """Registra métricas de um serviço"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.db.writer.executar('''
             INSERT INTO metricas_servicos 
             (servico, cpu_percent, memory_mb, memory_percent, threads, status, uptime_seconds)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (servico, cpu_percent, memory_mb, memory_percent, threads, status, uptime_seconds))
-        
-        conn.commit()
-        conn.close()
+            VALUES (:servico, :cpu_percent, :memory_mb, :memory_percent, :threads, :status, :uptime_seconds)
+        ''', {
+            'servico': servico, 'cpu_percent': cpu_percent, 'memory_mb': memory_mb,
+            'memory_percent': memory_percent, 'threads': threads, 'status': status,
+            'uptime_seconds': uptime_seconds
+        })
+    
+    def registrar_lote(self, registros):
+        """Registra as métricas de vários serviços em uma única transação"""
+        self.db.writer.executar_lote('''
+            INSERT INTO metricas_servicos 
+            (servico, cpu_percent, memory_mb, memory_percent, threads, status, uptime_seconds)
+            VALUES (:servico, :cpu_percent, :memory_mb, :memory_percent, :threads, :status, :uptime_seconds)
+        ''', registros)
     
     def obter_ultimas(self, servico, limite=100):
         """Obtém últimas métricas de um serviço"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT * FROM metricas_servicos 
+                WHERE servico = ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (servico, limite))
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def iterar_periodo(self, servico, inicio, fim, tamanho_lote=1000):
+        """Gera as métricas brutas de [inicio, fim) em lotes de tuplas (COLUNAS_EXPORTACAO), em ordem cronológica"""
+        colunas = ', '.join(nome for nome, _ in self.COLUNAS_EXPORTACAO)
         
-        cursor.execute('''
-            SELECT * FROM metricas_servicos 
-            WHERE servico = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (servico, limite))
+        with self.db.leitura() as conn:
+            cursor = conn.execute(f'''
+                SELECT {colunas} FROM metricas_servicos
+                WHERE servico = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            ''', (servico, int(inicio), int(fim)))
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                yield [tuple(linha) for linha in linhas]
+    
+    def obter_serie(self, servico, inicio, fim=None, passo=None):
+        """
+        Série de métricas agregadas de um período
         
-        rows = cursor.fetchall()
-        conn.close()
+        Usa a resolução mais grossa (1d, 1h, 1m) que ainda atende ao passo
+        pedido; sem passo, mira em cerca de 120 pontos.
+        
+        Args:
+            inicio/fim: Período em epoch (segundos)
+            passo: Intervalo desejado entre pontos, em segundos
         
-        return [dict(row) for row in rows]
+        Returns:
+            (resolucao, lista de pontos)
+        """
+        fim = fim or time.time()
+        passo = passo or max((fim - inicio) / 120, 60)
+        
+        resolucao, tamanho = '1m', 60
+        for nome, segundos in (('1d', 86400), ('1h', 3600)):
+            if segundos <= passo:
+                resolucao, tamanho = nome, segundos
+                break
+        
+        with self.db.leitura() as conn:
+            rows = conn.execute('''
+                SELECT * FROM metricas_agregadas
+                WHERE resolucao = ? AND servico = ? AND inicio >= ? AND inicio < ?
+                ORDER BY inicio
+            ''', (resolucao, servico, int(inicio // tamanho * tamanho), fim)).fetchall()
+            return resolucao, [dict(row) for row in rows]
     
     def obter_media_periodo(self, servico, horas=24):
         """Obtém média das métricas em um período"""
-        data_inicio = datetime.now() - timedelta(hours=horas)
-        
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                AVG(cpu_percent) as cpu_avg,
-                AVG(memory_mb) as memory_avg,
-                AVG(memory_percent) as memory_percent_avg,
-                MAX(cpu_percent) as cpu_max,
-                MAX(memory_mb) as memory_max,
-                MIN(cpu_percent) as cpu_min,
-                MIN(memory_mb) as memory_min
-            FROM metricas_servicos
-            WHERE servico = ? AND timestamp >= ?
-        ''', (servico, data_inicio))
+        # Agregações por hora (ou minuto em períodos curtos), sem varrer a tabela bruta
+        resolucao = '1h' if horas >= 2 else '1m'
+        tamanho = 3600 if resolucao == '1h' else 60
+        inicio = int((time.time() - horas * 3600) // tamanho * tamanho)
         
-        row = cursor.fetchone()
-        conn.close()
+        with self.db.leitura() as conn:
+            row = conn.execute('''
+                SELECT 
+                    SUM(cpu_avg * amostras) / SUM(amostras) as cpu_avg,
+                    SUM(memory_avg * amostras) / SUM(amostras) as memory_avg,
+                    SUM(memory_percent_avg * amostras) / SUM(amostras) as memory_percent_avg,
+                    MAX(cpu_max) as cpu_max,
+                    MAX(memory_max) as memory_max,
+                    MIN(cpu_min) as cpu_min,
+                    MIN(memory_min) as memory_min
+                FROM metricas_agregadas
+                WHERE resolucao = ? AND servico = ? AND inicio >= ?
+            ''', (resolucao, servico, inicio)).fetchone()
+            if row and row['cpu_avg'] is not None:
+                return dict(row)
         
-        return dict(row) if row else None
-    
-    def limpar_antigas(self, dias=30):
-        """Remove métricas antigas"""
-        data_limite = datetime.now() - timedelta(days=dias)
+        data_inicio = int(time.time() - horas * 3600)
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT 
+                    AVG(cpu_percent) as cpu_avg,
+                    AVG(memory_mb) as memory_avg,
+                    AVG(memory_percent) as memory_percent_avg,
+                    MAX(cpu_percent) as cpu_max,
+                    MAX(memory_mb) as memory_max,
+                    MIN(cpu_percent) as cpu_min,
+                    MIN(memory_mb) as memory_min
+                FROM metricas_servicos
+                WHERE servico = ? AND timestamp >= ?
+            ''', (servico, data_inicio))
+            
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def limpar_antigas(self, dias=None):
+        """Remove métricas brutas antigas (o histórico longo fica nas agregações)"""
+        dias = dias or Config.METRICS_RAW_RETENTION_DAYS
+        data_limite = int(time.time() - dias * 86400)
         
-        cursor.execute('''
+        resultado = self.db.writer.executar('''
             DELETE FROM metricas_servicos 
             WHERE timestamp < ?
-        ''', (data_limite,))
+        ''', (data_limite,), aguardar=True)
         
-        removidos = cursor.rowcount
-        conn.commit()
-        conn.close()
+        return resultado.rowcount
+    
+    def limpar_agregadas(self):
+        """Remove agregações fora da retenção de cada resolução"""
+        agora = time.time()
+        retencao = {
+            '1m': Config.METRICS_ROLLUP_1M_DAYS,
+            '1h': Config.METRICS_ROLLUP_1H_DAYS,
+            '1d': Config.METRICS_ROLLUP_1D_DAYS
+        }
+        
+        removidos = 0
+        for resolucao, dias in retencao.items():
+            resultado = self.db.writer.executar('''
+                DELETE FROM metricas_agregadas 
+                WHERE resolucao = ? AND inicio < ?
+            ''', (resolucao, agora - dias * 86400), aguardar=True)
+            removidos += resultado.rowcount
         
         return removidos
 
 
 class Alertas:
-    """Modelo para alertas do sistema"""
+    """
+    Modelo para alertas do sistema
+    
+    Um alerta é identificado pelo fingerprint (servico:tipo_alerta): enquanto
+    estiver aberto ou reconhecido, novas ocorrências só incrementam o contador
+    da mesma linha. Os alertas ativos ficam em um índice em memória (carregado
+    uma vez por processo), usado por todas as instâncias do modelo.
+    
+    Um fingerprint que abre e fecha ALERT_FLAP_THRESHOLD vezes dentro de
+    ALERT_FLAP_WINDOW segundos é marcado como flapping: reabre sem notificar
+    e só é resolvido automaticamente após uma janela inteira sem ocorrências.
+    """
+    
+    _ativos = None          # fingerprint -> alerta (dict)
+    _transicoes = {}        # fingerprint -> instantes de abertura/fechamento recentes
+    _ultimo_disparo = {}    # fingerprint -> instante da última ocorrência
+    _lock = threading.RLock()
+    
+    SEVERIDADES = {'info': 0, 'warning': 1, 'critical': 2}
     
     def __init__(self):
         self.db = Database()
+        self._carregar_ativos()
+    
+    @staticmethod
+    def fingerprint(servico, tipo_alerta):
+        return f'{servico}:{tipo_alerta}'
+    
+    @staticmethod
+    def _agora():
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    
+    def _carregar_ativos(self):
+        with Alertas._lock:
+            if Alertas._ativos is not None:
+                return
+            with self.db.leitura() as conn:
+                rows = conn.execute('SELECT * FROM alertas WHERE resolvido = 0').fetchall()
+            Alertas._ativos = {row['fingerprint']: dict(row) for row in rows}
+    
+    def _registrar_transicao(self, fp, agora):
+        """Registra abertura/fechamento e retorna se o fingerprint está oscilando"""
+        janela = Alertas._transicoes.setdefault(fp, deque())
+        janela.append(agora)
+        while janela and janela[0] < agora - Config.ALERT_FLAP_WINDOW:
+            janela.popleft()
+        return len(janela) >= Config.ALERT_FLAP_THRESHOLD
     
     def criar(self, servico, tipo_alerta, mensagem, severidade='warning'):
-        """Cria um novo alerta"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO alertas 
-            (servico, tipo_alerta, severidade, mensagem)
-            VALUES (?, ?, ?, ?)
-        ''', (servico, tipo_alerta, severidade, mensagem))
-        
-        alerta_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        """
+        Registra uma ocorrência do alerta
         
-        return alerta_id
-    
-    def resolver(self, alerta_id, resolvido_por):
-        """Marca um alerta como resolvido"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        Abre um alerta novo (e notifica) ou, se já houver um ativo com o mesmo
+        fingerprint, incrementa as ocorrências dele (notifica só se a
+        severidade aumentar).
         
-        cursor.execute('''
-            UPDATE alertas 
-            SET resolvido = 1, resolvido_em = CURRENT_TIMESTAMP, resolvido_por = ?
-            WHERE id = ?
-        ''', (resolvido_por, alerta_id))
+        Returns:
+            ID do alerta
+        """
+        fp = self.fingerprint(servico, tipo_alerta)
+        agora = time.time()
         
-        conn.commit()
-        conn.close()
+        with Alertas._lock:
+            Alertas._ultimo_disparo[fp] = agora
+            alerta = Alertas._ativos.get(fp)
+            
+            if alerta:
+                escalado = self.SEVERIDADES.get(severidade, 0) > self.SEVERIDADES.get(alerta['severidade'], 0)
+                alerta['ocorrencias'] += 1
+                alerta['ultima_ocorrencia'] = self._agora()
+                alerta['mensagem'] = mensagem
+                if escalado:
+                    alerta['severidade'] = severidade
+                
+                self.db.writer.executar('''
+                    UPDATE alertas 
+                    SET ocorrencias = ocorrencias + 1, ultima_ocorrencia = CURRENT_TIMESTAMP,
+                        mensagem = ?, severidade = ?
+                    WHERE id = ?
+                ''', (mensagem, alerta['severidade'], alerta['id']))
+                
+                if escalado and not alerta['flapping']:
+                    canal_eventos.publicar('alerta', dict(alerta, escalado=True))
+                return alerta['id']
+            
+            flapping = self._registrar_transicao(fp, agora)
+            resultado = self.db.writer.executar('''
+                INSERT INTO alertas 
+                (servico, tipo_alerta, severidade, mensagem, fingerprint, ultima_ocorrencia, flapping)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ''', (servico, tipo_alerta, severidade, mensagem, fp, int(flapping)), aguardar=True)
+            
+            alerta = {
+                'id': resultado.lastrowid,
+                'timestamp': self._agora(),
+                'servico': servico,
+                'tipo_alerta': tipo_alerta,
+                'severidade': severidade,
+                'mensagem': mensagem,
+                'resolvido': 0,
+                'resolvido_em': None,
+                'resolvido_por': None,
+                'fingerprint': fp,
+                'estado': 'aberto',
+                'ocorrencias': 1,
+                'ultima_ocorrencia': self._agora(),
+                'reconhecido_em': None,
+                'reconhecido_por': None,
+                'flapping': int(flapping)
+            }
+            Alertas._ativos[fp] = alerta
+        
+        # Alerta oscilando não gera notificação a cada reabertura
+        if not flapping:
+            canal_eventos.publicar('alerta', alerta)
+        
+        return alerta['id']
     
-    def obter_ativos(self, servico=None):
-        """Obtém alertas não resolvidos"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+    def normalizar(self, servico, tipo_alerta):
+        """
+        A condição do alerta deixou de ocorrer: resolve o alerta ativo (se houver)
         
-        query = 'SELECT * FROM alertas WHERE resolvido = 0'
-        params = []
+        Alertas em flapping só são resolvidos após ALERT_FLAP_WINDOW segundos
+        sem novas ocorrências.
         
-        if servico:
-            query += ' AND servico = ?'
-            params.append(servico)
+        Returns:
+            True se um alerta foi resolvido
+        """
+        fp = self.fingerprint(servico, tipo_alerta)
         
-        query += ' ORDER BY timestamp DESC'
+        with Alertas._lock:
+            alerta = Alertas._ativos.get(fp)
+            if not alerta:
+                return False
+            agora = time.time()
+            if alerta['flapping'] and agora - Alertas._ultimo_disparo.get(fp, 0) < Config.ALERT_FLAP_WINDOW:
+                return False
+            # Retira e resolve sob o mesmo lock: um criar() concorrente abre um alerta novo
+            Alertas._ativos.pop(fp)
+            self._registrar_transicao(fp, agora)
+            self._gravar_resolucao(alerta['id'], 'sistema', alerta)
+        return True
+    
+    def reconhecer(self, alerta_id, reconhecido_por):
+        """Marca um alerta ativo como reconhecido (continua contando ocorrências)"""
+        with Alertas._lock:
+            alerta = next((a for a in Alertas._ativos.values() if a['id'] == alerta_id), None)
+            if alerta:
+                alerta['estado'] = 'reconhecido'
+                alerta['reconhecido_em'] = self._agora()
+                alerta['reconhecido_por'] = reconhecido_por
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        self.db.writer.executar('''
+            UPDATE alertas 
+            SET estado = 'reconhecido', reconhecido_em = CURRENT_TIMESTAMP, reconhecido_por = ?
+            WHERE id = ? AND resolvido = 0
+        ''', (reconhecido_por, alerta_id), aguardar=True)
+    
+    def resolver(self, alerta_id, resolvido_por):
+        """Marca um alerta como resolvido"""
+        with Alertas._lock:
+            fp = next((f for f, a in Alertas._ativos.items() if a['id'] == alerta_id), None)
+            alerta = Alertas._ativos.pop(fp, None) if fp else None
+            self._gravar_resolucao(alerta_id, resolvido_por, alerta)
+    
+    def _gravar_resolucao(self, alerta_id, resolvido_por, alerta=None):
+        """Grava a resolução e notifica (chamado com Alertas._lock, já fora do índice)"""
+        self.db.writer.executar('''
+            UPDATE alertas 
+            SET resolvido = 1, estado = 'resolvido', resolvido_em = CURRENT_TIMESTAMP, resolvido_por = ?
+            WHERE id = ?
+        ''', (resolvido_por, alerta_id), aguardar=True)
+        
+        if alerta:
+            canal_eventos.publicar('alerta_resolvido', {
+                'id': alerta_id,
+                'servico': alerta['servico'],
+                'tipo_alerta': alerta['tipo_alerta'],
+                'resolvido_por': resolvido_por
+            })
+    
+    def obter_ativos(self, servico=None, limite=100):
+        """Obtém alertas não resolvidos (do índice em memória), mais recentes primeiro"""
+        with Alertas._lock:
+            ativos = [
+                dict(alerta) for alerta in Alertas._ativos.values()
+                if not servico or alerta['servico'] == servico
+            ]
         
-        return [dict(row) for row in rows]
+        ativos.sort(key=lambda a: a['ultima_ocorrencia'] or a['timestamp'], reverse=True)
+        return ativos[:limite] if limite else ativos
     
     def obter_recentes(self, limite=50):
         """Obtém alertas recentes"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT * FROM alertas 
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (limite,))
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def contar_por_severidade(self):
+        """Conta alertas ativos por severidade"""
+        contagem = {}
+        with Alertas._lock:
+            for alerta in Alertas._ativos.values():
+                contagem[alerta['severidade']] = contagem.get(alerta['severidade'], 0) + 1
+        return contagem
+    
+    def limpar_resolvidos(self, dias=None):
+        """Remove alertas resolvidos mais antigos que a retenção do histórico"""
+        dias = dias or Config.HISTORY_RETENTION_DAYS
+        data_limite = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - dias * 86400))
         
-        cursor.execute('''
-            SELECT * FROM alertas 
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limite,))
+        resultado = self.db.writer.executar('''
+            DELETE FROM alertas 
+            WHERE resolvido = 1 AND timestamp < ?
+        ''', (data_limite,), aguardar=True)
         
-        rows = cursor.fetchall()
-        conn.close()
+        return resultado.rowcount
+
+
+class ErrosLogs:
+    """Modelo para o índice de assinaturas de erro dos logs (contagem por hora)"""
+    
+    def __init__(self):
+        self.db = Database()
+    
+    def registrar(self, contagens, cursores):
+        """
+        Soma as ocorrências novas e avança os cursores do journal
         
-        return [dict(row) for row in rows]
+        Args:
+            contagens: {(servico, assinatura, hora): [ocorrencias, primeira, ultima]}
+            cursores: {servico: cursor da última entrada lida}
+        """
+        if contagens:
+            self.db.writer.executar_lote('''
+                INSERT INTO erros_logs (servico, assinatura, hora, ocorrencias, primeira, ultima)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (servico, assinatura, hora) DO UPDATE SET
+                    ocorrencias = ocorrencias + excluded.ocorrencias,
+                    primeira = MIN(primeira, excluded.primeira),
+                    ultima = MAX(ultima, excluded.ultima)
+            ''', [chave + tuple(valores) for chave, valores in contagens.items()])
+        
+        if cursores:
+            agora = int(time.time())
+            self.db.writer.executar_lote('''
+                INSERT OR REPLACE INTO cursores_journal (servico, cursor, atualizado_em)
+                VALUES (?, ?, ?)
+            ''', [(servico, cursor, agora) for servico, cursor in cursores.items()], aguardar=True)
     
-    def contar_por_severidade(self):
-        """Conta alertas ativos por severidade"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
+    def obter_cursores(self):
+        """Cursor da última entrada indexada de cada serviço"""
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT servico, cursor FROM cursores_journal')
+            return {row['servico']: row['cursor'] for row in cursor.fetchall()}
+    
+    def obter_resumo(self, inicio, servico=None):
+        """Ocorrências, primeira e última ocorrência por serviço e assinatura desde `inicio` (epoch)"""
+        hora_inicio = int(inicio) // 3600 * 3600
         
-        cursor.execute('''
-            SELECT severidade, COUNT(*) as count 
-            FROM alertas 
-            WHERE resolvido = 0
-            GROUP BY severidade
-        ''')
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            if servico:
+                cursor.execute('''
+                    SELECT servico, assinatura, SUM(ocorrencias) AS ocorrencias,
+                           MIN(primeira) AS primeira, MAX(ultima) AS ultima
+                    FROM erros_logs
+                    WHERE servico = ? AND hora >= ?
+                    GROUP BY servico, assinatura
+                    ORDER BY ocorrencias DESC
+                ''', (servico, hora_inicio))
+            else:
+                cursor.execute('''
+                    SELECT servico, assinatura, SUM(ocorrencias) AS ocorrencias,
+                           MIN(primeira) AS primeira, MAX(ultima) AS ultima
+                    FROM erros_logs
+                    WHERE hora >= ?
+                    GROUP BY servico, assinatura
+                    ORDER BY ocorrencias DESC
+                ''', (hora_inicio,))
+            
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def obter_serie(self, servico, inicio):
+        """Ocorrências por hora de cada assinatura de um serviço desde `inicio` (epoch)"""
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT assinatura, hora, ocorrencias
+                FROM erros_logs
+                WHERE servico = ? AND hora >= ?
+                ORDER BY assinatura, hora
+            ''', (servico, int(inicio) // 3600 * 3600))
+            
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def limpar_antigos(self, dias=None):
+        """Remove contagens mais antigas que a retenção do histórico"""
+        dias = dias or Config.HISTORY_RETENTION_DAYS
         
-        rows = cursor.fetchall()
-        conn.close()
+        resultado = self.db.writer.executar('''
+            DELETE FROM erros_logs 
+            WHERE hora < ?
+        ''', (int(time.time() - dias * 86400),), aguardar=True)
         
-        return {row['severidade']: row['count'] for row in rows}
+        return resultado.rowcount
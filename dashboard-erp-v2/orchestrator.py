@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Execução de ações em lote (iniciar/parar todos)
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, Optional
+
+from services import ServiceManager
+
+
+class ExecucaoLote:
+    """Estado de uma execução de iniciar/parar todos, com os eventos de progresso"""
+
+    def __init__(self, acao: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.acao = acao
+        self.iniciado_em = time.time()
+        self.finalizado_em = None
+        self.eventos = []
+        self.resultados = None
+        self.erro = None
+        self._cond = threading.Condition()
+
+    @property
+    def concluida(self) -> bool:
+        return self.finalizado_em is not None
+
+    def registrar_evento(self, evento: Dict):
+        with self._cond:
+            self.eventos.append(dict(evento, seq=len(self.eventos)))
+            self._cond.notify_all()
+
+    def finalizar(self, resultados: Optional[Dict] = None, erro: Optional[str] = None):
+        with self._cond:
+            self.resultados = resultados
+            self.erro = erro
+            self.finalizado_em = time.time()
+            self._cond.notify_all()
+
+    def acompanhar(self, desde: int = 0, timeout: float = 15) -> Iterator[Optional[Dict]]:
+        """
+        Gera os eventos a partir de `desde` até o fim da execução
+
+        Gera None a cada `timeout` segundos sem eventos (para keep-alive).
+        """
+        posicao = desde
+        while True:
+            with self._cond:
+                if posicao >= len(self.eventos) and not self.concluida:
+                    self._cond.wait(timeout)
+                novos = self.eventos[posicao:]
+                concluida = self.concluida
+
+            if not novos and not concluida:
+                yield None
+            for evento in novos:
+                yield evento
+            posicao += len(novos)
+
+            if concluida and posicao >= len(self.eventos):
+                return
+
+    def resumo(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'acao': self.acao,
+            'iniciado_em': self.iniciado_em,
+            'finalizado_em': self.finalizado_em,
+            'concluida': self.concluida,
+            'eventos': len(self.eventos),
+            'resultados': self.resultados,
+            'erro': self.erro
+        }
+
+
+class OrquestradorAcoes:
+    """
+    Roda iniciar/parar todos em background (uma execução por vez)
+
+    A requisição HTTP retorna logo com o id da execução e a interface
+    acompanha o progresso de cada serviço pelo stream de eventos.
+    """
+
+    RETENCAO_SEGUNDOS = 3600
+
+    def __init__(self, service_manager: ServiceManager):
+        self.service_manager = service_manager
+        self._execucoes = {}
+        self._atual = None
+        self._lock = threading.Lock()
+
+    def iniciar(self, acao: str, ao_progredir: Optional[Callable[[Dict], None]] = None,
+                ao_concluir: Optional[Callable[[ExecucaoLote], None]] = None) -> ExecucaoLote:
+        """
+        Inicia uma execução de start/stop em todos os serviços
+
+        Raises:
+            RuntimeError: se já houver uma execução em andamento
+        """
+        with self._lock:
+            if self._atual and not self._atual.concluida:
+                raise RuntimeError(f"Já existe uma ação global em andamento ({self._atual.id})")
+
+            self._descartar_antigas()
+            execucao = ExecucaoLote(acao)
+            self._execucoes[execucao.id] = execucao
+            self._atual = execucao
+
+        def progresso(evento):
+            execucao.registrar_evento(evento)
+            if ao_progredir:
+                ao_progredir(evento)
+
+        def executar():
+            try:
+                resultados = self.service_manager.executar_em_niveis(acao, progresso)
+                execucao.finalizar(resultados)
+            except Exception as e:
+                print(f"[ERRO] Falha na ação global {acao}: {e}")
+                execucao.finalizar(erro=str(e))
+            if ao_concluir:
+                try:
+                    ao_concluir(execucao)
+                except Exception as e:
+                    print(f"[ERRO] Falha ao finalizar ação global {acao}: {e}")
+
+        threading.Thread(target=executar, name=f'bulk-{execucao.id}', daemon=True).start()
+        return execucao
+
+    def obter(self, job_id: str) -> Optional[ExecucaoLote]:
+        return self._execucoes.get(job_id)
+
+    def _descartar_antigas(self):
+        limite = time.time() - self.RETENCAO_SEGUNDOS
+        for job_id in [j for j, e in self._execucoes.items() if e.concluida and e.finalizado_em < limite]:
+            del self._execucoes[job_id]
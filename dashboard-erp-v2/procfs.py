@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Métricas de processos via /proc
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class ProcSampler:
+    """
+    Lê CPU, memória e threads direto de /proc, sem criar processos
+
+    O %CPU é calculado pela diferença de jiffies entre duas amostras
+    (uso real no intervalo, como no top), e não pela média desde o início
+    do processo como no `ps`. As métricas incluem os processos filhos do
+    appserver.
+    """
+
+    def __init__(self, proc_path: str = '/proc'):
+        self.proc_path = proc_path
+        self.clk_tck = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.mem_total_kb = self._ler_mem_total()
+        self._lock = threading.Lock()
+        self._anteriores = {}  # pid -> (jiffies, instante, starttime)
+
+    def _ler_mem_total(self) -> int:
+        """Memória total do host em KB"""
+        try:
+            with open(os.path.join(self.proc_path, 'meminfo')) as f:
+                for linha in f:
+                    if linha.startswith('MemTotal:'):
+                        return int(linha.split()[1])
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def _ler_stat(self, pid: int) -> Optional[Dict]:
+        """Lê /proc/<pid>/stat (ppid, jiffies de CPU, threads)"""
+        try:
+            with open(os.path.join(self.proc_path, str(pid), 'stat')) as f:
+                conteudo = f.read()
+        except OSError:
+            return None
+
+        # O nome do processo (campo 2) pode conter espaços: os campos seguintes
+        # começam após o último ')'
+        campos = conteudo[conteudo.rfind(')') + 2:].split()
+        try:
+            return {
+                'ppid': int(campos[1]),
+                'jiffies': int(campos[11]) + int(campos[12]),  # utime + stime
+                'threads': int(campos[17]),
+                'starttime': int(campos[19])
+            }
+        except (IndexError, ValueError):
+            return None
+
+    def _ler_rss_kb(self, pid: int) -> int:
+        """Lê a memória residente de /proc/<pid>/statm"""
+        try:
+            with open(os.path.join(self.proc_path, str(pid), 'statm')) as f:
+                return int(f.read().split()[1]) * self.page_size // 1024
+        except (OSError, IndexError, ValueError):
+            return 0
+
+    def _mapa_filhos(self) -> Dict[int, List[int]]:
+        """Monta o mapa ppid -> filhos com uma única varredura de /proc"""
+        filhos = {}
+        try:
+            entradas = os.listdir(self.proc_path)
+        except OSError:
+            return filhos
+
+        for entrada in entradas:
+            if not entrada.isdigit():
+                continue
+            stat = self._ler_stat(int(entrada))
+            if stat:
+                filhos.setdefault(stat['ppid'], []).append(int(entrada))
+        return filhos
+
+    def _arvore(self, pid: int, filhos: Dict[int, List[int]]) -> List[int]:
+        """PID e todos os seus descendentes"""
+        arvore = [pid]
+        pendentes = [pid]
+        while pendentes:
+            atual = pendentes.pop()
+            for filho in filhos.get(atual, []):
+                arvore.append(filho)
+                pendentes.append(filho)
+        return arvore
+
+    def _uptime_sistema(self) -> float:
+        try:
+            with open(os.path.join(self.proc_path, 'uptime')) as f:
+                return float(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            return 0.0
+
+    def amostrar(self, pids: List[int], incluir_filhos: bool = True) -> Dict[int, Dict]:
+        """
+        Coleta métricas dos PIDs informados (e seus filhos)
+
+        Returns:
+            dict pid -> {cpu_percent, memoria_mb, memoria_percent, threads, processos}
+        """
+        filhos = self._mapa_filhos() if incluir_filhos else {}
+        agora = time.monotonic()
+        resultados = {}
+
+        with self._lock:
+            vistos = {}
+            for pid in pids:
+                cpu_jiffies = 0
+                rss_kb = 0
+                threads = 0
+                processos = 0
+                primeira_amostra = True
+
+                for membro in self._arvore(pid, filhos):
+                    stat = self._ler_stat(membro)
+                    if not stat:
+                        continue
+                    processos += 1
+                    threads += stat['threads']
+                    rss_kb += self._ler_rss_kb(membro)
+
+                    anterior = self._anteriores.get(membro)
+                    if anterior and anterior[2] == stat['starttime']:
+                        cpu_jiffies += max(stat['jiffies'] - anterior[0], 0)
+                        intervalo = agora - anterior[1]
+                        primeira_amostra = False
+                    vistos[membro] = (stat['jiffies'], agora, stat['starttime'])
+
+                if processos == 0:
+                    continue
+
+                if primeira_amostra:
+                    # Sem amostra anterior: média desde o início do processo principal
+                    stat = self._ler_stat(pid)
+                    decorrido = self._uptime_sistema() - (stat['starttime'] / self.clk_tck) if stat else 0
+                    cpu_percent = (stat['jiffies'] / self.clk_tck / decorrido * 100) if stat and decorrido > 0 else 0.0
+                else:
+                    cpu_percent = (cpu_jiffies / self.clk_tck / intervalo * 100) if intervalo > 0 else 0.0
+
+                resultados[pid] = {
+                    'cpu_percent': round(cpu_percent, 1),
+                    'memoria_mb': rss_kb / 1024,
+                    'memoria_percent': round(rss_kb / self.mem_total_kb * 100, 1) if self.mem_total_kb else 0,
+                    'threads': threads,
+                    'processos': processos
+                }
+
+            # Descarta amostras de processos que não aparecem há mais de 10 minutos
+            self._anteriores.update(vistos)
+            for membro in [p for p, a in self._anteriores.items() if agora - a[1] > 600]:
+                del self._anteriores[membro]
+
+        return resultados
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Buffer circular de métricas em memória
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from rollup import percentil
+
+CAMPOS = ('timestamp', 'cpu_percent', 'memory_mb', 'memory_percent', 'threads')
+
+
+class SerieCircular:
+    """
+    Últimas N amostras de um serviço em arrays de double (uma por campo)
+
+    O append é O(1) e sobrescreve a amostra mais antiga quando o buffer
+    enche; leituras copiam no máximo dois trechos contíguos dos arrays.
+    """
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self._colunas = {campo: array('d', bytes(8 * capacidade)) for campo in CAMPOS}
+        self._inicio = 0
+        self._tamanho = 0
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def adicionar(self, timestamp: float, cpu_percent: float, memory_mb: float,
+                  memory_percent: float, threads: float):
+        """Acrescenta uma amostra (descarta a mais antiga se o buffer estiver cheio)"""
+        if self._tamanho < self.capacidade:
+            posicao = (self._inicio + self._tamanho) % self.capacidade
+            self._tamanho += 1
+        else:
+            posicao = self._inicio
+            self._inicio = (self._inicio + 1) % self.capacidade
+
+        colunas = self._colunas
+        colunas['timestamp'][posicao] = timestamp
+        colunas['cpu_percent'][posicao] = cpu_percent or 0.0
+        colunas['memory_mb'][posicao] = memory_mb or 0.0
+        colunas['memory_percent'][posicao] = memory_percent or 0.0
+        colunas['threads'][posicao] = threads or 0
+
+    def coluna(self, campo: str, n: Optional[int] = None) -> List[float]:
+        """Valores das últimas n amostras de um campo, da mais antiga para a mais recente"""
+        n = self._tamanho if n is None else min(n, self._tamanho)
+        if n <= 0:
+            return []
+
+        dados = self._colunas[campo]
+        primeira = (self._inicio + self._tamanho - n) % self.capacidade
+        fim = primeira + n
+        if fim <= self.capacidade:
+            return dados[primeira:fim].tolist()
+        return dados[primeira:].tolist() + dados[:fim - self.capacidade].tolist()
+
+    def ultimas(self, n: Optional[int] = None) -> List[Dict]:
+        """Últimas n amostras como dicts (mais recente primeiro, como em obter_ultimas)"""
+        colunas = {campo: self.coluna(campo, n) for campo in CAMPOS}
+        amostras = [
+            {
+                'timestamp': int(colunas['timestamp'][i]),
+                'cpu_percent': colunas['cpu_percent'][i],
+                'memory_mb': colunas['memory_mb'][i],
+                'memory_percent': colunas['memory_percent'][i],
+                'threads': int(colunas['threads'][i])
+            }
+            for i in range(len(colunas['timestamp']))
+        ]
+        amostras.reverse()
+        return amostras
+
+    def resumo(self, campo: str, n: Optional[int] = None) -> Optional[Dict]:
+        """Mínimo, máximo, média e percentis de um campo nas últimas n amostras"""
+        valores = self.coluna(campo, n)
+        if not valores:
+            return None
+        return {
+            'min': min(valores),
+            'max': max(valores),
+            'avg': round(sum(valores) / len(valores), 2),
+            'p50': percentil(valores, 50),
+            'p95': percentil(valores, 95),
+            'p99': percentil(valores, 99),
+            'amostras': len(valores)
+        }
+
+
+class BufferMetricas:
+    """Um SerieCircular por serviço, alimentado pelo coletor"""
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def adicionar(self, registros: List[Dict], instante: float):
+        """Acrescenta as amostras de um ciclo de coleta"""
+        with self._lock:
+            for r in registros:
+                serie = self._series.get(r['servico'])
+                if serie is None:
+                    serie = self._series[r['servico']] = SerieCircular(self.capacidade)
+                serie.adicionar(instante, r['cpu_percent'], r['memory_mb'], r['memory_percent'], r['threads'])
+
+    def ultimas(self, servico: str, n: int) -> Optional[List[Dict]]:
+        """
+        Últimas n amostras do serviço, ou None se o buffer não tiver todas
+
+        None indica que o chamador deve consultar o SQLite.
+        """
+        with self._lock:
+            serie = self._series.get(servico)
+            if serie is None or len(serie) < n:
+                return None
+            amostras = serie.ultimas(n)
+        for amostra in amostras:
+            amostra['servico'] = servico
+        return amostras
+
+    def resumo(self, servico: str, n: Optional[int] = None) -> Optional[Dict]:
+        """Resumo de CPU, memória e threads das últimas n amostras"""
+        with self._lock:
+            serie = self._series.get(servico)
+            if serie is None or not len(serie):
+                return None
+            return {campo: serie.resumo(campo, n) for campo in CAMPOS[1:]}
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Agregação de métricas (1 min / 1 hora / 1 dia)
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+from models import Database
+
+# Resolução -> tamanho do balde em segundos (da mais fina para a mais grossa)
+RESOLUCOES = {'1m': 60, '1h': 3600, '1d': 86400}
+
+SQL_GRAVAR = '''
+    INSERT OR REPLACE INTO metricas_agregadas
+    (resolucao, servico, inicio, amostras, cpu_avg, cpu_min, cpu_max, cpu_p95,
+     memory_avg, memory_min, memory_max, memory_p95, memory_percent_avg)
+    VALUES (:resolucao, :servico, :inicio, :amostras, :cpu_avg, :cpu_min, :cpu_max, :cpu_p95,
+            :memory_avg, :memory_min, :memory_max, :memory_p95, :memory_percent_avg)
+'''
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil pelo método nearest-rank"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    # p * n / 100 (e não p / 100 * n) evita erro de arredondamento: 7% de 100 = 7, não 7.000000000000001
+    indice = max(math.ceil(p * len(ordenados) / 100) - 1, 0)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+class Balde:
+    """Acumulador de um intervalo (soma, mínimo, máximo e valores para o p95)"""
+
+    def __init__(self, inicio: int):
+        self.inicio = inicio
+        self.amostras = 0
+        self.soma_cpu = 0.0
+        self.soma_mem = 0.0
+        self.soma_mem_pct = 0.0
+        self.min_cpu = self.max_cpu = None
+        self.min_mem = self.max_mem = None
+        self.valores_cpu = []
+        self.valores_mem = []
+
+    def adicionar(self, cpu: float, mem: float, mem_pct: float, amostras: int = 1,
+                  min_cpu: float = None, max_cpu: float = None,
+                  min_mem: float = None, max_mem: float = None):
+        """Soma uma amostra (ou a média de um balde menor com `amostras` amostras)"""
+        self.amostras += amostras
+        self.soma_cpu += cpu * amostras
+        self.soma_mem += mem * amostras
+        self.soma_mem_pct += mem_pct * amostras
+        self.min_cpu = min(v for v in (self.min_cpu, min_cpu, cpu) if v is not None)
+        self.max_cpu = max(v for v in (self.max_cpu, max_cpu, cpu) if v is not None)
+        self.min_mem = min(v for v in (self.min_mem, min_mem, mem) if v is not None)
+        self.max_mem = max(v for v in (self.max_mem, max_mem, mem) if v is not None)
+        self.valores_cpu.append(cpu)
+        self.valores_mem.append(mem)
+
+    def mesclar(self, outro: 'Balde'):
+        """Soma um balde menor já fechado (o p95 usa a média de cada balde menor)"""
+        linha = outro.linha()
+        self.adicionar(linha['cpu_avg'], linha['memory_avg'], linha['memory_percent_avg'], outro.amostras,
+                       outro.min_cpu, outro.max_cpu, outro.min_mem, outro.max_mem)
+
+    def linha(self, servico: str = None, resolucao: str = None) -> Dict:
+        """Registro para a tabela metricas_agregadas"""
+        n = self.amostras or 1
+        return {
+            'resolucao': resolucao,
+            'servico': servico,
+            'inicio': self.inicio,
+            'amostras': self.amostras,
+            'cpu_avg': round(self.soma_cpu / n, 2),
+            'cpu_min': self.min_cpu,
+            'cpu_max': self.max_cpu,
+            'cpu_p95': percentil(self.valores_cpu, 95),
+            'memory_avg': round(self.soma_mem / n, 2),
+            'memory_min': self.min_mem,
+            'memory_max': self.max_mem,
+            'memory_p95': percentil(self.valores_mem, 95),
+            'memory_percent_avg': round(self.soma_mem_pct / n, 2)
+        }
+
+
+class AgregadorMetricas:
+    """
+    Mantém as tabelas de agregação de forma incremental
+
+    Cada amostra entra no balde de 1 minuto do serviço. Quando o minuto
+    fecha, a linha de 1m é gravada e mesclada nos baldes de 1h e 1d, que
+    são regravados na mesma transação. Nenhuma consulta relê a tabela bruta.
+    """
+
+    def __init__(self, db: Database = None):
+        self.db = db or Database()
+        self._abertos = {}  # servico -> {resolucao: Balde}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _inicio(instante: float, tamanho: int) -> int:
+        return int(instante // tamanho * tamanho)
+
+    def adicionar(self, registros: List[Dict], instante: float = None):
+        """Acrescenta as amostras de um ciclo de coleta"""
+        instante = instante or time.time()
+        minuto = self._inicio(instante, RESOLUCOES['1m'])
+        linhas = []
+
+        with self._lock:
+            # Fecha os minutos encerrados (inclusive de serviços que pararam)
+            for servico, baldes in self._abertos.items():
+                balde = baldes.get('1m')
+                if balde and balde.inicio != minuto:
+                    linhas.extend(self._fechar_minuto(servico, baldes, balde))
+                    del baldes['1m']
+
+            for r in registros:
+                baldes = self._abertos.setdefault(r['servico'], {})
+                if '1m' not in baldes:
+                    baldes['1m'] = Balde(minuto)
+                baldes['1m'].adicionar(r['cpu_percent'] or 0.0, r['memory_mb'] or 0.0, r['memory_percent'] or 0.0)
+
+        if linhas:
+            self.db.writer.executar_lote(SQL_GRAVAR, linhas)
+
+    def _fechar_minuto(self, servico: str, baldes: Dict, balde_minuto: Balde) -> List[Dict]:
+        linhas = [balde_minuto.linha(servico, '1m')]
+        for resolucao in ('1h', '1d'):
+            inicio = self._inicio(balde_minuto.inicio, RESOLUCOES[resolucao])
+            balde = baldes.get(resolucao)
+            if balde is None or balde.inicio != inicio:
+                balde = baldes[resolucao] = self._semear(servico, resolucao, inicio)
+            balde.mesclar(balde_minuto)
+            linhas.append(balde.linha(servico, resolucao))
+        return linhas
+
+    def _semear(self, servico: str, resolucao: str, inicio: int) -> Balde:
+        """Recria o balde a partir dos minutos já gravados (ex: após reiniciar o dashboard)"""
+        balde = Balde(inicio)
+        with self.db.leitura() as conn:
+            rows = conn.execute('''
+                SELECT * FROM metricas_agregadas
+                WHERE resolucao = '1m' AND servico = ? AND inicio >= ? AND inicio < ?
+                ORDER BY inicio
+            ''', (servico, inicio, inicio + RESOLUCOES[resolucao])).fetchall()
+        for row in rows:
+            balde.adicionar(row['cpu_avg'], row['memory_avg'], row['memory_percent_avg'], row['amostras'],
+                            row['cpu_min'], row['cpu_max'], row['memory_min'], row['memory_max'])
+        return balde
@@ -6,40 +6,59 @@ Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
 """
 
 import subprocess
+import threading
 import time
 import re
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Tuple, Optional
 from config import ServicesConfig, Config
-from models import MetricasServicos, Alertas
+from models import Alertas
+from journal import LeitorJournal
+from procfs import ProcSampler
+
+# Propriedades do systemd usadas pelo dashboard (o `systemctl show` completo retorna ~200)
+SYSTEMD_PROPERTIES = ['Id', 'LoadState', 'ActiveState', 'SubState', 'MainPID', 'ActiveEnterTimestamp']
+
+# Estados em que a unidade ainda está mudando (job em andamento ou reinício automático)
+ESTADOS_TRANSITORIOS = ('activating', 'deactivating', 'reloading')
 
 
 class ServiceManager:
     """Gerenciador de serviços systemd com métricas avançadas"""
     
     def __init__(self):
-        self.metricas = MetricasServicos() if Config.ENABLE_PERFORMANCE_METRICS else None
         self.alertas = Alertas()
+        self._sampler = ProcSampler()
+        self.journal = LeitorJournal()
+        
+        # Coleta em lote sob prazo: pool pequeno, coletas em andamento e último status conhecido
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='status')
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._ultimo_status = {}
+        
+        # Último start/stop/restart/kill pedido pelo dashboard, por serviço
+        self._acoes_manuais = {}
     
-    def obter_status(self, servico: str) -> Dict:
+    def obter_status(self, servico: str, props: Optional[Dict] = None,
+                     amostra: Optional[Dict] = None) -> Dict:
         """
         Obtém status completo de um serviço
         
+        Args:
+            servico: Nome do serviço
+            props: Propriedades do systemd já coletadas em lote (opcional)
+            amostra: Métricas de /proc já coletadas em lote (opcional)
+        
         Returns:
             dict com: ativo, pid, uptime, memoria, cpu, threads, estado
         """
         try:
-            # Status básico
-            status_cmd = subprocess.run(
-                ["sudo", "systemctl", "is-active", f"{servico}.service"],
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                universal_newlines=True,
-                timeout=5
-            )
-            ativo = status_cmd.stdout.strip() == "active"
-            
             # Propriedades do serviço
-            props = self._obter_propriedades(servico)
+            if props is None:
+                props = self._obter_propriedades_em_lote([servico]).get(servico, {})
+            
+            ativo = props.get('ActiveState') == 'active'
             
             resultado = {
                 'servico': servico,
@@ -52,26 +71,15 @@ class ServiceManager:
                 'memoria_percent': 0,
                 'cpu_percent': 0,
                 'threads': 0,
+                'stale': False,
                 'grupo': ServicesConfig.get_service_group(servico),
                 'cor': ServicesConfig.get_group_color(servico)
             }
             
             # Se o serviço está ativo, coleta métricas de performance
             if ativo and resultado['pid'] != '0' and Config.ENABLE_PERFORMANCE_METRICS:
-                metricas_perf = self._obter_metricas_processo(resultado['pid'])
+                metricas_perf = self._obter_metricas_processo(resultado['pid'], amostra)
                 resultado.update(metricas_perf)
-                
-                # Registra métricas no banco
-                if self.metricas:
-                    self.metricas.registrar(
-                        servico=servico,
-                        cpu_percent=resultado['cpu_percent'],
-                        memory_mb=resultado['memoria_mb'],
-                        memory_percent=resultado['memoria_percent'],
-                        threads=resultado['threads'],
-                        status='active' if ativo else 'inactive',
-                        uptime_seconds=resultado.get('uptime_seconds', 0)
-                    )
             
             return resultado
             
@@ -82,25 +90,56 @@ class ServiceManager:
     
     def _obter_propriedades(self, servico: str) -> Dict:
         """Obtém propriedades do systemd para um serviço"""
-        props = {}
         try:
-            cmd = subprocess.run(
-                ["sudo", "systemctl", "show", f"{servico}.service"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=5
-            )
-            
-            for linha in cmd.stdout.split('\n'):
-                if '=' in linha:
-                    chave, valor = linha.split('=', 1)
-                    props[chave] = valor
-                    
+            return self._obter_propriedades_em_lote([servico]).get(servico, {})
         except Exception as e:
             print(f"[ERRO] Falha ao obter propriedades de {servico}: {e}")
+            return {}
+    
+    def _obter_propriedades_em_lote(self, servicos: List[str]) -> Dict[str, Dict]:
+        """
+        Obtém as propriedades de vários serviços em uma única chamada
+        
+        Executa `systemctl show -p ... unit1 unit2 ...` (um único processo
+        para todos os serviços) e separa a saída por unidade.
+        """
+        cmd = subprocess.run(
+            ["sudo", "systemctl", "show", "-p", ",".join(SYSTEMD_PROPERTIES)]
+            + [f"{servico}.service" for servico in servicos],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=10
+        )
+        
+        props_por_servico = {}
+        for props in self._parse_systemctl_show(cmd.stdout):
+            unidade = props.get('Id', '')
+            if unidade.endswith('.service'):
+                props_por_servico[unidade[:-len('.service')]] = props
         
-        return props
+        return props_por_servico
+    
+    @staticmethod
+    def _parse_systemctl_show(saida: str) -> List[Dict]:
+        """Separa a saída do `systemctl show` com várias unidades (blocos separados por linha em branco)"""
+        blocos = []
+        atual = {}
+        
+        for linha in saida.split('\n'):
+            if not linha.strip():
+                if atual:
+                    blocos.append(atual)
+                    atual = {}
+                continue
+            if '=' in linha:
+                chave, valor = linha.split('=', 1)
+                atual[chave] = valor
+        
+        if atual:
+            blocos.append(atual)
+        
+        return blocos
     
     def _calcular_uptime(self, timestamp_str: Optional[str]) -> str:
         """Calcula uptime a partir do timestamp de ativação"""
@@ -154,8 +193,8 @@ class ServiceManager:
             print(f"[ERRO] Falha ao calcular uptime: {e}")
             return "N/A"
     
-    def _obter_metricas_processo(self, pid: str) -> Dict:
-        """Obtém métricas de CPU, memória e threads de um processo"""
+    def _obter_metricas_processo(self, pid: str, amostra: Optional[Dict] = None) -> Dict:
+        """Obtém métricas de CPU, memória e threads de um processo (e filhos) via /proc"""
         metricas = {
             'memoria_mb': 0,
             'memoria_percent': 0,
@@ -164,22 +203,10 @@ class ServiceManager:
         }
         
         try:
-            # Usa ps para obter métricas do processo
-            cmd = subprocess.run(
-                ["ps", "-p", pid, "-o", "%cpu,%mem,rss,nlwp", "--no-headers"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=3
-            )
-            
-            if cmd.returncode == 0 and cmd.stdout.strip():
-                partes = cmd.stdout.strip().split()
-                if len(partes) >= 4:
-                    metricas['cpu_percent'] = float(partes[0])
-                    metricas['memoria_percent'] = float(partes[1])
-                    metricas['memoria_mb'] = float(partes[2]) / 1024  # Converte KB para MB
-                    metricas['threads'] = int(partes[3])
+            if amostra is None:
+                amostra = self._sampler.amostrar([int(pid)]).get(int(pid))
+            if amostra:
+                metricas.update(amostra)
                     
         except Exception as e:
             print(f"[ERRO] Falha ao obter métricas do processo {pid}: {e}")
@@ -199,25 +226,102 @@ class ServiceManager:
             'memoria_percent': 0,
             'cpu_percent': 0,
             'threads': 0,
+            'stale': False,
             'erro': erro,
             'grupo': ServicesConfig.get_service_group(servico),
             'cor': ServicesConfig.get_group_color(servico)
         }
     
+    def _coletar_lote(self, servicos: List[str]) -> Dict[str, Dict]:
+        """Status de vários serviços: um `systemctl show` e uma leitura de /proc para todos"""
+        props_por_servico = self._obter_propriedades_em_lote(servicos)
+        
+        # Métricas de todos os processos ativos em uma única leitura de /proc
+        amostras = {}
+        if Config.ENABLE_PERFORMANCE_METRICS:
+            pids = {
+                servico: int(props['MainPID'])
+                for servico, props in props_por_servico.items()
+                if props.get('ActiveState') == 'active' and props.get('MainPID', '0') not in ('', '0')
+            }
+            try:
+                por_pid = self._sampler.amostrar(list(pids.values()))
+                amostras = {servico: por_pid.get(pid) for servico, pid in pids.items()}
+            except Exception as e:
+                print(f"[ERRO] Falha ao amostrar processos: {e}")
+        
+        return {
+            servico: self.obter_status(servico, props_por_servico.get(servico, {}), amostras.get(servico))
+            for servico in servicos
+        }
+    
+    def _coletar_status(self, servicos: List[str]) -> Dict[str, Dict]:
+        """
+        Coleta o status dos serviços com prazo global
+        
+        A consulta em lote ao systemd roda no pool e é aguardada por até
+        STATUS_DEADLINE; se não terminar (ou falhar), os serviços recebem o
+        último status conhecido marcado com stale=True. Uma coleta atrasada
+        continua no pool e não é disparada novamente enquanto não terminar.
+        """
+        chave = frozenset(servicos)
+        with self._lock:
+            future = self._em_andamento.get(chave)
+            if future is None:
+                future = self._executor.submit(self._coletar_lote, list(servicos))
+                self._em_andamento[chave] = future
+        
+        wait([future], timeout=Config.STATUS_DEADLINE)
+        
+        erro = "Timeout ao verificar status"
+        coletados = {}
+        if future.done():
+            with self._lock:
+                if self._em_andamento.get(chave) is future:
+                    del self._em_andamento[chave]
+            try:
+                coletados = future.result()
+            except Exception as e:
+                print(f"[ERRO] Falha na consulta em lote ao systemd: {e}")
+                erro = str(e)
+        
+        resultados = {}
+        for servico in servicos:
+            status = coletados.get(servico)
+            if status is not None:
+                with self._lock:
+                    self._ultimo_status[servico] = status
+            else:
+                anterior = self._ultimo_status.get(servico)
+                if anterior:
+                    status = dict(anterior, stale=True)
+                else:
+                    status = dict(self._resultado_erro(servico, erro), stale=True)
+            resultados[servico] = status
+        
+        return resultados
+    
     def obter_status_todos(self) -> List[Dict]:
         """Obtém status de todos os serviços configurados"""
         servicos = ServicesConfig.get_all_services()
-        return [self.obter_status(servico) for servico in servicos]
+        resultados = self._coletar_status(servicos)
+        return [resultados[servico] for servico in servicos]
+    
+    def obter_status_servicos(self, servicos: List[str]) -> Dict[str, Dict]:
+        """Obtém o status de alguns serviços (mesma coleta paralela, com prazo)"""
+        return self._coletar_status(servicos)
     
     def obter_status_por_grupo(self) -> Dict:
         """Organiza status dos serviços por grupo"""
+        return self.agrupar_status(self._coletar_status(ServicesConfig.get_all_services()))
+    
+    @staticmethod
+    def agrupar_status(resultados: Dict[str, Dict]) -> Dict:
+        """Monta a estrutura por grupo (com estatísticas) a partir do status de cada serviço"""
         grupos = {}
         
         for grupo_nome, grupo_data in ServicesConfig.GRUPOS.items():
-            servicos_status = []
-            for servico in grupo_data['servicos']:
-                status = self.obter_status(servico)
-                servicos_status.append(status)
+            servicos_status = [resultados[servico] for servico in grupo_data['servicos']]
             
             # Calcula estatísticas do grupo
             total = len(servicos_status)
@@ -248,6 +352,8 @@ class ServiceManager:
             Tupla (sucesso, mensagem)
         """
         try:
+            self._acoes_manuais[servico] = time.monotonic()
+            
             if acao == 'kill' and pid:
                 return self._kill_processo(pid)
             
@@ -264,11 +370,9 @@ class ServiceManager:
             )
             
             if cmd.returncode == 0:
-                # Aguarda um momento para o serviço estabilizar
-                time.sleep(2)
-                
-                # Verifica se a ação foi bem sucedida
-                status = self.obter_status(servico)
+                # O systemctl só retorna quando o job do systemd termina; aguarda
+                # apenas se a unidade ainda estiver em transição
+                status = {'ativo': self._aguardar_estado(servico) == 'active'}
                 
                 if acao == 'start' and status['ativo']:
                     return True, f"Serviço {servico} iniciado com sucesso"
@@ -290,6 +394,21 @@ class ServiceManager:
         except Exception as e:
             return False, f"Erro ao executar {acao} em {servico}: {str(e)}"
     
+    def acao_manual_recente(self, servico: str, janela: Optional[float] = None) -> bool:
+        """Indica se o dashboard executou uma ação no serviço há pouco tempo"""
+        janela = janela if janela is not None else Config.ACTION_TIMEOUT + 5
+        inicio = self._acoes_manuais.get(servico)
+        return inicio is not None and time.monotonic() - inicio <= janela
+    
+    def _aguardar_estado(self, servico: str) -> str:
+        """Aguarda a unidade sair de um estado transitório e retorna o ActiveState"""
+        limite = time.monotonic() + Config.ACTION_TIMEOUT
+        while True:
+            estado = self._obter_propriedades(servico).get('ActiveState', 'unknown')
+            if estado not in ESTADOS_TRANSITORIOS or time.monotonic() >= limite:
+                return estado
+            time.sleep(0.2)
+    
     def _kill_processo(self, pid: str) -> Tuple[bool, str]:
         """Força o encerramento de um processo"""
         try:
@@ -313,101 +432,145 @@ class ServiceManager:
         except Exception as e:
             return False, f"Erro ao encerrar processo {pid}: {str(e)}"
     
-    def iniciar_todos(self) -> Dict:
-        """Inicia todos os serviços"""
-        resultados = {'sucessos': [], 'falhas': []}
+    def executar_em_niveis(self, acao: str,
+                           ao_progredir: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Executa start/stop em todos os serviços respeitando as dependências
         
-        for servico in ServicesConfig.get_all_services():
-            sucesso, mensagem = self.executar_acao(servico, 'start')
-            
-            if sucesso:
-                resultados['sucessos'].append({'servico': servico, 'mensagem': mensagem})
-            else:
-                resultados['falhas'].append({'servico': servico, 'mensagem': mensagem})
-            
-            time.sleep(0.5)  # Pausa entre serviços
+        Os grupos são organizados em níveis (ServicesConfig.get_niveis_dependencia):
+        no start os níveis vão em ordem e no stop em ordem inversa. Os serviços
+        de um nível rodam em paralelo, até BULK_ACTION_CONCURRENCY por vez.
         
-        return resultados
-    
-    def parar_todos(self) -> Dict:
-        """Para todos os serviços"""
+        Args:
+            acao: start ou stop
+            ao_progredir: Callback chamado a cada serviço iniciado/concluído
+        
+        Returns:
+            dict com listas 'sucessos' e 'falhas'
+        """
         resultados = {'sucessos': [], 'falhas': []}
+        niveis = ServicesConfig.get_niveis_dependencia()
+        if acao == 'stop':
+            niveis = list(reversed(niveis))
         
-        for servico in ServicesConfig.get_all_services():
-            sucesso, mensagem = self.executar_acao(servico, 'stop')
-            
-            if sucesso:
-                resultados['sucessos'].append({'servico': servico, 'mensagem': mensagem})
-            else:
-                resultados['falhas'].append({'servico': servico, 'mensagem': mensagem})
-            
-            time.sleep(0.5)
+        def notificar(evento):
+            if ao_progredir:
+                try:
+                    ao_progredir(evento)
+                except Exception as e:
+                    print(f"[ERRO] Falha ao notificar progresso: {e}")
+        
+        def executar(servico, nivel):
+            notificar({'servico': servico, 'acao': acao, 'nivel': nivel, 'estado': 'executando'})
+            sucesso, mensagem = self.executar_acao(servico, acao)
+            notificar({
+                'servico': servico, 'acao': acao, 'nivel': nivel,
+                'estado': 'sucesso' if sucesso else 'falha', 'mensagem': mensagem
+            })
+            return sucesso, mensagem
+        
+        with ThreadPoolExecutor(max_workers=Config.BULK_ACTION_CONCURRENCY,
+                                thread_name_prefix='bulk-action') as executor:
+            for indice, grupos in enumerate(niveis):
+                servicos = [
+                    servico for grupo in grupos
+                    for servico in ServicesConfig.GRUPOS[grupo]['servicos']
+                ]
+                futures = {executor.submit(executar, servico, indice): servico for servico in servicos}
+                
+                # O próximo nível só começa quando todos os serviços deste terminarem
+                for future, servico in futures.items():
+                    sucesso, mensagem = future.result()
+                    chave = 'sucessos' if sucesso else 'falhas'
+                    resultados[chave].append({'servico': servico, 'mensagem': mensagem})
         
         return resultados
     
+    def iniciar_todos(self, ao_progredir: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Inicia todos os serviços (dependências primeiro)"""
+        return self.executar_em_niveis('start', ao_progredir)
+    
+    def parar_todos(self, ao_progredir: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Para todos os serviços (dependentes primeiro)"""
+        return self.executar_em_niveis('stop', ao_progredir)
+    
     def obter_logs(self, servico: str, linhas: int = None) -> List[str]:
         """Obtém logs de um serviço"""
         linhas = linhas or Config.MAX_LOG_LINES
         
         try:
-            cmd = subprocess.run(
-                ["sudo", "journalctl", "-u", f"{servico}.service", "-n", str(linhas), "--no-pager"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=10
-            )
-            
-            if cmd.returncode == 0:
-                return cmd.stdout.split('\n')
-            else:
-                return [f"Erro ao obter logs: {cmd.stderr}"]
-                
-        except subprocess.TimeoutExpired:
-            return ["Timeout ao obter logs"]
+            return [self.journal.formatar(entrada) for entrada in self.journal.ler(servico, linhas=linhas)]
         except Exception as e:
             return [f"Erro ao obter logs: {str(e)}"]
     
     def verificar_saude_servico(self, servico: str) -> Dict:
         """Verifica a saúde de um serviço e cria alertas se necessário"""
         status = self.obter_status(servico)
-        alertas_criados = []
+        alertas_criados = self.avaliar_alertas(status)
+        
+        return {
+            'servico': servico,
+            'saudavel': (status['ativo'] and status['memoria_percent'] < Config.ALERT_MEMORY_PERCENT
+                         and status['cpu_percent'] < Config.ALERT_CPU_PERCENT),
+            'alertas_criados': alertas_criados,
+            'status': status
+        }
+    
+    def avaliar_alertas(self, status: Dict, verificar_parado: bool = True) -> List[int]:
+        """
+        Abre ou normaliza os alertas de um serviço a partir do status coletado
+        
+        Memória e CPU têm histerese: o alerta abre acima de ALERT_*_PERCENT e
+        só é resolvido abaixo de ALERT_*_CLEAR_PERCENT. Ocorrências repetidas
+        apenas incrementam o alerta aberto (ver Alertas.criar).
+        
+        Args:
+            status: Status do serviço (obter_status)
+            verificar_parado: Abre (parado) e resolve (ativo) o alerta de serviço
+                parado; desligado quando o SystemdWatcher cuida das quedas
+        
+        Returns:
+            IDs dos alertas abertos ou atualizados
+        """
+        servico = status['servico']
+        alertas = []
         
         if not status['ativo']:
-            alerta_id = self.alertas.criar(
-                servico=servico,
-                tipo_alerta='servico_parado',
-                mensagem=f"Serviço {servico} está parado",
-                severidade='critical'
-            )
-            alertas_criados.append(alerta_id)
+            if verificar_parado:
+                alertas.append(self.alertas.criar(
+                    servico=servico,
+                    tipo_alerta='servico_parado',
+                    mensagem=f"Serviço {servico} está parado",
+                    severidade='critical'
+                ))
+            return alertas
+        
+        if verificar_parado:
+            self.alertas.normalizar(servico, 'servico_parado')
         
         # Verifica uso de memória
-        if status['memoria_percent'] > 80:
-            alerta_id = self.alertas.criar(
+        if status['memoria_percent'] > Config.ALERT_MEMORY_PERCENT:
+            alertas.append(self.alertas.criar(
                 servico=servico,
                 tipo_alerta='memoria_alta',
                 mensagem=f"Serviço {servico} usando {status['memoria_percent']:.1f}% de memória",
                 severidade='warning'
-            )
-            alertas_criados.append(alerta_id)
+            ))
+        elif status['memoria_percent'] < Config.ALERT_MEMORY_CLEAR_PERCENT:
+            self.alertas.normalizar(servico, 'memoria_alta')
         
         # Verifica uso de CPU
-        if status['cpu_percent'] > 90:
-            alerta_id = self.alertas.criar(
+        if status['cpu_percent'] > Config.ALERT_CPU_PERCENT:
+            alertas.append(self.alertas.criar(
                 servico=servico,
                 tipo_alerta='cpu_alta',
                 mensagem=f"Serviço {servico} usando {status['cpu_percent']:.1f}% de CPU",
                 severidade='warning'
-            )
-            alertas_criados.append(alerta_id)
+            ))
+        elif status['cpu_percent'] < Config.ALERT_CPU_CLEAR_PERCENT:
+            self.alertas.normalizar(servico, 'cpu_alta')
         
-        return {
-            'servico': servico,
-            'saudavel': status['ativo'] and status['memoria_percent'] < 80 and status['cpu_percent'] < 90,
-            'alertas_criados': alertas_criados,
-            'status': status
-        }
+        return alertas
 
 
 class StatisticsCalculator:
@@ -6,7 +6,6 @@
     
     // ========== CONSTANTS ==========
     const API_BASE = '/api';
-    const REFRESH_INTERVAL = 30000; // 30 segundos
     
     // ========== UTILITY FUNCTIONS ==========
     
@@ -52,10 +51,10 @@
     }
     
     /**
-     * Formata timestamp para formato legível
+     * Formata timestamp para formato legível (texto ISO ou epoch em segundos)
      */
     function formatTimestamp(timestamp) {
-        const date = new Date(timestamp);
+        const date = new Date(typeof timestamp === 'number' ? timestamp * 1000 : timestamp);
         return date.toLocaleString('pt-BR');
     }
     
@@ -99,34 +98,94 @@
      * Atualiza linha da tabela de serviço
      */
     function atualizarLinhaServico(row, servicoData) {
-        // Atualiza status badge
-        const statusCell = row.querySelector('.badge');
-        if (statusCell) {
-            statusCell.className = servicoData.ativo ? 
-                'badge bg-success' : 'badge bg-danger';
-            statusCell.innerHTML = servicoData.ativo ? 
-                '<i class="bi bi-check-circle-fill me-1"></i>Ativo' : 
-                '<i class="bi bi-x-circle-fill me-1"></i>Parado';
-        }
+        const cells = row.querySelectorAll('td');
+        if (cells.length < 6) return;
+        
+        // PID e indicador de status desatualizado
+        row.dataset.pid = servicoData.pid;
+        const pid = cells[0].querySelector('.service-pid');
+        if (pid) pid.textContent = `PID: ${servicoData.pid}`;
+        const stale = cells[0].querySelector('.badge-stale');
+        if (stale) stale.classList.toggle('d-none', !servicoData.stale);
         
-        // Atualiza métricas
+        // Status
+        cells[1].innerHTML = servicoData.ativo ? 
+            '<span class="badge bg-success"><i class="bi bi-check-circle-fill me-1"></i>Ativo</span>' : 
+            '<span class="badge bg-danger"><i class="bi bi-x-circle-fill me-1"></i>Parado</span>';
+        
+        atualizarMetricasLinha(row, servicoData);
+        
+        // Kill só para serviço ativo com PID
+        const kill = row.querySelector('.btn-kill');
+        if (kill) kill.classList.toggle('d-none', !(servicoData.ativo && servicoData.pid !== '0'));
+    }
+    
+    /**
+     * Atualiza uptime, CPU, memória e threads de uma linha (evento "metricas")
+     */
+    function atualizarMetricasLinha(row, servicoData) {
         const cells = row.querySelectorAll('td');
-        if (cells.length >= 6) {
-            // CPU
-            cells[3].innerHTML = `<span class="badge ${
-                servicoData.cpu_percent > 80 ? 'bg-danger' : 
-                servicoData.cpu_percent > 50 ? 'bg-warning' : 'bg-success'
-            }">${servicoData.cpu_percent}%</span>`;
-            
-            // Memória
-            cells[4].innerHTML = `<span class="badge ${
-                servicoData.memoria_percent > 80 ? 'bg-danger' : 
-                servicoData.memoria_percent > 50 ? 'bg-warning' : 'bg-success'
-            }">${servicoData.memoria_mb.toFixed(1)} MB</span>`;
-            
-            // Threads
-            cells[5].textContent = servicoData.threads;
-        }
+        if (cells.length < 6) return;
+        
+        // Uptime
+        cells[2].textContent = servicoData.uptime;
+        
+        // CPU
+        cells[3].innerHTML = `<span class="badge ${
+            servicoData.cpu_percent > 80 ? 'bg-danger' : 
+            servicoData.cpu_percent > 50 ? 'bg-warning' : 'bg-success'
+        }">${servicoData.cpu_percent}%</span>`;
+        
+        // Memória
+        cells[4].innerHTML = `<span class="badge ${
+            servicoData.memoria_percent > 80 ? 'bg-danger' : 
+            servicoData.memoria_percent > 50 ? 'bg-warning' : 'bg-success'
+        }">${servicoData.memoria_mb.toFixed(1)} MB</span>`;
+        
+        // Threads
+        cells[5].textContent = servicoData.threads;
+    }
+    
+    /**
+     * Conecta ao canal de eventos do servidor (Server-Sent Events)
+     * 
+     * Os eventos são repassados à página como eventos do document:
+     * dashboard:status, dashboard:metricas, dashboard:alerta, dashboard:historico e dashboard:conexao.
+     * Com `versao`, o servidor envia também o status dos serviços alterados desde ela.
+     */
+    let eventosSource = null;
+    
+    function conectarEventos(versao = null) {
+        if (eventosSource) eventosSource.close();
+        
+        const params = versao ? `?versao=${encodeURIComponent(versao)}` : '';
+        eventosSource = new EventSource(`${API_BASE}/eventos${params}`);
+        
+        const repassar = (tipo) => (e) => {
+            document.dispatchEvent(new CustomEvent(`dashboard:${tipo}`, { detail: JSON.parse(e.data) }));
+        };
+        eventosSource.addEventListener('status', repassar('status'));
+        eventosSource.addEventListener('metricas', repassar('metricas'));
+        eventosSource.addEventListener('historico', repassar('historico'));
+        eventosSource.addEventListener('alerta', (e) => {
+            notificarAlerta(JSON.parse(e.data));
+            repassar('alerta')(e);
+        });
+        eventosSource.addEventListener('alerta_resolvido', (e) => {
+            alertasAtivos = Math.max(0, alertasAtivos - 1);
+            atualizarBadgeAlertas(alertasAtivos);
+            repassar('alerta_resolvido')(e);
+        });
+        
+        eventosSource.onopen = () => {
+            document.dispatchEvent(new CustomEvent('dashboard:conexao', { detail: { conectado: true } }));
+        };
+        eventosSource.onerror = () => {
+            // O EventSource reconecta sozinho, continuando do último evento recebido
+            document.dispatchEvent(new CustomEvent('dashboard:conexao', { detail: { conectado: false } }));
+        };
+        
+        return eventosSource;
     }
     
     /**
@@ -265,19 +324,28 @@
     }
     
     /**
-     * Monitora alertas ativos
+     * Atualiza o badge de alertas
+     */
+    function atualizarBadgeAlertas(quantidade) {
+        const badge = document.getElementById('alertasBadge');
+        if (badge) {
+            badge.textContent = quantidade;
+            badge.style.display = quantidade > 0 ? 'inline-block' : 'none';
+        }
+    }
+    
+    /**
+     * Carrega os alertas ativos (uma vez; os novos chegam pelo canal de eventos)
      */
+    let alertasAtivos = 0;
+    
     async function monitorarAlertas() {
         try {
             const data = await apiRequest('/alertas?ativos=true');
             
-            if (data.success && data.alertas.length > 0) {
-                // Atualiza badge de alertas
-                const badge = document.getElementById('alertasBadge');
-                if (badge) {
-                    badge.textContent = data.alertas.length;
-                    badge.style.display = 'inline-block';
-                }
+            if (data.success) {
+                alertasAtivos = data.alertas.length;
+                atualizarBadgeAlertas(alertasAtivos);
                 
                 // Mostra notificação se houver alertas críticos
                 const criticos = data.alertas.filter(a => a.severidade === 'critical');
@@ -292,6 +360,24 @@
         }
     }
     
+    /**
+     * Novo alerta recebido do servidor
+     */
+    function notificarAlerta(alerta) {
+        // Escalonamento de severidade reutiliza o alerta já contado
+        if (!alerta.escalado) {
+            alertasAtivos++;
+            atualizarBadgeAlertas(alertasAtivos);
+        }
+        
+        if (alerta.severidade === 'critical') {
+            showToast('error', `Alerta Crítico: ${alerta.servico}`, alerta.mensagem);
+            playNotificationSound('critical');
+        } else {
+            showToast('warning', `Alerta: ${alerta.servico}`, alerta.mensagem);
+        }
+    }
+    
     // ========== INITIALIZATION ==========
     
     document.addEventListener('DOMContentLoaded', function() {
@@ -301,9 +387,11 @@
         // Setup tooltips
         setupTooltips();
         
-        // Monitora alertas periodicamente
+        // Alertas ativos no carregamento; os novos chegam pelo canal de eventos
         monitorarAlertas();
-        setInterval(monitorarAlertas, 60000); // A cada 1 minuto
+        
+        // Páginas que exibem o status (window.versaoStatus) recebem também as diferenças
+        conectarEventos(window.versaoStatus || null);
         
         // Log de inicialização
         console.log('Dashboard ERP Protheus 2.0 inicializado');
@@ -316,6 +404,9 @@
         formatBytes,
         formatTimestamp,
         atualizarStatusServico,
+        atualizarLinhaServico,
+        atualizarMetricasLinha,
+        conectarEventos,
         carregarMetricasServico,
         exportarHistorico
     };
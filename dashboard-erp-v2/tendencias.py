@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Detecção de anomalias e tendências nas métricas
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+# (servico, tipo_alerta, severidade, mensagem); severidade None = condição normalizada
+Achado = Tuple[str, str, Optional[str], str]
+
+
+class MediaMovelExponencial:
+    """Média e variância exponenciais (EWMA), atualizadas a cada amostra em O(1)"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.media = None
+        self.variancia = 0.0
+        self.amostras = 0
+
+    def adicionar(self, valor: float) -> Optional[float]:
+        """Acrescenta a amostra e retorna o z-score dela em relação à média anterior"""
+        self.amostras += 1
+        if self.media is None:
+            self.media = valor
+            return None
+
+        desvio = math.sqrt(self.variancia)
+        z = (valor - self.media) / desvio if desvio > 0 else 0.0
+
+        diferenca = valor - self.media
+        incremento = self.alpha * diferenca
+        self.media += incremento
+        self.variancia = (1 - self.alpha) * (self.variancia + diferenca * incremento)
+        return z
+
+
+class RegressaoDeslizante:
+    """
+    Regressão linear (mínimos quadrados) sobre as últimas N amostras
+
+    Mantém as somas de t, y, t², y² e t·y da janela: cada amostra nova soma
+    seus termos e subtrai os da que saiu, sem reprocessar a janela. O tempo
+    é relativo à primeira amostra e as somas são recalculadas a cada volta
+    completa da janela para não acumular erro de arredondamento.
+    """
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self._pontos = deque()
+        self._origem = None
+        self._desde_recalculo = 0
+        self._zerar_somas()
+
+    def _zerar_somas(self):
+        self._st = self._sy = self._stt = self._syy = self._sty = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pontos)
+
+    def _somar(self, t: float, y: float, sinal: int):
+        self._st += sinal * t
+        self._sy += sinal * y
+        self._stt += sinal * t * t
+        self._syy += sinal * y * y
+        self._sty += sinal * t * y
+
+    def adicionar(self, instante: float, valor: float):
+        if self._origem is None:
+            self._origem = instante
+        t = instante - self._origem
+
+        self._pontos.append((t, valor))
+        self._somar(t, valor, 1)
+        if len(self._pontos) > self.capacidade:
+            self._somar(*self._pontos.popleft(), -1)
+
+        self._desde_recalculo += 1
+        if self._desde_recalculo >= self.capacidade:
+            self._desde_recalculo = 0
+            self._zerar_somas()
+            for t, y in self._pontos:
+                self._somar(t, y, 1)
+
+    def limpar(self):
+        self._pontos.clear()
+        self._origem = None
+        self._desde_recalculo = 0
+        self._zerar_somas()
+
+    @property
+    def duracao(self) -> float:
+        """Segundos cobertos pela janela"""
+        return self._pontos[-1][0] - self._pontos[0][0] if len(self._pontos) > 1 else 0.0
+
+    def ajuste(self) -> Optional[Tuple[float, float, float]]:
+        """
+        Returns:
+            (inclinação por segundo, valor ajustado na última amostra, R²),
+            ou None com menos de 3 amostras ou sem variação no tempo
+        """
+        n = len(self._pontos)
+        if n < 3:
+            return None
+
+        var_t = n * self._stt - self._st ** 2
+        if var_t <= 0:
+            return None
+
+        inclinacao = (n * self._sty - self._st * self._sy) / var_t
+        intercepto = (self._sy - inclinacao * self._st) / n
+
+        var_y = n * self._syy - self._sy ** 2
+        r2 = ((n * self._sty - self._st * self._sy) ** 2 / (var_t * var_y)) if var_y > 0 else 0.0
+
+        return inclinacao, intercepto + inclinacao * self._pontos[-1][0], r2
+
+
+class EstadoServico:
+    """Detectores de um serviço (zerados quando o processo reinicia)"""
+
+    def __init__(self, capacidade: int):
+        self.cpu = MediaMovelExponencial(Config.ANOMALY_CPU_ALPHA)
+        self.memoria = RegressaoDeslizante(capacidade)
+        self.threads = RegressaoDeslizante(capacidade)
+        self.pid = None
+        self.ultimo = {}
+
+    def reiniciar(self):
+        self.cpu = MediaMovelExponencial(Config.ANOMALY_CPU_ALPHA)
+        self.memoria.limpar()
+        self.threads.limpar()
+
+
+class DetectorTendencias:
+    """
+    Alertas por tendência nas métricas coletadas, por serviço
+
+    - CPU: z-score da amostra contra a média/variância exponenciais (EWMA)
+    - Memória: regressão linear na janela; com crescimento consistente (R²
+      alto) estima o tempo até consumir toda a memória (time-to-OOM)
+    - Threads: crescimento consistente acima de THREAD_GROWTH_PER_HOUR
+
+    Tudo é atualizado incrementalmente a cada coleta, com a mesma janela do
+    buffer em memória (METRICS_BUFFER_SIZE amostras).
+    """
+
+    def __init__(self, capacidade: Optional[int] = None):
+        self.capacidade = capacidade or Config.METRICS_BUFFER_SIZE
+        self._estados = {}
+        self._lock = threading.Lock()
+
+    def avaliar(self, registros: List[Dict], instante: float) -> List[Achado]:
+        """Acrescenta as amostras do ciclo e retorna os alertas abertos/normalizados"""
+        achados = []
+        with self._lock:
+            for registro in registros:
+                servico = registro['servico']
+                estado = self._estados.get(servico)
+                if estado is None:
+                    estado = self._estados[servico] = EstadoServico(self.capacidade)
+
+                # PID diferente do anterior: o processo reiniciou, a série recomeça
+                pid = registro.get('pid')
+                if estado.pid is not None and pid != estado.pid:
+                    estado.reiniciar()
+                estado.pid = pid
+
+                achados.extend(self._avaliar_cpu(servico, estado, registro))
+                achados.extend(self._avaliar_memoria(servico, estado, registro, instante))
+                achados.extend(self._avaliar_threads(servico, estado, registro, instante))
+        return achados
+
+    def _avaliar_cpu(self, servico: str, estado: EstadoServico, registro: Dict) -> List[Achado]:
+        cpu = registro.get('cpu_percent') or 0.0
+        z = estado.cpu.adicionar(cpu)
+        estado.ultimo['cpu_ewma'] = round(estado.cpu.media, 2)
+        estado.ultimo['cpu_zscore'] = round(z, 2) if z is not None else None
+
+        if z is None or estado.cpu.amostras < Config.ANOMALY_MIN_SAMPLES:
+            return []
+        if z >= Config.ANOMALY_CPU_ZSCORE and cpu >= Config.ANOMALY_CPU_MIN_PERCENT:
+            return [(servico, 'cpu_anomala', 'warning',
+                     f"CPU de {servico} em {cpu:.1f}% (média recente {estado.cpu.media:.1f}%, z={z:.1f})")]
+        if z < Config.ANOMALY_CPU_ZSCORE / 2:
+            return [(servico, 'cpu_anomala', None, '')]
+        return []
+
+    def _avaliar_memoria(self, servico: str, estado: EstadoServico, registro: Dict,
+                         instante: float) -> List[Achado]:
+        memoria = registro.get('memory_mb') or 0.0
+        percentual = registro.get('memory_percent') or 0.0
+        estado.memoria.adicionar(instante, memoria)
+
+        ajuste = estado.memoria.ajuste()
+        if (not ajuste or len(estado.memoria) < Config.ANOMALY_MIN_SAMPLES
+                or estado.memoria.duracao < Config.LEAK_MIN_WINDOW_MINUTES * 60):
+            return []
+
+        inclinacao, ajustado, r2 = ajuste
+        estado.ultimo['memoria_mb_por_hora'] = round(inclinacao * 3600, 2)
+        estado.ultimo['memoria_r2'] = round(r2, 3)
+        estado.ultimo['horas_ate_oom'] = None
+
+        # Limite: memória total (memory_percent é relativo a ela)
+        if inclinacao <= 0 or r2 < Config.LEAK_MIN_R2 or percentual <= 0:
+            return [(servico, 'vazamento_memoria', None, '')]
+
+        limite_mb = memoria * 100 / percentual
+        horas = max(limite_mb - ajustado, 0) / inclinacao / 3600
+        estado.ultimo['horas_ate_oom'] = round(horas, 1)
+
+        if horas > 2 * Config.LEAK_HORIZON_HOURS:
+            return [(servico, 'vazamento_memoria', None, '')]
+        if horas > Config.LEAK_HORIZON_HOURS:
+            return []
+
+        severidade = 'critical' if horas <= 1 else 'warning'
+        return [(servico, 'vazamento_memoria', severidade,
+                 f"Memória de {servico} crescendo {inclinacao * 3600:.0f} MB/h: "
+                 f"esgota em ~{horas:.1f}h (R²={r2:.2f})")]
+
+    def _avaliar_threads(self, servico: str, estado: EstadoServico, registro: Dict,
+                         instante: float) -> List[Achado]:
+        estado.threads.adicionar(instante, registro.get('threads') or 0)
+
+        ajuste = estado.threads.ajuste()
+        if (not ajuste or len(estado.threads) < Config.ANOMALY_MIN_SAMPLES
+                or estado.threads.duracao < Config.LEAK_MIN_WINDOW_MINUTES * 60):
+            return []
+
+        inclinacao, _, r2 = ajuste
+        por_hora = inclinacao * 3600
+        estado.ultimo['threads_por_hora'] = round(por_hora, 1)
+
+        if por_hora >= Config.THREAD_GROWTH_PER_HOUR and r2 >= Config.LEAK_MIN_R2:
+            return [(servico, 'threads_crescendo', 'warning',
+                     f"Threads de {servico} crescendo {por_hora:.0f}/h (R²={r2:.2f})")]
+        if por_hora < Config.THREAD_GROWTH_PER_HOUR / 2:
+            return [(servico, 'threads_crescendo', None, '')]
+        return []
+
+    def obter(self, servico: str) -> Optional[Dict]:
+        """Últimos valores dos detectores de um serviço"""
+        with self._lock:
+            estado = self._estados.get(servico)
+            return dict(estado.ultimo) if estado else None
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - As consultas frequentes devem usar índice (EXPLAIN QUERY PLAN)
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import CONSULTAS_INDEXADAS, Database  # noqa: E402
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco novo em um diretório temporário, criado pelo próprio Database"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / 'dashboard.db'))
+    return Database()
+
+
+def test_todas_as_consultas_conferidas(banco):
+    assert set(banco.verificar_indices()) == set(CONSULTAS_INDEXADAS)
+
+
+@pytest.mark.parametrize('nome', sorted(CONSULTAS_INDEXADAS))
+def test_consulta_usa_indice(banco, nome):
+    resultado = banco.verificar_indices()[nome]
+    assert resultado['ok'], f"{nome} sem índice: {resultado['plano']}"
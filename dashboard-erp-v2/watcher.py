@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard ERP Protheus 2.0 - Monitor de transições de estado do systemd
+Autor: Fernando Vernier - https://www.linkedin.com/in/fernando-v-10758522/
+"""
+
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import Config, ServicesConfig
+from models import Alertas
+
+# D-Bus é opcional: sem o jeepney instalado o monitor usa o `systemctl list-units`
+try:
+    from jeepney import DBusAddress, HeaderFields, new_method_call
+    from jeepney.bus_messages import MatchRule, message_bus
+    from jeepney.io.blocking import Proxy, open_dbus_connection
+    DBUS_DISPONIVEL = True
+except ImportError:
+    DBUS_DISPONIVEL = False
+
+UNIT_PATH_PREFIX = '/org/freedesktop/systemd1/unit/'
+
+
+def decodificar_unit_path(path: str) -> str:
+    """Converte o object path do D-Bus no nome da unidade (appserver_5fslave_2eservice -> appserver_slave.service)"""
+    nome = path[len(UNIT_PATH_PREFIX):]
+    resultado = []
+    i = 0
+    while i < len(nome):
+        if nome[i] == '_' and i + 2 < len(nome):
+            resultado.append(chr(int(nome[i + 1:i + 3], 16)))
+            i += 3
+        else:
+            resultado.append(nome[i])
+            i += 1
+    return ''.join(resultado)
+
+
+class SystemdWatcher:
+    """
+    Detecta quando um serviço muda de estado e atualiza o snapshot na hora
+
+    Com D-Bus (jeepney) assina os sinais PropertiesChanged das unidades;
+    sem ele, consulta todas as unidades com um único `systemctl list-units`
+    a cada SYSTEMD_WATCH_INTERVAL. Em cada transição, recoleta apenas os
+    serviços afetados e cria um alerta quando um serviço cai sem que o
+    dashboard tenha pedido, e o resolve quando a unidade volta a "active".
+    Unidades já paradas na primeira consulta também geram alerta. Com SYSTEMD_WATCH_MODE=off o monitor não roda e o
+    coletor continua alertando os serviços parados a cada ciclo.
+    """
+
+    def __init__(self, collector, modo: Optional[str] = None):
+        self.collector = collector
+        self.service_manager = collector.service_manager
+        self.alertas = Alertas()
+        self.modo = modo or Config.SYSTEMD_WATCH_MODE
+        self.servicos = set(ServicesConfig.get_all_services())
+        self._estados = {}  # servico -> (ActiveState, SubState)
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """Inicia a thread do monitor"""
+        if self.modo == 'off' or (self._thread and self._thread.is_alive()):
+            return
+        self.collector.verificar_parado = False
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name='systemd-watcher', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self):
+        try:
+            self._estados = self._listar_unidades()
+        except Exception as e:
+            print(f"[ERRO] Falha ao consultar estado inicial das unidades: {e}")
+        self._avaliar_iniciais(self._estados)
+
+        if self.modo in ('auto', 'dbus') and DBUS_DISPONIVEL:
+            try:
+                self._loop_dbus()
+                return
+            except Exception as e:
+                print(f"[ERRO] Monitor D-Bus indisponível, usando systemctl list-units: {e}")
+        elif self.modo == 'dbus':
+            print("[AVISO] SYSTEMD_WATCH_MODE=dbus, mas o jeepney não está instalado; usando systemctl list-units")
+
+        self._loop_poll()
+
+    # ==================== FONTES DE EVENTOS ====================
+
+    def _listar_unidades(self) -> Dict[str, Tuple[str, str]]:
+        """ActiveState/SubState de todas as unidades configuradas em uma única chamada"""
+        cmd = subprocess.run(
+            ["sudo", "systemctl", "list-units", "--all", "--plain", "--no-legend", "--no-pager"]
+            + [f"{servico}.service" for servico in sorted(self.servicos)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=10
+        )
+
+        estados = {}
+        for linha in cmd.stdout.splitlines():
+            # UNIT LOAD ACTIVE SUB DESCRIPTION
+            campos = linha.split(None, 4)
+            if len(campos) >= 4 and campos[0].endswith('.service'):
+                servico = campos[0][:-len('.service')]
+                if servico in self.servicos:
+                    estados[servico] = (campos[2], campos[3])
+        return estados
+
+    def _loop_poll(self):
+        while not self._parar.wait(Config.SYSTEMD_WATCH_INTERVAL):
+            try:
+                atuais = self._listar_unidades()
+                self._processar({s: e for s, e in atuais.items() if self._estados.get(s) != e})
+            except Exception as e:
+                print(f"[ERRO] Falha ao consultar estado das unidades: {e}")
+
+    def _loop_dbus(self):
+        conn = open_dbus_connection(bus='SYSTEM')
+        try:
+            # Sem Subscribe o systemd não emite os sinais das unidades
+            systemd = DBusAddress('/org/freedesktop/systemd1', bus_name='org.freedesktop.systemd1',
+                                  interface='org.freedesktop.systemd1.Manager')
+            conn.send_and_get_reply(new_method_call(systemd, 'Subscribe'))
+
+            regra = MatchRule(
+                type='signal',
+                interface='org.freedesktop.DBus.Properties',
+                member='PropertiesChanged',
+                path_namespace=UNIT_PATH_PREFIX.rstrip('/')
+            )
+            Proxy(message_bus, conn).AddMatch(regra)
+
+            with conn.filter(regra) as fila:
+                while not self._parar.is_set():
+                    try:
+                        msg = conn.recv_until_filtered(fila, timeout=5)
+                    except TimeoutError:
+                        continue
+
+                    interface, alteradas, _ = msg.body
+                    if interface != 'org.freedesktop.systemd1.Unit' or 'ActiveState' not in alteradas:
+                        continue
+
+                    unidade = decodificar_unit_path(msg.header.fields[HeaderFields.path])
+                    servico = unidade[:-len('.service')] if unidade.endswith('.service') else unidade
+                    if servico not in self.servicos:
+                        continue
+
+                    anterior = self._estados.get(servico, ('unknown', 'unknown'))
+                    estado = (
+                        alteradas['ActiveState'][1],
+                        alteradas['SubState'][1] if 'SubState' in alteradas else anterior[1]
+                    )
+                    if estado != anterior:
+                        self._processar({servico: estado})
+        finally:
+            conn.close()
+
+    # ==================== TRANSIÇÕES ====================
+
+    def _processar(self, mudancas: Dict[str, Tuple[str, str]]):
+        """Atualiza o snapshot dos serviços que mudaram e cria os alertas"""
+        if not mudancas:
+            return
+
+        anteriores = {servico: self._estados.get(servico) for servico in mudancas}
+        self._estados.update(mudancas)
+
+        try:
+            self.collector.atualizar_servicos(list(mudancas))
+        except Exception as e:
+            print(f"[ERRO] Falha ao atualizar snapshot após transição: {e}")
+
+        for servico, (estado, sub_estado) in mudancas.items():
+            anterior = anteriores[servico]
+            # Sem estado anterior (unidade ainda não vista), parada conta como queda
+            if (anterior is None or anterior[0] == 'active') and estado in ('inactive', 'failed'):
+                self._alertar_queda(servico, estado, sub_estado)
+            elif estado == 'active':
+                self._resolver_queda(servico)
+
+    def _avaliar_iniciais(self, estados: Dict[str, Tuple[str, str]]):
+        """Alerta as unidades já paradas quando o monitor iniciou e resolve o alerta das ativas"""
+        for servico, (estado, sub_estado) in estados.items():
+            if estado in ('inactive', 'failed'):
+                self._alertar_queda(servico, estado, sub_estado, inicial=True)
+            elif estado == 'active':
+                self._resolver_queda(servico)
+
+    def _resolver_queda(self, servico: str):
+        try:
+            self.alertas.normalizar(servico, 'servico_parado')
+        except Exception as e:
+            print(f"[ERRO] Falha ao resolver alerta de {servico}: {e}")
+
+    def _alertar_queda(self, servico: str, estado: str, sub_estado: str, inicial: bool = False):
+        # Start/stop pedido pelo próprio dashboard não é queda
+        if self.service_manager.acao_manual_recente(servico):
+            return
+
+        try:
+            if estado == 'failed':
+                mensagem = f"Serviço {servico} falhou ({sub_estado})"
+            elif inicial:
+                mensagem = f"Serviço {servico} está parado"
+            else:
+                mensagem = f"Serviço {servico} parou inesperadamente"
+            self.alertas.criar(
+                servico=servico,
+                tipo_alerta='servico_parado',
+                mensagem=mensagem,
+                severidade='critical'
+            )
+        except Exception as e:
+            print(f"[ERRO] Falha ao criar alerta de {servico}: {e}")
+
@@ -0,0 +1,107 @@
+"""
+Backpressure e descarte controlado de carga no endpoint /webhook.
+
+Quando o worker não acompanha o volume de eventos, a API passa a recusar
+novos eventos (429/503 com Retry-After) em vez de deixar a fila crescer
+até o Redis atingir maxmemory. O chamador (webhublib.prw) aguarda e
+reenvia.
+
+Variáveis de ambiente:
+    QUEUE_HIGH_WATER_MARK   Profundidade total das filas que satura o hub (padrão: 50000)
+    DB_POOL_HIGH_WATER      Fração do pool do banco em uso que satura o hub (padrão: 0.9)
+    RETRY_AFTER_SECONDS     Valor base do header Retry-After (padrão: 30)
+    QUEUE_DEPTH_CACHE_MS    Cache da leitura das filas, evita LLEN a cada requisição (padrão: 500)
+    EVENT_PRIORITIES        Prioridade por event_type (ex: nfe.emitida=high,estoque.baixo=low)
+"""
+
+import os
+import time
+from collections import namedtuple
+from typing import Dict, Optional
+
+from tenants import TENANTS, queue_name, queue_quota
+
+QUEUE_HIGH_WATER_MARK = int(os.getenv("QUEUE_HIGH_WATER_MARK", "50000"))
+DB_POOL_HIGH_WATER = float(os.getenv("DB_POOL_HIGH_WATER", "0.9"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "30"))
+QUEUE_DEPTH_CACHE_MS = int(os.getenv("QUEUE_DEPTH_CACHE_MS", "500"))
+
+# Eventos de baixa prioridade são descartados antes; os de alta têm folga extra
+PRIORITY_FACTORS = {"low": 0.5, "normal": 1.0, "high": 1.2}
+
+
+def _parse_priorities(value: str) -> Dict[str, str]:
+    priorities = {}
+    for item in value.split(","):
+        event_type, _, priority = item.strip().partition("=")
+        if priority.strip() in PRIORITY_FACTORS:
+            priorities[event_type.strip()] = priority.strip()
+    return priorities
+
+
+EVENT_PRIORITIES = _parse_priorities(os.getenv("EVENT_PRIORITIES", ""))
+
+Rejection = namedtuple("Rejection", ["status_code", "message", "retry_after"])
+
+
+class LoadShedder:
+    """Decide se um evento deve ser aceito conforme a carga do hub"""
+
+    def __init__(self, redis_conn, engine):
+        self.redis = redis_conn
+        self.engine = engine
+        self._depths: Dict[str, int] = {}
+        self._depths_at = 0.0
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Tamanho das filas por tenant (lido em uma única ida ao Redis, com cache curto)"""
+        now = time.monotonic()
+        if (now - self._depths_at) * 1000 >= QUEUE_DEPTH_CACHE_MS:
+            pipe = self.redis.pipeline(transaction=False)
+            for tenant in TENANTS:
+                pipe.llen(queue_name(tenant))
+            self._depths = dict(zip(TENANTS, pipe.execute()))
+            self._depths_at = now
+        return self._depths
+
+    def pool_usage(self) -> float:
+        """Fração das conexões do pool do banco em uso"""
+        pool = self.engine.pool
+        try:
+            capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            return pool.checkedout() / capacity if capacity > 0 else 0.0
+        except AttributeError:
+            return 0.0
+
+    def check(self, tenant: str, event_type: str) -> Optional[Rejection]:
+        """Retorna o motivo da recusa, ou None se o evento pode ser aceito"""
+        factor = PRIORITY_FACTORS[EVENT_PRIORITIES.get(event_type, "normal")]
+        depths = self.queue_depths()
+
+        # Cota do tenant: um pico de um tenant não afeta os demais
+        tenant_depth = depths.get(tenant, 0)
+        if tenant_depth >= queue_quota(tenant) * factor:
+            return Rejection(429, f"Fila do tenant {tenant} atingiu a cota", RETRY_AFTER_SECONDS)
+
+        # Saturação global do hub
+        total = sum(depths.values())
+        if total >= QUEUE_HIGH_WATER_MARK * factor:
+            retry_after = RETRY_AFTER_SECONDS * max(1, total // max(QUEUE_HIGH_WATER_MARK, 1))
+            return Rejection(503, "Hub saturado: fila de processamento cheia", retry_after)
+
+        if self.pool_usage() >= min(DB_POOL_HIGH_WATER * factor, 1.0):
+            return Rejection(503, "Hub saturado: pool do banco de dados esgotado", RETRY_AFTER_SECONDS)
+
+        return None
+
+    def status(self) -> Dict:
+        """Resumo da carga atual (para /health e /stats)"""
+        depths = self.queue_depths()
+        total = sum(depths.values())
+        return {
+            "queue_depth": total,
+            "queue_high_water_mark": QUEUE_HIGH_WATER_MARK,
+            "db_pool_usage": round(self.pool_usage(), 2),
+            "db_pool_high_water": DB_POOL_HIGH_WATER,
+            "saturated": total >= QUEUE_HIGH_WATER_MARK or self.pool_usage() >= DB_POOL_HIGH_WATER
+        }
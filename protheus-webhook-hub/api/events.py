@@ -0,0 +1,160 @@
+"""
+Registro de schemas de eventos do Protheus.
+
+Cada tipo de evento conhecido (`event_type`) pode ter um ou mais modelos
+pydantic versionados. Eventos com schema são validados na entrada da API
+(payloads malformados são rejeitados com 422) e os formatadores do worker
+leem campos tipados. Eventos sem schema seguem o caminho genérico
+(`Dict[str, Any]`).
+
+Os validadores do pydantic v2 são compilados uma única vez, na criação
+de cada classe, então validar um evento não tem custo de montagem.
+"""
+
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel, ConfigDict
+
+Numero = Union[int, float]
+
+
+class EventSchema(BaseModel):
+    """Base dos schemas de evento"""
+
+    model_config = ConfigDict(extra="allow", str_strip_whitespace=True)
+
+    # Campos exibidos nas mensagens formatadas (Slack/Teams), em ordem
+    SUMMARY_FIELDS: ClassVar[Tuple[str, ...]] = ()
+
+    def summary(self, limit: int = 5) -> List[Tuple[str, Any]]:
+        """Retorna os campos principais do evento para exibição"""
+        fields = []
+        for name in self.SUMMARY_FIELDS:
+            value = getattr(self, name, None)
+            if value is not None:
+                fields.append((name, value))
+            if len(fields) >= limit:
+                break
+        return fields
+
+
+class UnknownSchemaVersion(ValueError):
+    """Versão de schema não registrada para um tipo de evento conhecido"""
+
+
+class EventRegistry:
+    """Registro de schemas por event_type e versão"""
+
+    def __init__(self):
+        self._schemas: Dict[str, Dict[int, Type[EventSchema]]] = {}
+        self._latest: Dict[str, int] = {}
+
+    def register(self, event_type: str, version: int = 1):
+        """Decorator que registra um schema para um tipo de evento"""
+        def decorator(model: Type[EventSchema]) -> Type[EventSchema]:
+            self._schemas.setdefault(event_type, {})[version] = model
+            self._latest[event_type] = max(version, self._latest.get(event_type, 0))
+            return model
+        return decorator
+
+    def event_types(self) -> Dict[str, List[int]]:
+        """Lista os tipos de evento registrados e suas versões"""
+        return {event_type: sorted(versions) for event_type, versions in self._schemas.items()}
+
+    def get(self, event_type: str, version: Optional[int] = None) -> Optional[Type[EventSchema]]:
+        """Retorna o schema (última versão por padrão) ou None se o evento não tem schema"""
+        versions = self._schemas.get(event_type)
+        if not versions:
+            return None
+        if version is None:
+            version = self._latest[event_type]
+        model = versions.get(version)
+        if model is None:
+            raise UnknownSchemaVersion(f"Versão {version} não registrada para {event_type}")
+        return model
+
+    def validate(self, event_type: str, data: Dict[str, Any],
+                 version: Optional[int] = None) -> Optional[EventSchema]:
+        """Valida os dados do evento. Retorna None para eventos sem schema"""
+        model = self.get(event_type, version)
+        if model is None:
+            return None
+        return model.model_validate(data)
+
+    def summary(self, event_type: str, data: Dict[str, Any],
+                version: Optional[int] = None, limit: int = 5) -> List[Tuple[str, Any]]:
+        """Campos para exibição, com fallback para os primeiros campos do dict"""
+        try:
+            event = self.validate(event_type, data, version)
+        except ValueError:
+            event = None
+        if event is None:
+            return list(data.items())[:limit]
+        return event.summary(limit)
+
+
+registry = EventRegistry()
+
+
+# ==================== SCHEMAS (webhublib.prw) ====================
+
+@registry.register("pedido.criado", version=1)
+class PedidoCriadoV1(EventSchema):
+    numero_pedido: str
+    cliente: str
+    loja: Optional[str] = None
+    tipo: Optional[str] = None
+    nome_cliente: Optional[str] = None
+    emissao: Optional[str] = None
+    valor_total: Optional[Numero] = None
+    condicao_pagamento: Optional[str] = None
+    vendedor: Optional[str] = None
+    filial: Optional[str] = None
+
+    SUMMARY_FIELDS = ("numero_pedido", "nome_cliente", "cliente", "valor_total", "emissao", "vendedor")
+
+
+@registry.register("nfe.emitida", version=1)
+class NFeEmitidaV1(EventSchema):
+    numero_nfe: str
+    serie: Optional[str] = None
+    cliente: Optional[str] = None
+    loja: Optional[str] = None
+    nome_cliente: Optional[str] = None
+    emissao: Optional[str] = None
+    valor_total: Optional[Numero] = None
+    chave_nfe: Optional[str] = None
+    filial: Optional[str] = None
+
+    SUMMARY_FIELDS = ("numero_nfe", "serie", "nome_cliente", "valor_total", "chave_nfe", "emissao")
+
+
+@registry.register("estoque.baixo", version=1)
+class EstoqueBaixoV1(EventSchema):
+    produto: str
+    descricao: Optional[str] = None
+    local: Optional[str] = None
+    saldo_atual: Numero
+    estoque_minimo: Optional[Numero] = None
+    diferenca: Optional[Numero] = None
+    filial: Optional[str] = None
+
+    SUMMARY_FIELDS = ("produto", "descricao", "saldo_atual", "estoque_minimo", "local")
+
+
+@registry.register("cliente.cadastrado", version=1)
+class ClienteCadastradoV1(EventSchema):
+    codigo: str
+    loja: Optional[str] = None
+    nome: str
+    nome_fantasia: Optional[str] = None
+    cnpj_cpf: Optional[str] = None
+    email: Optional[str] = None
+    telefone: Optional[str] = None
+    cidade: Optional[str] = None
+    estado: Optional[str] = None
+    vendedor: Optional[str] = None
+    data_cadastro: Optional[str] = None
+    filial: Optional[str] = None
+
+    SUMMARY_FIELDS = ("codigo", "nome", "cnpj_cpf", "cidade", "estado", "vendedor")
@@ -1,14 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 import json
 import redis
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+import uuid
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from replay import run_replay, DEFAULT_BATCH_SIZE, DEFAULT_RATE
+from events import registry as event_registry, UnknownSchemaVersion
+from tenants import DEFAULT_TENANT, is_known_tenant, queue_name, queue_quota
+from backpressure import LoadShedder
 
 # Configurações
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://webhook_user:webhook_pass@db:5432/webhook_hub")
@@ -42,21 +47,35 @@ Base = declarative_base()
 # Models
 class WebhookConfig(Base):
     __tablename__ = "webhook_configs"
+    __table_args__ = (
+        Index("ix_webhook_configs_tenant_event", "tenant", "event_type", "active"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    tenant = Column(String(50), nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
     name = Column(String(255), nullable=False)
     event_type = Column(String(100), nullable=False, index=True)
     destination_url = Column(String(500), nullable=False)
     destination_type = Column(String(50), nullable=False)  # slack, teams, whatsapp, custom
     active = Column(Boolean, default=True)
     headers = Column(Text)  # JSON string
+    signing_secret = Column(String(255))  # segredo HMAC (X-Hub-Signature)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @property
+    def signing_enabled(self) -> bool:
+        return bool(self.signing_secret)
+
 class WebhookLog(Base):
     __tablename__ = "webhook_logs"
+    __table_args__ = (
+        Index("ix_webhook_logs_tenant_created", "tenant", "created_at"),
+        Index("ix_webhook_logs_tenant_status", "tenant", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    tenant = Column(String(50), nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT)
     event_type = Column(String(100), nullable=False, index=True)
     payload = Column(Text, nullable=False)
     status = Column(String(50), nullable=False)  # pending, success, failed
@@ -64,10 +83,30 @@ class WebhookLog(Base):
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     processed_at = Column(DateTime)
+    replay_of = Column(Integer, index=True)  # log original, quando criado por um replay
+
+# Backpressure (fila e pool do banco)
+load_shedder = LoadShedder(redis_client, engine)
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Colunas adicionadas após a versão inicial (create_all não altera tabelas existentes)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE webhook_configs ADD COLUMN IF NOT EXISTS signing_secret VARCHAR(255)",
+    f"ALTER TABLE webhook_configs ADD COLUMN IF NOT EXISTS tenant VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_TENANT}'",
+    f"ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS tenant VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_TENANT}'",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_configs_tenant_event ON webhook_configs (tenant, event_type, active)",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_logs_tenant_created ON webhook_logs (tenant, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_logs_tenant_status ON webhook_logs (tenant, status, created_at)",
+    "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS replay_of INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_logs_replay_of ON webhook_logs (replay_of)",
+]
+
+with engine.begin() as conn:
+    for statement in SCHEMA_UPGRADES:
+        conn.execute(text(statement))
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -79,37 +118,56 @@ def get_db():
 # Pydantic Models
 class WebhookEventRequest(BaseModel):
     event_type: str = Field(..., description="Tipo do evento (ex: pedido.criado, nfe.emitida)")
+    tenant: str = Field(default=DEFAULT_TENANT, description="Tenant (grupo de empresas/ambiente) de origem")
     data: Dict[str, Any] = Field(..., description="Dados do evento")
     source: str = Field(default="protheus", description="Sistema de origem")
     timestamp: Optional[datetime] = None
+    schema_version: Optional[int] = Field(default=None, description="Versão do schema do evento (padrão: mais recente)")
 
 class WebhookConfigCreate(BaseModel):
     name: str
+    tenant: str = DEFAULT_TENANT
     event_type: str
     destination_url: str
     destination_type: str
     headers: Optional[Dict[str, str]] = None
+    signing_secret: Optional[str] = Field(default=None, description="Segredo para assinatura HMAC dos envios")
     active: bool = True
 
 class WebhookConfigResponse(BaseModel):
     id: int
+    tenant: str
     name: str
     event_type: str
     destination_url: str
     destination_type: str
     active: bool
+    signing_enabled: bool = False
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class ReplayRequest(BaseModel):
+    start: datetime = Field(..., description="Início do período (created_at, UTC)")
+    end: Optional[datetime] = Field(default=None, description="Fim do período. Padrão: agora")
+    tenant: Optional[str] = None
+    event_type: Optional[str] = None
+    status: Optional[List[str]] = Field(default=None, description="Status a reprocessar (ex: failed, partial)")
+    config_ids: Optional[List[int]] = Field(default=None, description="Configurações que receberão o replay")
+    destination_url: Optional[str] = None
+    rate: float = Field(default=DEFAULT_RATE, gt=0, description="Eventos por segundo")
+    batch_size: int = Field(default=DEFAULT_BATCH_SIZE, gt=0, le=10000)
+
 class WebhookLogResponse(BaseModel):
     id: int
+    tenant: str
     event_type: str
     status: str
     destination_url: Optional[str]
     error_message: Optional[str]
     created_at: datetime
+    replay_of: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -125,6 +183,8 @@ async def root():
             "webhook": "/webhook",
             "configs": "/configs",
             "logs": "/logs",
+            "replay": "/replay",
+            "schemas": "/events/schemas",
             "health": "/health"
         }
     }
@@ -147,10 +207,16 @@ async def health_check():
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
     
+    try:
+        backpressure = load_shedder.status()
+    except Exception as e:
+        backpressure = {"error": str(e)}
+    
     return {
         "status": "healthy" if redis_status == "healthy" and db_status == "healthy" else "unhealthy",
         "redis": redis_status,
         "database": db_status,
+        "backpressure": backpressure,
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -160,14 +226,37 @@ async def receive_webhook(event: WebhookEventRequest, db: Session = Depends(get_
     Endpoint principal que recebe eventos do Protheus
     """
     try:
+        if not is_known_tenant(event.tenant):
+            raise HTTPException(status_code=400, detail=f"Tenant desconhecido: {event.tenant}")
+        
+        # Backpressure: recusa com Retry-After em vez de deixar a fila crescer sem limite
+        rejection = load_shedder.check(event.tenant, event.event_type)
+        if rejection:
+            raise HTTPException(
+                status_code=rejection.status_code,
+                detail={"message": rejection.message, "retry_after": rejection.retry_after},
+                headers={"Retry-After": str(rejection.retry_after)}
+            )
+        queue = queue_name(event.tenant)
+        
+        # Valida eventos com schema registrado; os demais seguem genéricos.
+        # Os destinos recebem o payload original, como o Protheus enviou.
+        try:
+            event_registry.validate(event.event_type, event.data, event.schema_version)
+        except UnknownSchemaVersion as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        
         # Set timestamp if not provided
         if not event.timestamp:
             event.timestamp = datetime.utcnow()
         
         # Save to database log
         log = WebhookLog(
+            tenant=event.tenant,
             event_type=event.event_type,
-            payload=json.dumps(event.dict()),
+            payload=event.model_dump_json(),
             status="pending"
         )
         db.add(log)
@@ -177,13 +266,15 @@ async def receive_webhook(event: WebhookEventRequest, db: Session = Depends(get_
         # Add to Redis queue for processing
         queue_data = {
             "log_id": log.id,
+            "tenant": event.tenant,
             "event_type": event.event_type,
             "data": event.data,
             "source": event.source,
-            "timestamp": event.timestamp.isoformat()
+            "timestamp": event.timestamp.isoformat(),
+            "schema_version": event.schema_version
         }
         
-        redis_client.lpush("webhook_queue", json.dumps(queue_data))
+        redis_client.lpush(queue, json.dumps(queue_data))
         
         return {
             "status": "accepted",
@@ -191,28 +282,44 @@ async def receive_webhook(event: WebhookEventRequest, db: Session = Depends(get_
             "message": "Evento recebido e enfileirado para processamento"
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar webhook: {str(e)}")
 
+@app.get("/events/schemas")
+async def list_event_schemas():
+    """
+    Lista os tipos de evento com schema registrado e suas versões
+    """
+    return event_registry.event_types()
+
 @app.get("/configs", response_model=List[WebhookConfigResponse])
-async def list_configs(db: Session = Depends(get_db)):
+async def list_configs(tenant: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Lista todas as configurações de webhook
     """
-    configs = db.query(WebhookConfig).all()
-    return configs
+    query = db.query(WebhookConfig)
+    if tenant:
+        query = query.filter(WebhookConfig.tenant == tenant)
+    return query.all()
 
 @app.post("/configs", response_model=WebhookConfigResponse, status_code=201)
 async def create_config(config: WebhookConfigCreate, db: Session = Depends(get_db)):
     """
     Cria uma nova configuração de webhook
     """
+    if not is_known_tenant(config.tenant):
+        raise HTTPException(status_code=400, detail=f"Tenant desconhecido: {config.tenant}")
+    
     db_config = WebhookConfig(
+        tenant=config.tenant,
         name=config.name,
         event_type=config.event_type,
         destination_url=config.destination_url,
         destination_type=config.destination_type,
         headers=json.dumps(config.headers) if config.headers else None,
+        signing_secret=config.signing_secret or None,
         active=config.active
     )
     db.add(db_config)
@@ -236,6 +343,7 @@ async def delete_config(config_id: int, db: Session = Depends(get_db)):
 @app.get("/logs", response_model=List[WebhookLogResponse])
 async def list_logs(
     limit: int = 100,
+    tenant: Optional[str] = None,
     event_type: Optional[str] = None,
     status: Optional[str] = None,
     db: Session = Depends(get_db)
@@ -245,6 +353,8 @@ async def list_logs(
     """
     query = db.query(WebhookLog)
     
+    if tenant:
+        query = query.filter(WebhookLog.tenant == tenant)
     if event_type:
         query = query.filter(WebhookLog.event_type == event_type)
     if status:
@@ -253,6 +363,46 @@ async def list_logs(
     logs = query.order_by(WebhookLog.created_at.desc()).limit(limit).all()
     return logs
 
+def _replay_job(job_id: str, request: ReplayRequest):
+    """Executa o replay em background, publicando o progresso no Redis"""
+    key = f"replay:{job_id}"
+
+    def publish(progress):
+        redis_client.hset(key, mapping={k: str(v) for k, v in progress.items()})
+        redis_client.expire(key, 86400)
+
+    try:
+        run_replay(
+            engine, redis_client,
+            start=request.start, end=request.end,
+            tenant=request.tenant, event_type=request.event_type, status=request.status,
+            config_ids=request.config_ids, destination_url=request.destination_url,
+            rate=request.rate, batch_size=request.batch_size,
+            on_progress=publish
+        )
+    except Exception as e:
+        publish({"status": "failed", "error": str(e)})
+
+@app.post("/replay", status_code=202)
+async def start_replay(request: ReplayRequest, background_tasks: BackgroundTasks):
+    """
+    Reenfileira eventos de webhook_logs para os destinos escolhidos
+    """
+    job_id = uuid.uuid4().hex
+    redis_client.hset(f"replay:{job_id}", mapping={"status": "queued"})
+    background_tasks.add_task(_replay_job, job_id, request)
+    return {"status": "accepted", "job_id": job_id}
+
+@app.get("/replay/{job_id}")
+async def get_replay(job_id: str):
+    """
+    Retorna o progresso de um replay
+    """
+    progress = redis_client.hgetall(f"replay:{job_id}")
+    if not progress:
+        raise HTTPException(status_code=404, detail="Replay não encontrado")
+    return {"job_id": job_id, **progress}
+
 @app.get("/stats")
 async def get_stats(db: Session = Depends(get_db)):
     """
@@ -265,7 +415,8 @@ async def get_stats(db: Session = Depends(get_db)):
     failed_logs = db.query(WebhookLog).filter(WebhookLog.status == "failed").count()
     pending_logs = db.query(WebhookLog).filter(WebhookLog.status == "pending").count()
     
-    queue_size = redis_client.llen("webhook_queue")
+    tenant_sizes = load_shedder.queue_depths()
+    queue_size = sum(tenant_sizes.values())
     
     return {
         "configs": {
@@ -279,7 +430,11 @@ async def get_stats(db: Session = Depends(get_db)):
             "pending": pending_logs
         },
         "queue": {
-            "size": queue_size
+            "size": queue_size,
+            "tenants": {
+                tenant: {"size": size, "quota": queue_quota(tenant)}
+                for tenant, size in tenant_sizes.items()
+            }
         }
     }
 
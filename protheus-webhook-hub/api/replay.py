@@ -0,0 +1,311 @@
+"""
+Reprocessamento (replay/backfill) de eventos a partir de webhook_logs.
+
+Seleciona logs por período, event_type, status e destino, lê os registros
+do PostgreSQL com cursor server-side (sem carregar tudo em memória) e
+reenfileira em lotes com limite de taxa, apenas para os destinos escolhidos.
+
+Cada entrega reprocessada ganha um novo registro em webhook_logs (com
+`replay_of` apontando para o original), preservando o histórico. Antes de
+cada lote o replay respeita a cota do tenant e QUEUE_HIGH_WATER_MARK, usando
+apenas REPLAY_QUEUE_FRACTION (padrão: 0.5) de cada limite, e aguarda com
+backoff enquanto as filas estiverem acima disso, deixando folga para os
+eventos ao vivo.
+
+Uso via linha de comando:
+
+    python replay.py --start "2025-10-27 08:00" --end "2025-10-27 09:00" \\
+        --config-id 3 --status failed --status partial --rate 200
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import redis
+from sqlalchemy import bindparam, create_engine, text
+
+from backpressure import QUEUE_HIGH_WATER_MARK, LoadShedder
+from tenants import queue_name, queue_quota
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_RATE = 200.0  # eventos por segundo
+REPLAY_QUEUE_FRACTION = float(os.getenv("REPLAY_QUEUE_FRACTION", "0.5"))
+MAX_BACKOFF_SECONDS = 30
+
+
+def resolve_config_ids(conn, config_ids: Optional[List[int]] = None,
+                       destination_url: Optional[str] = None,
+                       event_type: Optional[str] = None,
+                       tenant: Optional[str] = None) -> Dict[int, Tuple[str, str]]:
+    """Resolve os destinos escolhidos em {config_id: (tenant, event_type)}"""
+    query = "SELECT id, tenant, event_type FROM webhook_configs WHERE active = true"
+    params = {}
+
+    if tenant:
+        query += " AND tenant = :tenant"
+        params["tenant"] = tenant
+    if config_ids:
+        query += " AND id IN :config_ids"
+        params["config_ids"] = list(config_ids)
+    if destination_url:
+        query += " AND destination_url = :destination_url"
+        params["destination_url"] = destination_url
+    if event_type:
+        query += " AND event_type = :event_type"
+        params["event_type"] = event_type
+
+    stmt = text(query)
+    if config_ids:
+        stmt = stmt.bindparams(bindparam("config_ids", expanding=True))
+
+    return {row.id: (row.tenant, row.event_type) for row in conn.execute(stmt, params)}
+
+
+def _logs_filter(start: datetime, end: datetime, tenants: List[str],
+                 event_types: List[str], status: Optional[List[str]]):
+    where = ("tenant IN :tenants AND created_at >= :start AND created_at < :end"
+             " AND event_type IN :event_types")
+    params = {"start": start, "end": end, "tenants": tenants, "event_types": event_types}
+    if status:
+        where += " AND status IN :status"
+        params["status"] = list(status)
+
+    expanding = [bindparam("tenants", expanding=True), bindparam("event_types", expanding=True)]
+    if status:
+        expanding.append(bindparam("status", expanding=True))
+    return where, params, expanding
+
+
+def count_logs(conn, start, end, tenants, event_types, status=None) -> int:
+    """Conta os logs que serão reprocessados (para o progresso)"""
+    where, params, expanding = _logs_filter(start, end, tenants, event_types, status)
+    stmt = text(f"SELECT COUNT(*) FROM webhook_logs WHERE {where}").bindparams(*expanding)
+    return conn.execute(stmt, params).scalar() or 0
+
+
+def iter_logs(conn, start, end, tenants, event_types, status=None,
+              batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator:
+    """Percorre os logs selecionados com cursor server-side"""
+    where, params, expanding = _logs_filter(start, end, tenants, event_types, status)
+    stmt = text(
+        f"SELECT id, tenant, event_type, payload FROM webhook_logs WHERE {where} ORDER BY id"
+    ).bindparams(*expanding)
+
+    result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(stmt, params)
+    try:
+        for rows in result.partitions(batch_size):
+            yield rows
+    finally:
+        result.close()
+
+
+def parse_payload(row) -> Optional[Dict]:
+    """Payload gravado no log, ou None se ilegível"""
+    try:
+        payload = json.loads(row.payload)
+    except (TypeError, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def build_queue_item(row, payload: Dict, log_id: int, config_ids: List[int]) -> str:
+    """Monta o item da fila a partir do payload gravado no log (entregue sob o novo log_id)"""
+    return json.dumps({
+        "log_id": log_id,
+        "tenant": row.tenant,
+        "event_type": row.event_type,
+        "data": payload.get("data", {}),
+        "source": payload.get("source", "protheus"),
+        "timestamp": payload.get("timestamp"),
+        "schema_version": payload.get("schema_version"),
+        "config_ids": config_ids,
+        "replay": True,
+        "replay_of": row.id
+    })
+
+
+def create_replay_logs(engine, rows) -> Dict[int, int]:
+    """
+    Cria um log pendente por entrega reprocessada; retorna {id original: novo id}
+
+    Um único INSERT ... SELECT por lote: o payload é copiado no próprio banco
+    e os novos ids voltam pelo RETURNING.
+    """
+    if not rows:
+        return {}
+    insert = text(
+        "INSERT INTO webhook_logs (tenant, event_type, payload, status, replay_of, created_at)"
+        " SELECT tenant, event_type, payload, 'pending', id, :created_at"
+        " FROM webhook_logs WHERE id IN :ids"
+        " RETURNING id, replay_of"
+    ).bindparams(bindparam("ids", expanding=True))
+    with engine.begin() as conn:
+        result = conn.execute(insert, {"ids": [row.id for row in rows], "created_at": datetime.utcnow()})
+        return {replay_of: new_id for new_id, replay_of in result}
+
+
+def wait_for_capacity(shedder: LoadShedder, batch: Dict[str, int], progress: Dict) -> None:
+    """
+    Aguarda (backoff exponencial) até as filas comportarem o lote
+
+    Um tenant com a fila vazia sempre aceita o lote, mesmo que ele seja
+    maior que o limite, para o replay não travar.
+    """
+    if not batch:
+        return
+
+    backoff = 1
+    while True:
+        depths = shedder.queue_depths()
+        total = sum(depths.values())
+        over_tenant = any(
+            depths.get(tenant, 0) and depths.get(tenant, 0) + count > queue_quota(tenant) * REPLAY_QUEUE_FRACTION
+            for tenant, count in batch.items()
+        )
+        over_total = total and total + sum(batch.values()) > QUEUE_HIGH_WATER_MARK * REPLAY_QUEUE_FRACTION
+        if not over_tenant and not over_total:
+            return
+
+        progress["throttled_seconds"] += backoff
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+def run_replay(engine, redis_conn, start: datetime, end: Optional[datetime] = None,
+               tenant: Optional[str] = None, event_type: Optional[str] = None, status: Optional[List[str]] = None,
+               config_ids: Optional[List[int]] = None, destination_url: Optional[str] = None,
+               rate: float = DEFAULT_RATE, batch_size: int = DEFAULT_BATCH_SIZE,
+               on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Reenfileira eventos registrados em webhook_logs
+
+    Args:
+        engine: Engine SQLAlchemy do banco do hub
+        redis_conn: Conexão Redis da fila
+        start/end: Período (created_at) a reprocessar
+        tenant: Filtra um tenant
+        event_type: Filtra um tipo de evento
+        status: Lista de status a reprocessar (ex: failed, partial)
+        config_ids / destination_url: Destinos que receberão o replay
+        rate: Limite de eventos por segundo
+        batch_size: Tamanho dos lotes lidos do banco e enviados ao Redis
+        on_progress: Callback chamado a cada lote com o progresso
+
+    Returns:
+        dict com o progresso final
+    """
+    end = end or datetime.utcnow()
+    progress = {"total": 0, "enqueued": 0, "skipped": 0, "throttled_seconds": 0, "status": "running"}
+    shedder = LoadShedder(redis_conn, engine)
+
+    with engine.connect() as conn:
+        destinos = resolve_config_ids(conn, config_ids, destination_url, event_type, tenant)
+        if not destinos:
+            progress["status"] = "no_destinations"
+            if on_progress:
+                on_progress(progress)
+            return progress
+
+        # Destinos agrupados por tenant e tipo de evento
+        por_evento: Dict[Tuple[str, str], List[int]] = {}
+        for config_id, chave in destinos.items():
+            por_evento.setdefault(chave, []).append(config_id)
+        tenants = sorted({chave[0] for chave in por_evento})
+        event_types = sorted({chave[1] for chave in por_evento})
+
+        progress["total"] = count_logs(conn, start, end, tenants, event_types, status)
+        if on_progress:
+            on_progress(progress)
+
+        started = time.monotonic()
+        for rows in iter_logs(conn, start, end, tenants, event_types, status, batch_size):
+            selected = []
+            for row in rows:
+                payload = parse_payload(row) if por_evento.get((row.tenant, row.event_type)) else None
+                if payload is None:
+                    progress["skipped"] += 1
+                    continue
+                selected.append((row, payload))
+
+            # Cota do tenant e limite global (como no /webhook), com folga para o tráfego ao vivo
+            batch: Dict[str, int] = {}
+            for row, _ in selected:
+                batch[row.tenant] = batch.get(row.tenant, 0) + 1
+            wait_for_capacity(shedder, batch, progress)
+
+            new_ids = create_replay_logs(engine, [row for row, _ in selected])
+            pipe = redis_conn.pipeline(transaction=False)
+            for row, payload in selected:
+                item = build_queue_item(row, payload, new_ids[row.id], por_evento[(row.tenant, row.event_type)])
+                pipe.lpush(queue_name(row.tenant), item)
+                progress["enqueued"] += 1
+            pipe.execute()
+
+            if on_progress:
+                on_progress(progress)
+
+            # Limite de taxa: não ultrapassa `rate` eventos por segundo
+            if rate and rate > 0:
+                expected = progress["enqueued"] / rate
+                elapsed = time.monotonic() - started
+                if expected > elapsed:
+                    time.sleep(expected - elapsed)
+
+    progress["status"] = "finished"
+    if on_progress:
+        on_progress(progress)
+    return progress
+
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de eventos do Protheus Webhook Hub")
+    parser.add_argument("--start", required=True, type=_parse_datetime, help="Início do período (ISO, UTC)")
+    parser.add_argument("--end", type=_parse_datetime, help="Fim do período (ISO, UTC). Padrão: agora")
+    parser.add_argument("--tenant", help="Tenant")
+    parser.add_argument("--event-type", help="Tipo de evento")
+    parser.add_argument("--status", action="append", help="Status a reprocessar (repetível)")
+    parser.add_argument("--config-id", type=int, action="append", dest="config_ids", help="ID da configuração de destino (repetível)")
+    parser.add_argument("--destination-url", help="URL de destino")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Eventos por segundo")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Tamanho do lote")
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("DATABASE_URL", "postgresql://webhook_user:webhook_pass@db:5432/webhook_hub"))
+    redis_conn = redis.Redis(
+        host=os.getenv("REDIS_HOST", "redis"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        decode_responses=True
+    )
+
+    def print_progress(progress):
+        total = progress["total"] or 1
+        print(f"  🔁 {progress['enqueued']}/{progress['total']} reenfileirados "
+              f"({progress['enqueued'] * 100 // total}%), {progress['skipped']} ignorados, "
+              f"{progress['throttled_seconds']}s aguardando as filas")
+
+    print(f"🔁 Replay de {args.start} até {args.end or 'agora'}")
+    progress = run_replay(
+        engine, redis_conn,
+        start=args.start, end=args.end,
+        tenant=args.tenant, event_type=args.event_type, status=args.status,
+        config_ids=args.config_ids, destination_url=args.destination_url,
+        rate=args.rate, batch_size=args.batch_size,
+        on_progress=print_progress
+    )
+
+    if progress["status"] == "no_destinations":
+        print("⚠️  Nenhuma configuração ativa corresponde aos destinos informados")
+    else:
+        print(f"✔️  Replay concluído: {progress['enqueued']} eventos reenfileirados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Assinatura HMAC dos webhooks enviados pelo hub.
+
+O worker assina o corpo exato enviado ao destino:
+
+    X-Hub-Timestamp: <epoch em segundos>
+    X-Hub-Signature: sha256=<hex(HMAC-SHA256(secret, "<timestamp>." + body))>
+
+Destinos customizados podem copiar este arquivo (depende apenas da
+biblioteca padrão) e usar `verify_signature` para validar a origem e
+rejeitar requisições reenviadas fora da janela de tolerância.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+
+SIGNATURE_HEADER = "X-Hub-Signature"
+TIMESTAMP_HEADER = "X-Hub-Timestamp"
+SIGNATURE_PREFIX = "sha256="
+DEFAULT_TOLERANCE_SECONDS = 300
+
+
+def signing_key(secret: str) -> bytes:
+    """Converte o segredo configurado na chave usada pelo HMAC"""
+    return secret.encode("utf-8")
+
+
+def compute_signature(key: bytes, timestamp: int, body: bytes) -> str:
+    """Calcula a assinatura de um corpo já serializado"""
+    mac = hmac.new(key, digestmod=hashlib.sha256)
+    mac.update(str(timestamp).encode("ascii"))
+    mac.update(b".")
+    mac.update(body)
+    return SIGNATURE_PREFIX + mac.hexdigest()
+
+
+def signature_headers(key: bytes, body: bytes, timestamp: Optional[int] = None) -> dict:
+    """Retorna os headers de assinatura para o corpo informado"""
+    if timestamp is None:
+        timestamp = int(time.time())
+    return {
+        TIMESTAMP_HEADER: str(timestamp),
+        SIGNATURE_HEADER: compute_signature(key, timestamp, body),
+    }
+
+
+def verify_signature(
+    secret: str,
+    body: bytes,
+    signature: Optional[str],
+    timestamp: Optional[str],
+    tolerance: int = DEFAULT_TOLERANCE_SECONDS,
+    now: Optional[float] = None,
+) -> Tuple[bool, str]:
+    """
+    Valida uma requisição recebida do hub.
+
+    Args:
+        secret: Segredo cadastrado na configuração do webhook
+        body: Corpo bruto da requisição (bytes, sem re-serializar)
+        signature: Valor do header X-Hub-Signature
+        timestamp: Valor do header X-Hub-Timestamp
+        tolerance: Janela máxima (segundos) entre o envio e o recebimento
+        now: Horário atual (epoch), útil para testes
+
+    Returns:
+        Tupla (valido, motivo)
+    """
+    if not signature or not timestamp:
+        return False, "Headers de assinatura ausentes"
+
+    try:
+        ts = int(timestamp)
+    except ValueError:
+        return False, "Timestamp inválido"
+
+    if now is None:
+        now = time.time()
+    if abs(now - ts) > tolerance:
+        return False, "Timestamp fora da janela de tolerância"
+
+    expected = compute_signature(signing_key(secret), ts, body)
+    if not hmac.compare_digest(expected, signature):
+        return False, "Assinatura inválida"
+
+    return True, "ok"
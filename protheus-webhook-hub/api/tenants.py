@@ -0,0 +1,60 @@
+"""
+Particionamento do hub por tenant (grupo de empresas / ambiente do Protheus).
+
+Cada tenant tem sua própria fila no Redis e uma cota de tamanho, de forma
+que um pico de eventos de um tenant não atrasa os demais. Workers podem
+ser fixados em tenants específicos com WORKER_TENANTS.
+
+Variáveis de ambiente:
+    TENANTS                     Tenants aceitos além do padrão (ex: producao,solar,faturamento)
+    TENANT_QUEUE_QUOTA_DEFAULT  Tamanho máximo da fila de cada tenant (padrão: 10000)
+    TENANT_QUEUE_QUOTAS         Cotas específicas (ex: producao=50000,solar=5000)
+    WORKER_TENANTS              Tenants atendidos por este worker (padrão: todos)
+"""
+
+import os
+from typing import Dict, List
+
+DEFAULT_TENANT = "default"
+BASE_QUEUE = "webhook_queue"
+
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_quotas(value: str) -> Dict[str, int]:
+    quotas = {}
+    for item in _parse_list(value):
+        tenant, _, quota = item.partition("=")
+        if quota:
+            quotas[tenant.strip()] = int(quota)
+    return quotas
+
+
+TENANTS = [DEFAULT_TENANT] + [t for t in _parse_list(os.getenv("TENANTS", "")) if t != DEFAULT_TENANT]
+TENANT_QUEUE_QUOTA_DEFAULT = int(os.getenv("TENANT_QUEUE_QUOTA_DEFAULT", "10000"))
+TENANT_QUEUE_QUOTAS = _parse_quotas(os.getenv("TENANT_QUEUE_QUOTAS", ""))
+
+
+def is_known_tenant(tenant: str) -> bool:
+    """Indica se o tenant está configurado"""
+    return tenant in TENANTS
+
+
+def queue_name(tenant: str) -> str:
+    """Fila Redis do tenant (o tenant padrão mantém a fila original)"""
+    if not tenant or tenant == DEFAULT_TENANT:
+        return BASE_QUEUE
+    return f"{BASE_QUEUE}:{tenant}"
+
+
+def queue_quota(tenant: str) -> int:
+    """Tamanho máximo da fila do tenant"""
+    return TENANT_QUEUE_QUOTAS.get(tenant, TENANT_QUEUE_QUOTA_DEFAULT)
+
+
+def worker_tenants() -> List[str]:
+    """Tenants atendidos por este worker"""
+    pinned = _parse_list(os.getenv("WORKER_TENANTS", ""))
+    return pinned or list(TENANTS)
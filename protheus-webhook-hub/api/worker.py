@@ -3,10 +3,14 @@ import json
 import httpx
 import time
 import os
+from collections import namedtuple
 from datetime import datetime
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from signing import signing_key, signature_headers
+from events import registry as event_registry
+from tenants import DEFAULT_TENANT, queue_name, worker_tenants
 
 # Configurações
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://webhook_user:webhook_pass@db:5432/webhook_hub")
@@ -21,18 +25,21 @@ Base = declarative_base()
 class WebhookConfig(Base):
     __tablename__ = "webhook_configs"
     id = Column(Integer, primary_key=True)
+    tenant = Column(String(50))
     name = Column(String(255))
     event_type = Column(String(100))
     destination_url = Column(String(500))
     destination_type = Column(String(50))
     active = Column(Boolean)
     headers = Column(Text)
+    signing_secret = Column(String(255))
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
 
 class WebhookLog(Base):
     __tablename__ = "webhook_logs"
     id = Column(Integer, primary_key=True)
+    tenant = Column(String(50))
     event_type = Column(String(100))
     payload = Column(Text)
     status = Column(String(50))
@@ -40,11 +47,31 @@ class WebhookLog(Base):
     error_message = Column(Text)
     created_at = Column(DateTime)
     processed_at = Column(DateTime)
+    replay_of = Column(Integer)
 
 # Redis Connection
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
 
-def format_slack_message(event_type: str, data: dict) -> dict:
+# Headers e chave de assinatura já processados por configuração
+DeliverySettings = namedtuple("DeliverySettings", ["updated_at", "headers", "key"])
+_delivery_cache = {}
+
+def get_delivery_settings(config: WebhookConfig) -> DeliverySettings:
+    """Retorna headers/chave da configuração, processando apenas quando ela muda"""
+    cached = _delivery_cache.get(config.id)
+    if cached and cached.updated_at == config.updated_at:
+        return cached
+
+    headers = {"Content-Type": "application/json"}
+    if config.headers:
+        headers.update(json.loads(config.headers))
+    key = signing_key(config.signing_secret) if config.signing_secret else None
+
+    settings = DeliverySettings(config.updated_at, headers, key)
+    _delivery_cache[config.id] = settings
+    return settings
+
+def format_slack_message(event_type: str, fields: list) -> dict:
     """Formata mensagem para Slack"""
     return {
         "text": f"🔔 Novo evento: {event_type}",
@@ -63,7 +90,7 @@ def format_slack_message(event_type: str, data: dict) -> dict:
                         "type": "mrkdwn",
                         "text": f"*{key}:*\n{value}"
                     }
-                    for key, value in list(data.items())[:5]  # Primeiros 5 campos
+                    for key, value in fields
                 ]
             },
             {
@@ -78,9 +105,9 @@ def format_slack_message(event_type: str, data: dict) -> dict:
         ]
     }
 
-def format_teams_message(event_type: str, data: dict) -> dict:
+def format_teams_message(event_type: str, fields: list) -> dict:
     """Formata mensagem para Microsoft Teams"""
-    facts = [{"name": key, "value": str(value)} for key, value in list(data.items())[:5]]
+    facts = [{"name": key, "value": str(value)} for key, value in fields]
     
     return {
         "@type": "MessageCard",
@@ -105,6 +132,16 @@ def format_custom_message(event_type: str, data: dict, source: str) -> dict:
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def event_fields(event_data: dict) -> list:
+    """Campos principais do evento (schema tipado ou primeiros 5 campos), calculados uma vez por evento"""
+    if "_fields" not in event_data:
+        event_data["_fields"] = event_registry.summary(
+            event_data.get("event_type"),
+            event_data.get("data", {}),
+            event_data.get("schema_version")
+        )
+    return event_data["_fields"]
+
 async def send_webhook(config: WebhookConfig, event_data: dict):
     """Envia webhook para o destino configurado"""
     try:
@@ -114,23 +151,26 @@ async def send_webhook(config: WebhookConfig, event_data: dict):
         
         # Formata payload baseado no tipo de destino
         if config.destination_type == "slack":
-            payload = format_slack_message(event_type, data)
+            payload = format_slack_message(event_type, event_fields(event_data))
         elif config.destination_type == "teams":
-            payload = format_teams_message(event_type, data)
+            payload = format_teams_message(event_type, event_fields(event_data))
         else:  # custom
             payload = format_custom_message(event_type, data, source)
         
+        # Serializa uma única vez: a assinatura cobre exatamente os bytes enviados
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        
         # Prepara headers
-        headers = {"Content-Type": "application/json"}
-        if config.headers:
-            custom_headers = json.loads(config.headers)
-            headers.update(custom_headers)
+        settings = get_delivery_settings(config)
+        headers = settings.headers
+        if settings.key:
+            headers = {**headers, **signature_headers(settings.key, body)}
         
         # Envia requisição
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
                 config.destination_url,
-                json=payload,
+                content=body,
                 headers=headers
             )
             response.raise_for_status()
@@ -147,14 +187,23 @@ def process_webhook(event_data: dict):
     try:
         log_id = event_data.get("log_id")
         event_type = event_data.get("event_type")
+        tenant = event_data.get("tenant", DEFAULT_TENANT)
         
-        print(f"[{datetime.utcnow()}] Processando evento {event_type} (log_id: {log_id})")
+        print(f"[{datetime.utcnow()}] Processando evento {event_type} [{tenant}] (log_id: {log_id})")
         
-        # Busca configurações ativas para este tipo de evento
-        configs = db.query(WebhookConfig).filter(
+        # Busca configurações ativas do tenant para este tipo de evento
+        query = db.query(WebhookConfig).filter(
+            WebhookConfig.tenant == tenant,
             WebhookConfig.event_type == event_type,
             WebhookConfig.active == True
-        ).all()
+        )
+        
+        # Replay: envia apenas para os destinos escolhidos
+        config_ids = event_data.get("config_ids")
+        if config_ids:
+            query = query.filter(WebhookConfig.id.in_(config_ids))
+        
+        configs = query.all()
         
         if not configs:
             print(f"  ⚠️  Nenhuma configuração ativa encontrada para {event_type}")
@@ -220,12 +269,18 @@ def main():
     print("🚀 Webhook Worker iniciado")
     print(f"   Redis: {REDIS_HOST}:{REDIS_PORT}")
     print(f"   Database: {DATABASE_URL}")
+    
+    tenants = worker_tenants()
+    queues = [queue_name(tenant) for tenant in tenants]
+    print(f"   Tenants: {', '.join(tenants)}")
     print("   Aguardando eventos...\n")
     
     while True:
         try:
-            # Aguarda por eventos na fila (bloqueante com timeout de 1 segundo)
-            result = redis_client.brpop("webhook_queue", timeout=1)
+            # Aguarda por eventos nas filas dos tenants (bloqueante com timeout de 1 segundo).
+            # A ordem é rotacionada a cada leitura para que um tenant não monopolize o worker.
+            result = redis_client.brpop(queues, timeout=1)
+            queues = queues[1:] + queues[:1]
             
             if result:
                 _, event_json = result
@@ -95,6 +95,10 @@ async function loadConfigs() {
                         <label>Tipo de Destino</label>
                         <span class="badge badge-info">${config.destination_type}</span>
                     </div>
+                    <div class="config-detail">
+                        <label>Assinatura HMAC</label>
+                        <span>${config.signing_enabled ? '🔐 Ativa' : 'Desativada'}</span>
+                    </div>
                     <div class="config-detail">
                         <label>URL de Destino</label>
                         <span style="word-break: break-all; font-size: 0.85rem;">${config.destination_url}</span>
@@ -227,6 +231,7 @@ async function handleAddConfig(e) {
         event_type: document.getElementById('configEventType').value,
         destination_type: document.getElementById('configDestType').value,
         destination_url: document.getElementById('configDestUrl').value,
+        signing_secret: document.getElementById('configSigningSecret').value || null,
         active: document.getElementById('configActive').checked
     };
     